@@ -0,0 +1,137 @@
+"""
+api/async_db.py
+
+Async PostgreSQL access for the API's per-request queries (asyncpg).
+
+The sync endpoints hold a threadpool slot for every request and build a
+DataFrame to read one row. The async path runs on the event loop instead:
+  - one asyncpg pool, small and fixed (min_size = max_size): with 200
+    clients in flight, requests wait for a free connection in the pool
+    rather than as 200 backends competing in Postgres. JIT is off for the
+    pool's sessions; it only adds planning time to single-row lookups.
+  - the hot queries (symbol lookup, latest feature row, latest price) are
+    fixed SQL strings, prepared once per connection when it is opened
+    and kept in asyncpg's statement cache. After that a request costs a
+    single Bind/Execute round trip.
+  - results are asyncpg Records (tuples with column names), no DataFrames
+  - stocks.symbol -> stock_id is memoized: ids never change once assigned
+
+Usage:
+    db = AsyncDatabase()
+    await db.connect()                     # app startup
+    stock_id = await db.stock_id("TCS")
+    row = await db.latest_features(stock_id)
+    await db.close()                       # app shutdown
+"""
+import asyncpg
+import yaml
+
+from config.database import DATABASE_URL
+from config.logger import get_logger
+
+logger = get_logger(__name__)
+
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+DB_CONFIG = config.get("api", {}).get("async_db", {})
+ASYNC_DB_ENABLED = DB_CONFIG.get("enabled", True)
+MIN_SIZE = DB_CONFIG.get("min_size", 4)
+MAX_SIZE = DB_CONFIG.get("max_size", 4)
+MAX_INACTIVE_LIFETIME_S = DB_CONFIG.get("max_inactive_connection_lifetime_s", 300)
+COMMAND_TIMEOUT_S = DB_CONFIG.get("command_timeout_s", 5)
+STATEMENT_CACHE_SIZE = DB_CONFIG.get("statement_cache_size", 128)
+
+SYMBOL_QUERY = "SELECT stock_id FROM stocks WHERE symbol = $1 LIMIT 1"
+LATEST_FEATURES_QUERY = "SELECT * FROM feature_store WHERE stock_id = $1 ORDER BY date DESC LIMIT 1"
+LATEST_PRICE_QUERY = "SELECT close FROM prices WHERE stock_id = $1 ORDER BY date DESC LIMIT 1"
+OPEN_POSITIONS_QUERY = """
+    SELECT p.id, p.stock_id, s.symbol, p.buy_price
+    FROM portfolio_positions p
+    JOIN stocks s ON p.stock_id = s.stock_id
+    WHERE p.status = 'OPEN'
+"""
+HOT_QUERIES = [SYMBOL_QUERY, LATEST_FEATURES_QUERY, LATEST_PRICE_QUERY]
+
+
+class AsyncDatabase:
+    """asyncpg pool with the serving queries prepared on every connection."""
+
+    def __init__(self, dsn: str = DATABASE_URL, min_size: int = MIN_SIZE, max_size: int = MAX_SIZE,
+                 command_timeout: float = COMMAND_TIMEOUT_S, statement_cache_size: int = STATEMENT_CACHE_SIZE,
+                 max_inactive_lifetime: float = MAX_INACTIVE_LIFETIME_S):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.command_timeout = command_timeout
+        self.statement_cache_size = statement_cache_size
+        self.max_inactive_lifetime = max_inactive_lifetime
+        self.pool = None
+        self._stock_ids = {}
+
+    async def connect(self):
+        self.pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            command_timeout=self.command_timeout,
+            statement_cache_size=self.statement_cache_size,
+            max_inactive_connection_lifetime=self.max_inactive_lifetime,
+            server_settings={"jit": "off", "application_name": "market_api"},
+            init=self._prepare,
+        )
+        logger.info(f"Async DB pool ready: {self.min_size}-{self.max_size} connections, "
+                    f"{len(HOT_QUERIES)} hot statements prepared per connection")
+
+    @staticmethod
+    async def _prepare(conn):
+        # Executing each hot query once (NULL key: an empty index probe) parses
+        # and plans it into the connection's statement cache before any request
+        for query in HOT_QUERIES:
+            await conn.fetchrow(query, None)
+
+    @property
+    def ready(self) -> bool:
+        return self.pool is not None and not self.pool.is_closing()
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    # ----------------------------------------------------------
+    # Hot queries
+    # ----------------------------------------------------------
+    async def stock_id(self, symbol: str):
+        """stock_id of a clean symbol ("TCS"), or None."""
+        stock_id = self._stock_ids.get(symbol)
+        if stock_id is None:
+            stock_id = await self.pool.fetchval(SYMBOL_QUERY, symbol)
+            if stock_id is not None:
+                self._stock_ids[symbol] = stock_id
+        return stock_id
+
+    async def latest_features(self, stock_id: int):
+        """Latest feature_store row of a stock as a Record, or None."""
+        return await self.pool.fetchrow(LATEST_FEATURES_QUERY, stock_id)
+
+    async def latest_price(self, stock_id: int):
+        """Latest close of a stock, or None."""
+        return await self.pool.fetchval(LATEST_PRICE_QUERY, stock_id)
+
+    async def open_positions(self) -> list:
+        """OPEN portfolio_positions as (id, stock_id, symbol, buy_price) Records."""
+        return await self.pool.fetch(OPEN_POSITIONS_QUERY)
+
+    def stats(self) -> dict:
+        """Pool usage, for /health."""
+        if not self.ready:
+            return {"ready": False}
+        size, idle = self.pool.get_size(), self.pool.get_idle_size()
+        return {
+            "ready": True,
+            "pool_size": size,
+            "pool_in_use": size - idle,
+            "pool_max_size": self.pool.get_max_size(),
+            "cached_symbols": len(self._stock_ids),
+        }
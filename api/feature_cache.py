@@ -0,0 +1,187 @@
+"""
+api/feature_cache.py
+
+In-process cache of the latest feature_store row per stock, for /predict.
+
+feature_store changes once a day (update_feature_store), so the API keeps
+every stock's latest feature vector as one float32 matrix, already in
+booster.feature_names order, plus a symbol -> row index. A request is a
+dict lookup and a row slice instead of two PostgreSQL queries.
+
+Alongside each row sits the stock's precomputed daily signal
+(model/daily_signals.py) for the same date and the serving model version,
+when there is one; /predict then returns it without scoring. Rows without
+one (new model, scoring stage not run yet) are scored live from the cached
+features.
+
+Invalidation is by version: max(created_at) of feature_store and of
+daily_signals (both indexed; the writers stamp every row they write). At
+most every `refresh_seconds` a request polls them, and the snapshot is
+rebuilt when either has moved or the model (version or feature list)
+changed. Symbols not in the cache fall back to the database. Until
+daily_signals exists (create_prod_tables / the scoring stage not run yet)
+only feature_store is polled, and every request is scored live.
+
+Usage:
+    cache = LatestFeatureCache(engine)
+    cache.refresh(booster.feature_names, model_version)   # cheap unless a watermark moved
+    entry = cache.get("TCS")                # None -> query the database
+    X = entry["features"]                   # (1, n_features) float32
+    entry["probability"]                    # daily signal, or None -> score X
+"""
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import yaml
+from sqlalchemy import text
+
+from config.logger import get_logger
+from feature_engineering.feature_store import load_latest_features, model_frame
+
+logger = get_logger(__name__)
+
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+CACHE_CONFIG = config.get("feature_store", {}).get("api_cache", {})
+CACHE_ENABLED = CACHE_CONFIG.get("enabled", True)
+REFRESH_SECONDS = CACHE_CONFIG.get("refresh_seconds", 5)
+
+WATERMARK_QUERY = text("""
+    SELECT (SELECT max(created_at) FROM feature_store), (SELECT max(created_at) FROM daily_signals)
+""")
+FEATURES_WATERMARK_QUERY = text("SELECT (SELECT max(created_at) FROM feature_store), NULL::timestamp")
+SIGNALS_TABLE_QUERY = text("SELECT to_regclass('daily_signals') IS NOT NULL")
+SIGNALS_QUERY = text("""
+    SELECT stock_id, date, predicted_class, probability
+    FROM daily_signals
+    WHERE model_version = :version AND date >= :since
+""")
+
+
+class LatestFeatureCache:
+    """Latest feature vector per stock as a float32 matrix, refreshed when feature_store changes."""
+
+    def __init__(self, engine, refresh_seconds: float = REFRESH_SECONDS):
+        self.engine = engine
+        self.refresh_seconds = refresh_seconds
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # Replaced as a whole on refresh, so readers never see a half-built snapshot
+        self._snapshot = None
+        self._checked = None   # time.monotonic() when the snapshot last matched the watermark
+        self._signals_table = False   # daily_signals seen to exist (checked each poll until it does)
+        self.hits = 0
+        self.misses = 0
+        self.signal_hits = 0   # hits answered by a precomputed daily signal
+        self.refreshes = 0
+
+    def is_fresh(self, feature_names: list, model_version) -> bool:
+        """Snapshot matches the model and was checked within refresh_seconds (no I/O)."""
+        snapshot = self._snapshot
+        return (snapshot is not None and snapshot["model"] == (model_version, feature_names)
+                and time.monotonic() - self._checked < self.refresh_seconds)
+
+    def refresh(self, feature_names: list, model_version: str = None, force: bool = False) -> bool:
+        """Polls the watermarks (at most every refresh_seconds); reloads if one moved. Returns True on reload."""
+        feature_names = list(feature_names)
+        if not force and self.is_fresh(feature_names, model_version):
+            return False
+
+        with self._refresh_lock:
+            if not force and self.is_fresh(feature_names, model_version):
+                return False  # another request refreshed it meanwhile
+            snapshot = self._snapshot
+
+            with self.engine.connect() as conn:
+                if not self._signals_table:
+                    self._signals_table = bool(conn.execute(SIGNALS_TABLE_QUERY).scalar())
+                query = WATERMARK_QUERY if self._signals_table else FEATURES_WATERMARK_QUERY
+                watermark = tuple(conn.execute(query).one())
+                if (not force and snapshot is not None and snapshot["version"] == watermark
+                        and snapshot["model"] == (model_version, feature_names)):
+                    self._checked = time.monotonic()
+                    return False
+                df = load_latest_features(conn)
+                signals = None
+                if model_version is not None and self._signals_table and not df.empty:
+                    signals = pd.read_sql(SIGNALS_QUERY, conn,
+                                          params={"version": model_version, "since": min(df["date"])})
+
+            self._snapshot = self._build(df, feature_names, model_version, signals, watermark)
+            self._checked = time.monotonic()
+            self.refreshes += 1
+        logger.info(f"Feature cache loaded: {len(df)} stocks, {self._snapshot['signal_rows']} daily signals "
+                    f"(model {model_version}), feature_store/daily_signals version {watermark}")
+        return True
+
+    @staticmethod
+    def _build(df: pd.DataFrame, feature_names: list, model_version, signals, watermark) -> dict:
+        # Daily signal of each row's own date (an older one is stale: features moved on since)
+        probability = np.full(len(df), np.nan)
+        predicted = np.full(len(df), None, dtype=object)
+        if signals is not None and not signals.empty:
+            matched = df[["stock_id", "date"]].merge(signals, on=["stock_id", "date"], how="left")
+            probability = matched["probability"].to_numpy(dtype=float)
+            predicted = matched["predicted_class"].to_numpy(dtype=object)
+        return {
+            "version": watermark,
+            "model": (model_version, feature_names),
+            "loaded_at": datetime.now(),
+            "index": {symbol: i for i, symbol in enumerate(df["symbol"])},
+            "features": model_frame(df, feature_names).to_numpy(dtype=np.float32),
+            "stock_id": df["stock_id"].to_numpy(),
+            "date": df["date"].to_numpy(),
+            "rsi": df["rsi_14"].to_numpy(dtype=float),
+            "sentiment": df["sentiment_score"].fillna(0.0).to_numpy(dtype=float),
+            "probability": probability,
+            "prediction": predicted,
+            "signal_rows": int((~np.isnan(probability)).sum()),
+        }
+
+    def get(self, symbol: str):
+        """
+        Cached row of a (clean) symbol: features (1 x n float32), stock_id,
+        date, rsi, sentiment, and the daily signal's probability/prediction
+        (None when there is none for this date and model); or None.
+        """
+        snapshot = self._snapshot
+        row = snapshot["index"].get(symbol) if snapshot is not None else None
+        signal = row is not None and not np.isnan(snapshot["probability"][row])
+        with self._stats_lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.signal_hits += signal
+        return {
+            "features": snapshot["features"][row:row + 1],
+            "stock_id": int(snapshot["stock_id"][row]),
+            "date": snapshot["date"][row],
+            "rsi": float(snapshot["rsi"][row]),
+            "sentiment": float(snapshot["sentiment"][row]),
+            "probability": float(snapshot["probability"][row]) if signal else None,
+            "prediction": snapshot["prediction"][row] if signal else None,
+        }
+
+    def stats(self) -> dict:
+        """Hit ratio and staleness, for /health."""
+        snapshot = self._snapshot
+        lookups = self.hits + self.misses
+        return {
+            "rows": len(snapshot["index"]) if snapshot else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "signal_rows": snapshot["signal_rows"] if snapshot else 0,
+            "signal_hit_ratio": round(self.signal_hits / lookups, 4) if lookups else None,
+            "refreshes": self.refreshes,
+            "feature_store_version": str(snapshot["version"][0]) if snapshot else None,
+            "daily_signals_version": str(snapshot["version"][1]) if snapshot else None,
+            "loaded_at": snapshot["loaded_at"].isoformat(timespec="seconds") if snapshot else None,
+            # Upper bound on how far behind feature_store / daily_signals the cache can be
+            "staleness_s": round(time.monotonic() - self._checked, 1) if snapshot else None,
+        }
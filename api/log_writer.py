@@ -0,0 +1,226 @@
+"""
+api/log_writer.py
+
+Background batched writer for prediction_logs.
+
+Request handlers submit() a row and return; a daemon thread drains the
+bounded queue and writes a batch every `batch_size` rows or
+`flush_interval_ms` after the oldest pending row, with one multi-row
+INSERT ... SELECT FROM unnest(...) per batch. A prediction no longer pays
+for a commit round trip.
+
+When the queue is full (database slow or down), `policy` decides:
+  - "drop":  the new row is discarded and counted
+  - "block": the request waits up to block_timeout_ms for space
+             (backpressure), then the row is dropped
+
+A failed flush is retried with backoff, holding its batch, while new rows
+queue up behind it until the policy applies. close() stops accepting rows,
+flushes what is queued (up to shutdown_timeout_s) and joins the thread.
+
+Usage:
+    writer = PredictionLogWriter(engine)
+    writer.start()
+    writer.submit({"stock_id": 7, "prediction_date": date, "predicted_class": "Buy",
+                   "probability": 0.71, "model_version": version})
+    writer.stats()      # queue depth, drops, flush latency (/health)
+    writer.close()      # on shutdown
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import yaml
+from sqlalchemy import text
+
+from config.logger import get_logger
+
+logger = get_logger(__name__)
+
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+LOG_CONFIG = config.get("api", {}).get("prediction_logs", {})
+QUEUE_SIZE = LOG_CONFIG.get("queue_size", 10000)
+BATCH_SIZE = LOG_CONFIG.get("batch_size", 500)
+FLUSH_INTERVAL_MS = LOG_CONFIG.get("flush_interval_ms", 200)
+POLICY = LOG_CONFIG.get("policy", "drop")
+BLOCK_TIMEOUT_MS = LOG_CONFIG.get("block_timeout_ms", 100)
+SHUTDOWN_TIMEOUT_S = LOG_CONFIG.get("shutdown_timeout_s", 10)
+
+POLICIES = ("drop", "block")
+MAX_RETRY_DELAY_S = 5.0
+
+INSERT_QUERY = text("""
+    INSERT INTO prediction_logs (stock_id, prediction_date, predicted_class, probability, model_version)
+    SELECT * FROM unnest(:stock_ids, :dates, :classes, :probs, :versions)
+""")
+
+
+def insert_prediction_logs(conn, rows: list):
+    """Writes prediction_logs rows (dicts keyed by column name) in one statement."""
+    conn.execute(INSERT_QUERY, {
+        "stock_ids": [int(r["stock_id"]) for r in rows],
+        "dates": [r["prediction_date"] for r in rows],
+        "classes": [r["predicted_class"] for r in rows],
+        "probs": [float(r["probability"]) for r in rows],
+        "versions": [r["model_version"] for r in rows],
+    })
+
+
+class PredictionLogWriter:
+    """Bounded queue of prediction_logs rows, flushed in batches by a background thread."""
+
+    def __init__(self, engine, queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE,
+                 flush_interval_ms: float = FLUSH_INTERVAL_MS, policy: str = POLICY,
+                 block_timeout_ms: float = BLOCK_TIMEOUT_MS, shutdown_timeout_s: float = SHUTDOWN_TIMEOUT_S):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}, got {policy!r}")
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.policy = policy
+        self.block_timeout = block_timeout_ms / 1000
+        self.shutdown_timeout = shutdown_timeout_s
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._deadline = None
+        self._closed = False
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._flush_ms = deque(maxlen=1000)   # latency of recent successful flushes
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.failed_flushes = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._closed = False
+        self._deadline = None
+        self._thread = threading.Thread(target=self._run, name="prediction-log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, row: dict) -> bool:
+        """Queues a row (never touches the database); False if it was dropped."""
+        try:
+            if self._closed:
+                raise queue.Full
+            if self.policy == "block":
+                self._queue.put(row, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning(f"prediction_logs queue full ({self._queue.maxsize} rows, policy={self.policy}): "
+                               f"{dropped} row(s) dropped so far")
+            return False
+        with self._stats_lock:
+            self.submitted += 1
+        return True
+
+    # ----------------------------------------------------------
+    # Writer thread
+    # ----------------------------------------------------------
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            if self._past_deadline():
+                self._drop_pending()
+                break
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def _next_batch(self) -> list:
+        """Waits for a first row, then collects until batch_size or flush_interval after it."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list):
+        """One INSERT per batch; retried with backoff until it lands or shutdown time runs out."""
+        delay = 0.1
+        while True:
+            start = time.perf_counter()
+            try:
+                with self.engine.begin() as conn:
+                    insert_prediction_logs(conn, batch)
+            except Exception as e:
+                with self._stats_lock:
+                    self.failed_flushes += 1
+                if self._past_deadline():
+                    logger.error(f"prediction_logs flush failed at shutdown, {len(batch)} row(s) lost: {e}")
+                    with self._stats_lock:
+                        self.dropped += len(batch)
+                    return
+                logger.error(f"prediction_logs flush of {len(batch)} row(s) failed, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY_S)
+                continue
+            with self._stats_lock:
+                self._flush_ms.append(1000 * (time.perf_counter() - start))
+                self.written += len(batch)
+                self.batches += 1
+            return
+
+    def _past_deadline(self) -> bool:
+        return self._deadline is not None and time.monotonic() > self._deadline
+
+    def _drop_pending(self):
+        lost = 0
+        while True:
+            try:
+                self._queue.get_nowait()
+                lost += 1
+            except queue.Empty:
+                break
+        if lost:
+            logger.error(f"Shutdown timeout: {lost} queued prediction_logs row(s) not written")
+            with self._stats_lock:
+                self.dropped += lost
+
+    def close(self, timeout: float = None):
+        """Stops accepting rows and flushes the queue (up to timeout seconds)."""
+        timeout = self.shutdown_timeout if timeout is None else timeout
+        self._closed = True
+        self._deadline = time.monotonic() + timeout
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout + self.flush_interval + 1)
+        logger.info(f"Prediction log writer closed: {self.written} row(s) written in {self.batches} batch(es), "
+                    f"{self.dropped} dropped, {self._queue.qsize()} left unwritten")
+
+    def stats(self) -> dict:
+        """Queue depth, drops and flush latency, for /health."""
+        with self._stats_lock:
+            flush_ms = list(self._flush_ms)
+            counts = {"submitted": self.submitted, "written": self.written, "dropped": self.dropped,
+                      "batches": self.batches, "failed_flushes": self.failed_flushes}
+        return {
+            "policy": self.policy,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "queue_depth": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+            **counts,
+            "avg_batch_rows": round(counts["written"] / counts["batches"], 1) if counts["batches"] else None,
+            "last_flush_ms": round(flush_ms[-1], 2) if flush_ms else None,
+            "flush_p50_ms": round(float(np.percentile(flush_ms, 50)), 2) if flush_ms else None,
+            "flush_p99_ms": round(float(np.percentile(flush_ms, 99)), 2) if flush_ms else None,
+        }
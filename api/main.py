@@ -1,13 +1,19 @@
+import asyncio
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import xgboost as xgb
+from typing import List, Optional
 import pandas as pd
-import glob
-import os
 import yaml
 from sqlalchemy import text
 from config.database import engine
 from config.logger import get_logger
+from model import registry
+from api.feature_cache import LatestFeatureCache, CACHE_ENABLED
+from api.log_writer import PredictionLogWriter, insert_prediction_logs
+from api import async_db as async_db_module
+from api.async_db import AsyncDatabase
+from feature_engineering.feature_store import load_latest_features, model_frame, model_vector
 
 logger = get_logger("api")
 app = FastAPI(title="Indian Market Standard ML API")
@@ -19,45 +25,238 @@ with open("config/config.yaml", "r") as f:
 
 # Global Model
 model = None
+model_version = None
+
+# Latest feature vector per stock, in model feature order (api/feature_cache.py)
+feature_cache = LatestFeatureCache(engine) if CACHE_ENABLED else None
+
+# /predict rows for prediction_logs, written in batches off the request path (api/log_writer.py)
+log_writer = PredictionLogWriter(engine)
+
+# asyncpg pool for /predict and /evaluate_positions (api/async_db.py), opened on startup;
+# None = the sync engine path in the threadpool
+async_db = None
 
 class PredictionRequest(BaseModel):
     symbol: str = "TCS.NS"
 
+class BatchPredictionRequest(BaseModel):
+    symbols: Optional[List[str]] = None  # None / omitted = every active stock
+
+
+def clean_symbol_name(symbol: str) -> str:
+    """"TCS.NS" -> "TCS" (stocks.symbol has no exchange suffix)."""
+    return symbol.replace(".NS", "").upper()
+
+
+def align_features(features: pd.DataFrame) -> pd.DataFrame:
+    """feature_store rows -> model input: exact model features, in order."""
+    return model_frame(features, model.get_booster().feature_names)
+
+
+def refresh_feature_cache() -> bool:
+    """Brings the feature cache up to date with feature_store and the model; False if unusable."""
+    if feature_cache is None:
+        return False
+    try:
+        feature_cache.refresh(model.get_booster().feature_names, model_version)
+        return True
+    except Exception as e:
+        logger.warning(f"Feature cache refresh failed, reading feature_store: {e}")
+        return False
+
+
+def cached_features(symbol: str):
+    """Latest cached feature row of a clean symbol, or None (not cached / cache unavailable)."""
+    return feature_cache.get(symbol) if refresh_feature_cache() else None
+
+
+async def cached_features_async(symbol: str):
+    """cached_features() for async endpoints: a due poll / reload runs in the threadpool."""
+    if feature_cache is None:
+        return None
+    if feature_cache.is_fresh(model.get_booster().feature_names, model_version):
+        return feature_cache.get(symbol)
+    return feature_cache.get(symbol) if await run_in_threadpool(refresh_feature_cache) else None
+
+
+def score_prediction(X_input, cached):
+    """(probability, label, source): the model's daily signal for these features if stored, else live."""
+    if cached is not None and cached["probability"] is not None:
+        return cached["probability"], cached["prediction"], "daily_signals"
+    # class 1 = Buy, same threshold as model.predict
+    probability = model.predict_proba(X_input)[0][1]
+    return probability, "Buy" if probability > 0.5 else "Sell", "live"
+
+
+def exit_thresholds():
+    """(take_profit, stop_loss) from the backtest config, as fractions."""
+    raw_take_profit = config.get('backtest', {}).get('take_profit', 0.15)
+    raw_stop_loss = config.get('backtest', {}).get('stop_loss', -0.05)
+    
+    # Allow for configs written as "-5%" or integer 15 instead of float
+    try: take_profit = float(raw_take_profit)
+    except: take_profit = 0.15
+    try: stop_loss = float(raw_stop_loss)
+    except: stop_loss = -0.05
+    return take_profit, stop_loss
+
+
+def sell_signal(symbol, buy_price, current_price, take_profit, stop_loss):
+    """Sell signal dict for a position that hit its target or stop, else None."""
+    # Calculate Profit/Loss %
+    profit_pct = (current_price - buy_price) / buy_price
+    
+    # Evaluate against rules
+    if profit_pct >= take_profit:
+        reason = f"TARGET REACHED (+{(profit_pct*100):.2f}%)"
+    elif profit_pct <= stop_loss:
+        reason = f"STOP LOSS HIT ({(profit_pct*100):.2f}%)"
+    else:
+        # Optional: Check if the main XGBoost model is screaming SELL for this stock today
+        # This could be added as a third check if desired.
+        return None
+    return {
+        "symbol": symbol,
+        "buy_price": float(buy_price),
+        "current_price": float(current_price),
+        "profit_percentage": float(profit_pct * 100),
+        "reason": reason
+    }
+
 @app.on_event("startup")
 def load_model():
-    global model
+    global model, model_version
     try:
-        # Find latest model
-        artifacts_dir = "model/artifacts"
-        list_of_files = glob.glob(f"{artifacts_dir}/model_cls_*.json")
-        if not list_of_files:
-            logger.error("No model_cls_*.json found in model/artifacts/ — predictions will fail!")
-            return
-            
-        latest_file = max(list_of_files, key=os.path.getctime)
-        
-        logger.info(f"Loading model: {latest_file}")
-        model = xgb.XGBClassifier()
-        model.load_model(latest_file)
-        logger.info("Model loaded successfully.")
+        # Deployed model = the registry's `current` version (model/registry.py)
+        version = registry.current_version()
+        model = registry.load_classifier(version)
+        model_version = version
+        logger.info(f"Model version {model_version} loaded successfully.")
+        # Warm the feature cache in the new model's feature order (a DB outage only defers it)
+        refresh_feature_cache()
+    except FileNotFoundError as e:
+        logger.error(f"{e} — predictions will fail!")
     except Exception as e:
         logger.error(f"Error loading model: {e}")
 
 
+@app.on_event("startup")
+def start_log_writer():
+    log_writer.start()
+
+
+@app.on_event("startup")
+async def connect_async_db():
+    global async_db
+    if not async_db_module.ASYNC_DB_ENABLED:
+        return
+    try:
+        db = AsyncDatabase()
+        await db.connect()
+        async_db = db
+    except Exception as e:
+        logger.warning(f"Async DB pool unavailable, serving from the sync engine: {e}")
+
+
+@app.on_event("shutdown")
+async def close_async_db():
+    global async_db
+    if async_db is not None:
+        db, async_db = async_db, None
+        await db.close()
+
+
+@app.on_event("shutdown")
+def flush_prediction_logs():
+    # Write what is still queued before the process exits
+    log_writer.close()
+
+
 @app.get("/health")
 def health():
-    return {"status": "ok", "model_loaded": model is not None}
+    return {
+        "status": "ok",
+        "model_loaded": model is not None,
+        "model_version": model_version,
+        "feature_cache": feature_cache.stats() if feature_cache is not None else None,
+        "prediction_logs": log_writer.stats(),
+        "async_db": async_db.stats() if async_db is not None else None,
+    }
 
 @app.post("/predict")
-def predict_symbol(req: PredictionRequest):
+async def predict_symbol(req: PredictionRequest):
     if not model:
         raise HTTPException(status_code=503, detail="Model not loaded")
-    
+    if async_db is None or not async_db.ready:
+        return await run_in_threadpool(predict_from_engine, req)
+
+    # Clean symbol: "TCS.NS" -> "TCS"
+    clean_symbol = clean_symbol_name(req.symbol)
+
+    try:
+        # 1. Latest PRE-CALCULATED features: in-memory cache, else one prepared
+        #    query on the async pool (a Record, no DataFrame)
+        cached = await cached_features_async(clean_symbol)
+        if cached is not None:
+            X_input = cached["features"]
+            stock_id, date, rsi, sentiment = cached["stock_id"], cached["date"], cached["rsi"], cached["sentiment"]
+        else:
+            stock_id = await async_db.stock_id(clean_symbol)
+            row = await async_db.latest_features(stock_id) if stock_id is not None else None
+            if row is None:
+                raise HTTPException(status_code=404, detail="No feature data found in store. Run feature_store.py first.")
+            date, rsi, sentiment = row["date"], float(row["rsi_14"]), float(row.get("sentiment_score") or 0.0)
+            X_input = model_vector(row, model.get_booster().feature_names)
+
+        # 2. Predict (or the stored daily signal)
+        probability, predicted_label, source = score_prediction(X_input, cached)
+
+        # 3. LOG THE PREDICTION: queued; "block" may wait for queue space, so off the event loop
+        log_row = prediction_log_row(stock_id, date, predicted_label, probability)
+        if log_writer.policy == "block":
+            await run_in_threadpool(log_writer.submit, log_row)
+        else:
+            log_writer.submit(log_row)
+
+        return prediction_response(req.symbol, date, rsi, sentiment, predicted_label, probability, source)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def prediction_log_row(stock_id, date, predicted_label, probability) -> dict:
+    return {
+        "stock_id": stock_id,
+        "prediction_date": date,
+        "predicted_class": predicted_label,
+        "probability": float(probability),
+        "model_version": model_version,
+    }
+
+
+def prediction_response(symbol, date, rsi, sentiment, predicted_label, probability, source) -> dict:
+    return {
+        "symbol": symbol,
+        "date": str(date),
+        "rsi": rsi,
+        "sentiment": sentiment,
+        "prediction": predicted_label,
+        "probability": float(probability),
+        "source": source,
+        "note": "Production Inference (Feature Store + Logging Active)"
+    }
+
+
+def predict_from_engine(req: PredictionRequest):
+    """/predict on the sync SQLAlchemy engine (async pool disabled or unavailable)."""
     # Clean symbol: "TCS.NS" -> "TCS"
-    clean_symbol = req.symbol.replace(".NS", "").upper()
+    clean_symbol = clean_symbol_name(req.symbol)
     
-    # 1. Fetch latest PRE-CALCULATED features from Feature Store
-    # This table now contains Technicals + Macro + Sentiment all merged.
+    # 1. Latest PRE-CALCULATED features: in-memory cache, else the Feature Store
+    # The feature_store table contains Technicals + Macro + Sentiment all merged.
     query = text("""
         SELECT * FROM feature_store 
         WHERE stock_id = (SELECT stock_id FROM stocks WHERE symbol = :symbol LIMIT 1)
@@ -65,90 +264,145 @@ def predict_symbol(req: PredictionRequest):
     """)
     
     try:
-        with engine.connect() as conn:
-            df = pd.read_sql(query, conn, params={"symbol": clean_symbol})
-            
-        if df.empty:
-            raise HTTPException(status_code=404, detail="No feature data found in store. Run feature_store.py first.")
-            
-        row = df.iloc[0]
-        date = row['date']
-        
-        # 2. Prepare Feature Vector for Model
-        # The feature_store columns match the model needs (mostly).
-        # We just need to align them.
-        
-        booster = model.get_booster()
-        model_features = booster.feature_names
-        
-        # Create input DF
-        X_input = pd.DataFrame([row])
-        
-        # Ensure all model columns exist (defensive programming)
-        for col in model_features:
-            if col not in X_input.columns:
-                logger.warning(f"Missing feature column '{col}', filling with 0")
-                X_input[col] = 0.0
+        cached = cached_features(clean_symbol)
+        if cached is not None:
+            # Already float32, in model feature order
+            X_input = cached["features"]
+            stock_id, date, rsi, sentiment = cached["stock_id"], cached["date"], cached["rsi"], cached["sentiment"]
+        else:
+            with engine.connect() as conn:
+                df = pd.read_sql(query, conn, params={"symbol": clean_symbol})
 
-                
-        # Filter to exact model features in order
-        X_input = X_input[model_features]
+            if df.empty:
+                raise HTTPException(status_code=404, detail="No feature data found in store. Run feature_store.py first.")
+
+            row = df.iloc[0]
+            stock_id, date = int(row['stock_id']), row['date']
+            rsi, sentiment = float(row['rsi_14']), float(row.get('sentiment_score', 0.0))
+
+            # 2. Prepare Feature Vector for Model
+            # The feature_store columns match the model needs (mostly).
+            # We just need to align them.
+            X_input = align_features(df.iloc[[0]])
         
-        # 3. Predict
-        prediction_cls = model.predict(X_input)[0]
-        probability = model.predict_proba(X_input)[0][1] # Prob of class 1 (Buy)
+        # 3. Predict (class 1 = Buy), unless this model already scored these
+        #    features in the daily_signals stage
+        probability, predicted_label, source = score_prediction(X_input, cached)
         
-        predicted_label = "Buy" if prediction_cls == 1 else "Sell"
+        # 4. LOG THE PREDICTION (Phase 12 Requirement): queued, written in batches
+        log_writer.submit(prediction_log_row(stock_id, date, predicted_label, probability))
         
-        # 4. LOG THE PREDICTION (Phase 12 Requirement)
-        log_query = text("""
-            INSERT INTO prediction_logs (stock_id, prediction_date, predicted_class, probability, model_version)
-            VALUES (
-                (SELECT stock_id FROM stocks WHERE symbol = :symbol),
-                :date,
-                :cls,
-                :prob,
-                'v1_xgboost'
-            )
-        """)
+        return prediction_response(req.symbol, date, rsi, sentiment, predicted_label, probability, source)
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/predict/batch")
+def predict_batch(req: BatchPredictionRequest):
+    """
+    Scores many stocks in one request (n8n morning scan, manual_scan.py):
+       1. one DISTINCT ON query for every latest feature_store row
+       2. one vectorized predict_proba call
+       3. one multi-row INSERT into prediction_logs
+    Omit `symbols` to score every active stock. Predictions are sorted by
+    Buy probability, highest first; symbols without feature rows are listed
+    under `missing`.
+    """
+    if not model:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+
+    requested = None
+    if req.symbols is not None:
+        # Clean symbol -> symbol as sent, echoed back in the response
+        requested = {clean_symbol_name(s): s for s in req.symbols}
+        if not requested:
+            return {"model_version": model_version, "count": 0, "missing": [], "predictions": []}
+
+    try:
+        # 1. Latest PRE-CALCULATED feature row per stock, in one pass over the (stock_id, date) key
+        with engine.connect() as conn:
+            df = load_latest_features(conn, symbols=requested, active_only=requested is None)
+
+        if df.empty:
+            raise HTTPException(status_code=404, detail="No feature data found in store. Run feature_store.py first.")
+
+        # 2. Predict every stock at once (class 1 = Buy, same threshold as model.predict)
+        probability = model.predict_proba(align_features(df))[:, 1]
+        labels = ["Buy" if p > 0.5 else "Sell" for p in probability]
+
+        # 3. LOG ALL PREDICTIONS in one statement
         with engine.begin() as conn:
-            conn.execute(log_query, {
-                "symbol": clean_symbol,
-                "date": date,
-                "cls": predicted_label,
-                "prob": float(probability)
-            })
-        
-        return {
-            "symbol": req.symbol,
+            insert_prediction_logs(conn, [{
+                "stock_id": stock_id,
+                "prediction_date": date,
+                "predicted_class": label,
+                "probability": prob,
+                "model_version": model_version,
+            } for stock_id, date, label, prob in zip(df["stock_id"], df["date"], labels, probability)])
+
+        predictions = [{
+            "symbol": requested.get(symbol, symbol) if requested else symbol,
             "date": str(date),
-            "rsi": float(row['rsi_14']),
-            "sentiment": float(row.get('sentiment_score', 0.0)),
-            "prediction": predicted_label,
-            "probability": float(probability),
-            "note": "Production Inference (Feature Store + Logging Active)"
+            "rsi": float(rsi),
+            "sentiment": float(sent),
+            "prediction": label,
+            "probability": float(prob),
+        } for symbol, date, rsi, sent, label, prob in zip(
+            df["symbol"], df["date"], df["rsi_14"], df["sentiment_score"].fillna(0.0), labels, probability)]
+        predictions.sort(key=lambda p: p["probability"], reverse=True)
+
+        found = set(df["symbol"])
+        return {
+            "model_version": model_version,
+            "count": len(predictions),
+            "missing": [s for clean, s in (requested or {}).items() if clean not in found],
+            "predictions": predictions,
         }
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/evaluate_positions")
-def evaluate_positions():
+async def evaluate_positions():
     """
     Evaluates all OPEN positions in the portfolio.
     Returns a list of stocks that hit the Target Profit or Stop Loss,
     triggering a "Sell" signal.
     """
-    # Load targets from config
-    raw_take_profit = config.get('backtest', {}).get('take_profit', 0.15)
-    raw_stop_loss = config.get('backtest', {}).get('stop_loss', -0.05)
-    
-    # Allow for configs written as "-5%" or integer 15 instead of float
-    try: take_profit = float(raw_take_profit)
-    except: take_profit = 0.15
-    try: stop_loss = float(raw_stop_loss)
-    except: stop_loss = -0.05
+    if async_db is None or not async_db.ready:
+        return await run_in_threadpool(evaluate_positions_from_engine)
+
+    take_profit, stop_loss = exit_thresholds()
+    try:
+        # 1. Fetch all OPEN positions
+        positions = await async_db.open_positions()
+        if not positions:
+            return {"message": "No open positions to evaluate", "sell_signals": []}
+
+        # 2. Latest closing price of every position, one prepared query each, concurrently on the pool
+        prices = await asyncio.gather(*(async_db.latest_price(pos["stock_id"]) for pos in positions))
+
+        # 3. Evaluate against rules (no price data found = skip)
+        signals = [sell_signal(pos["symbol"], pos["buy_price"], price, take_profit, stop_loss)
+                   for pos, price in zip(positions, prices) if price is not None]
+        return {
+            "message": f"Evaluated {len(positions)} open positions.",
+            "take_profit_threshold": take_profit * 100,
+            "stop_loss_threshold": stop_loss * 100,
+            "sell_signals": [signal for signal in signals if signal]
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error evaluating positions: {str(e)}")
+
+
+def evaluate_positions_from_engine():
+    """/evaluate_positions on the sync SQLAlchemy engine (async pool disabled or unavailable)."""
+    take_profit, stop_loss = exit_thresholds()
     
     sell_signals = []
     
@@ -168,9 +422,6 @@ def evaluate_positions():
             
             # 2. Iterate through each position and check current price
             for _, pos in positions_df.iterrows():
-                symbol = pos['symbol']
-                buy_price = pos['buy_price']
-                
                 # Fetch latest closing price (from most recent data ingestion)
                 # In a real ultra-live intraday system, this would call an external API.
                 price_query = text("""
@@ -184,30 +435,11 @@ def evaluate_positions():
                 if price_df.empty:
                     continue # No price data found for this stock, skip
                     
-                current_price = price_df.iloc[0]['current_price']
-                
-                # 3. Calculate Profit/Loss %
-                profit_pct = (current_price - buy_price) / buy_price
-                
-                # 4. Evaluate against rules
-                signal_reason = None
-                
-                if profit_pct >= take_profit:
-                    signal_reason = f"TARGET REACHED (+{(profit_pct*100):.2f}%)"
-                elif profit_pct <= stop_loss:
-                    signal_reason = f"STOP LOSS HIT ({(profit_pct*100):.2f}%)"
-                    
-                # Optional: Check if the main XGBoost model is screaming SELL for this stock today
-                # This could be added as a third check if desired.
-                    
-                if signal_reason:
-                    sell_signals.append({
-                        "symbol": symbol,
-                        "buy_price": float(buy_price),
-                        "current_price": float(current_price),
-                        "profit_percentage": float(profit_pct * 100),
-                        "reason": signal_reason
-                    })
+                # 3. Evaluate against rules
+                signal = sell_signal(pos['symbol'], pos['buy_price'], price_df.iloc[0]['current_price'],
+                                     take_profit, stop_loss)
+                if signal:
+                    sell_signals.append(signal)
                     
         return {
             "message": f"Evaluated {len(positions_df)} open positions.",
@@ -221,19 +453,24 @@ def evaluate_positions():
 
 
 @app.post("/retrain")
-def trigger_retrain():
+def trigger_retrain(mode: Optional[str] = None):
     """
     Triggers the full automated retraining pipeline:
        1. Ingest fresh data
        2. Rebuild features
-       3. Retrain model
+       3. Retrain model (?mode=update appends trees to the deployed model,
+          ?mode=full refits; default model.incremental.retrain_mode)
        4. Deploy ONLY if performance improves
     Useful to call from n8n on a weekly schedule.
     """
+    if mode not in (None, "update", "full"):
+        raise HTTPException(status_code=400, detail="mode must be 'update' or 'full'")
     try:
-        logger.info("Retraining triggered via API endpoint.")
+        logger.info(f"Retraining triggered via API endpoint (mode={mode or 'default'}).")
         from automation.retrain_pipeline import run_auto_retrain
-        result = run_auto_retrain()
+        result = run_auto_retrain(mode=mode)
+        if result.get("outcome") == "deployed":
+            load_model()  # serve the newly promoted version
         return result
     except Exception as e:
         logger.error(f"Retrain endpoint failed: {e}")
@@ -4,41 +4,80 @@ automation/retrain_pipeline.py
 Callable by n8n (or any scheduler) to automatically:
   1. Pull fresh price and news data
   2. Rebuild features
-  3. Retrain model
+  3. Retrain model — "update" mode appends trees to the deployed booster
+     using only rows after its train_cutoff, with a full retrain forced
+     every model.incremental.full_retrain_every updates; "full" refits
   4. Compare new model's metrics to the current deployed model
-  5. Deploy the new model ONLY if it improves performance
+  5. Deploy the new model ONLY if it improves performance — except a full
+     retrain forced in update mode (cadence, tree cap, feature change),
+     which replaces the deployed model unless its accuracy is more than
+     model.incremental.forced_full_tolerance below it: the deployed model
+     can no longer be updated, so keeping it for a small loss would force
+     a full retrain on every run
 
 Usage in n8n:
   HTTP Request node -> POST http://localhost:8003/retrain
   Or shell exec:
-    .\\venv\\Scripts\\python.exe automation/retrain_pipeline.py
+    .\\venv\\Scripts\\python.exe automation/retrain_pipeline.py [--mode full]
 """
 import sys
 import os
 sys.path.append(os.getcwd())
 
-import json
-import glob
+import argparse
 import yaml
 from datetime import datetime
 from config.logger import get_logger
+from model import registry
 
 logger = get_logger("retraining")
 
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+INCREMENTAL_CONFIG = config.get("model", {}).get("incremental", {})
+RETRAIN_MODE = INCREMENTAL_CONFIG.get("retrain_mode", "update")
+FORCED_FULL_TOLERANCE = INCREMENTAL_CONFIG.get("forced_full_tolerance", 0.02)
+
 
 def get_current_model_metrics() -> dict:
-    """Load the metrics of the currently deployed model for comparison."""
-    files = sorted(glob.glob("model/artifacts/metrics_cls_*.json"))
-    if not files:
-        logger.warning("No existing metrics found — treating current accuracy as 0.")
+    """Load the metrics of the currently deployed model (registry `current`) for comparison."""
+    version = registry.current_version()
+    if version is None:
+        logger.warning("No deployed model found — treating current accuracy as 0.")
         return {"accuracy": 0.0, "f1_score": 0.0}
-    latest = files[-1]
-    logger.info(f"Current deployed model metrics from: {latest}")
-    with open(latest, "r") as f:
-        return json.load(f)
+    logger.info(f"Current deployed model: version {version}")
+    return registry.load_manifest(version).get("metrics", {})
+
+
+def should_deploy(mode: str, current_acc: float, new_manifest: dict,
+                  tolerance: float = FORCED_FULL_TOLERANCE) -> tuple:
+    """
+    (deploy, reason) for a newly registered version against the deployed
+    model's accuracy. A full retrain forced in update mode may lose up to
+    `tolerance` accuracy; below that floor (e.g. bad data) it is refused.
+    """
+    new_acc = float(new_manifest["metrics"].get("accuracy", 0.0))
+    if mode == "update" and new_manifest["train_mode"] == "full":
+        if new_acc >= current_acc - tolerance:
+            return True, "full retrain forced in update mode"
+        return False, f"forced full retrain more than {tolerance:.4f} below the deployed model"
+    if new_acc > current_acc:
+        return True, "improvement"
+    return False, "no improvement"
+
+
+def score_signals():
+    """Post-refresh stage: daily_signals for the current model (the API scores live if this fails)."""
+    try:
+        from model.daily_signals import score_daily_signals
+        score_daily_signals()
+    except Exception as e:
+        logger.error(f"Daily signal scoring failed — API will score live: {e}")
 
 
-def run_auto_retrain():
+def run_auto_retrain(mode: str = None):
+    mode = mode or RETRAIN_MODE
     logger.info("=" * 60)
     logger.info("🔁 AUTOMATED RETRAINING PIPELINE STARTED")
     logger.info("=" * 60)
@@ -57,6 +96,7 @@ def run_auto_retrain():
         build_features()
         from feature_engineering.feature_store import update_feature_store
         update_feature_store()
+        score_signals()
 
         # Step 3: Get baseline metrics BEFORE retraining
         logger.info("[3/5] Recording current model metrics for comparison...")
@@ -65,31 +105,39 @@ def run_auto_retrain():
         logger.info(f"  Current model accuracy: {current_acc:.4f}")
 
         # Step 4: Retrain
-        logger.info("[4/5] Training new model...")
+        logger.info(f"[4/5] Training new model ({mode} mode)...")
         from model.train_model import train
-        train()
+        version = train(mode=mode, promote=False)
+        if version is None and mode == "update":
+            logger.info("No new training rows since the deployed model's cutoff — nothing to do.")
+            return {"status": "success", "outcome": "no_new_data", "old_accuracy": current_acc,
+                    "timestamp": datetime.now().isoformat()}
 
         # Step 5: Compare & Auto-Deploy
         logger.info("[5/5] Comparing new model vs current...")
-        new_metric_files = sorted(glob.glob("model/artifacts/metrics_cls_*.json"))
-        if not new_metric_files:
-            logger.error("Training failed — no new metrics file found.")
-            return {"status": "failed", "reason": "No new model metrics found"}
-
-        with open(new_metric_files[-1], "r") as f:
-            new_metrics = json.load(f)
-
-        new_acc = float(new_metrics.get("accuracy", 0.0))
-        logger.info(f"  New model accuracy: {new_acc:.4f}")
-
-        if new_acc > current_acc:
-            logger.info(f"✅ IMPROVEMENT DETECTED: {current_acc:.4f} → {new_acc:.4f}. New model deployed!")
+        if version is None:
+            logger.error("Training failed — no new model was registered.")
+            return {"status": "failed", "reason": "No new model registered"}
+
+        new_manifest = registry.load_manifest(version)
+        new_acc = float(new_manifest["metrics"].get("accuracy", 0.0))
+        logger.info(f"  New model accuracy: {new_acc:.4f} (version {version})")
+
+        deploy, reason = should_deploy(mode, current_acc, new_manifest)
+        if deploy:
+            # Atomic swap of the `current` pointer; loaders pick it up on their next load
+            registry.promote(version)
+            logger.info(f"✅ New model deployed ({reason}): {current_acc:.4f} → {new_acc:.4f}")
             outcome = "deployed"
         else:
-            # Remove the new model artifact to keep the old one
-            logger.warning(f"⚠️ No improvement: {new_acc:.4f} <= {current_acc:.4f}. Keeping current model.")
-            # Optional: delete the non-improving new model here
+            # The new version stays registered (not current) until retention GC removes it
+            logger.warning(f"⚠️ Not deployed ({reason}): {new_acc:.4f} vs {current_acc:.4f}. Keeping current model.")
+            if mode == "update" and new_manifest["train_mode"] == "full":
+                logger.warning("The deployed model still needs a full retrain; the next run will try again.")
             outcome = "kept_old"
+        registry.gc()
+        if outcome == "deployed":
+            score_signals()  # the API now serves the new version
 
         logger.info("=" * 60)
         logger.info(f"🏁 RETRAINING COMPLETE — Outcome: {outcome.upper()}")
@@ -98,6 +146,11 @@ def run_auto_retrain():
         return {
             "status": "success",
             "outcome": outcome,
+            "version": version,
+            "current_version": registry.current_version(),
+            "train_mode": new_manifest["train_mode"],
+            "train_cutoff": new_manifest["train_cutoff"],
+            "reason": reason,
             "old_accuracy": current_acc,
             "new_accuracy": new_acc,
             "timestamp": datetime.now().isoformat(),
@@ -109,5 +162,9 @@ def run_auto_retrain():
 
 
 if __name__ == "__main__":
-    result = run_auto_retrain()
+    parser = argparse.ArgumentParser(description="Automated retraining pipeline.")
+    parser.add_argument("--mode", choices=["update", "full"], default=None,
+                        help=f"Retrain mode (default: model.incremental.retrain_mode = {RETRAIN_MODE}).")
+    args = parser.parse_args()
+    result = run_auto_retrain(mode=args.mode)
     print(result)
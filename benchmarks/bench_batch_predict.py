@@ -0,0 +1,150 @@
+"""
+benchmarks/bench_batch_predict.py
+
+Scoring the whole universe through the API:
+  - per-symbol:        one POST /predict per stock, feature cache off
+                       (stock subquery + SELECT * on feature_store,
+                       predict_proba, prediction_logs row queued for
+                       the batched writer, api/log_writer.py)
+  - per-symbol cached: the same calls served from the in-process latest-
+                       feature cache (api/feature_cache.py)
+  - batch:             one POST /predict/batch (DISTINCT ON query, one
+                       predict_proba, one multi-row INSERT)
+
+Each size is loaded into a scratch database (<DB_NAME>_bench, created and
+dropped by the benchmark) with --days feature_store rows per stock. The
+timed part runs in a child process pointed at it through DB_NAME, calling
+the app in-process with FastAPI's TestClient (no network), against a
+tuned-shaped model (best_params.yaml) registered in a temp registry.
+
+Usage:
+    python benchmarks/bench_batch_predict.py
+    python benchmarks/bench_batch_predict.py --sizes 100 500 1000 --days 20
+"""
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import argparse
+import json
+import subprocess
+import tempfile
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from benchmarks.common import make_feature_store, store_model, timed
+
+BENCH_DB = f"{os.getenv('DB_NAME', 'market_db')}_bench"
+
+
+# ----------------------------------------------------------
+# Child process (DB_NAME = scratch database)
+# ----------------------------------------------------------
+def child(repeats: int):
+    from fastapi.testclient import TestClient
+    from model import registry
+    from api import main as api
+
+    with tempfile.TemporaryDirectory() as registry_dir:
+        registry.REGISTRY_DIR = registry_dir
+        registry.register(store_model(), {}, {})
+        client = TestClient(api.app)
+        api.load_model()
+        api.log_writer.start()
+        with api.engine.connect() as conn:
+            symbols = [s for (s,) in conn.execute(text("SELECT symbol FROM stocks WHERE is_active = true"))]
+
+        client.post("/predict/batch", json={})  # warm-up (pool, model)
+        t = {}
+        cache, api.feature_cache = api.feature_cache, None
+        with timed(t, "per_symbol"):
+            per_symbol = [client.post("/predict", json={"symbol": s}).json() for s in symbols]
+        api.feature_cache = cache
+        with timed(t, "per_symbol_cached"):
+            cached = [client.post("/predict", json={"symbol": s}).json() for s in symbols]
+        batch_s = []
+        for _ in range(repeats):
+            with timed(t, "batch"):
+                batch = client.post("/predict/batch", json={}).json()
+            batch_s.append(t["batch"])
+        api.log_writer.close()
+
+    assert batch["count"] == len(symbols)
+    single = {p["symbol"]: p["probability"] for p in per_symbol}
+    assert [p["probability"] for p in cached] == [p["probability"] for p in per_symbol]
+    assert cache.stats()["hit_ratio"] == 1.0
+    assert all(np.isclose(single[p["symbol"]], p["probability"]) for p in batch["predictions"])
+    print(json.dumps({"per_symbol_s": t["per_symbol"], "per_symbol_cached_s": t["per_symbol_cached"],
+                      "batch_s": float(np.median(batch_s))}))
+
+
+# ----------------------------------------------------------
+# Parent process
+# ----------------------------------------------------------
+def load_universe(url, n_symbols, n_days):
+    eng = create_engine(url)
+    with open("db/schema.sql") as f:
+        schema = f.read()
+    with eng.begin() as conn:
+        conn.exec_driver_sql(schema)
+        conn.execute(text("INSERT INTO stocks (stock_id, symbol) "
+                          "SELECT i, 'SYM' || i FROM generate_series(1, :n) i"), {"n": n_symbols})
+    eng.dispose()
+    return make_feature_store(n_symbols, n_days)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--days", type=int, default=60, help="feature_store rows per stock.")
+    parser.add_argument("--repeats", type=int, default=5, help="Batch calls timed (median reported).")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    from config.database import DATABASE_URL
+    admin = create_engine(DATABASE_URL, isolation_level="AUTOCOMMIT")
+    bench_url = DATABASE_URL.rsplit("/", 1)[0] + f"/{BENCH_DB}"
+    env = dict(os.environ, DB_NAME=BENCH_DB)
+
+    rows = []
+    try:
+        for n in args.sizes:
+            with admin.connect() as conn:
+                conn.execute(text(f'DROP DATABASE IF EXISTS "{BENCH_DB}"'))
+                conn.execute(text(f'CREATE DATABASE "{BENCH_DB}"'))
+            store = load_universe(bench_url, n, args.days)
+            subprocess.run([sys.executable, "db/create_prod_tables.py"], env=env, check=True,
+                           stdout=subprocess.DEVNULL)
+            from config.database import bulk_upsert
+            eng = create_engine(bench_url)
+            with eng.begin() as conn:
+                bulk_upsert(store, "feature_store", ["stock_id", "date"], conn=conn)
+            eng.dispose()
+
+            out = subprocess.run([sys.executable, __file__, "--child", str(args.repeats)], env=env, check=True,
+                                 capture_output=True, text=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            rows.append({
+                "symbols": n,
+                "per_symbol_ms": round(1000 * result["per_symbol_s"], 1),
+                "per_symbol_cached_ms": round(1000 * result["per_symbol_cached_s"], 1),
+                "batch_ms": round(1000 * result["batch_s"], 1),
+                "speedup": round(result["per_symbol_s"] / result["batch_s"], 1),
+            })
+            print(rows[-1])
+    finally:
+        with admin.connect() as conn:
+            conn.execute(text(f'DROP DATABASE IF EXISTS "{BENCH_DB}"'))
+        admin.dispose()
+
+    print("\n" + pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+benchmarks/bench_bulk_write.py
+
+Rows/sec of the old DataFrame write paths vs config.database.bulk_upsert
+(COPY into a staging table + one INSERT ... ON CONFLICT merge), writing a
+price-shaped frame into a scratch table with a (stock_id, date) unique key.
+
+Compared writers:
+  - row_by_row : one conn.execute per row (old load_prices / load_index / save_news);
+                 timed on a --row-sample slice and reported as rows/sec
+  - to_sql     : to_sql(method='multi', chunksize=1000) (old build_features)
+  - copy_merge : bulk_upsert into an empty table, then again as an all-conflict upsert
+
+The scratch table is dropped afterwards.
+
+Usage:
+    python benchmarks/bench_bulk_write.py --rows 1000000
+"""
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import argparse
+
+import pandas as pd
+from sqlalchemy import text
+
+from benchmarks.common import make_price_panel, timed
+from config.database import engine, bulk_upsert
+
+TABLE = "bench_bulk_write"
+
+
+def reset_table():
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        conn.execute(text(f"""
+            CREATE TABLE {TABLE} (
+                stock_id INTEGER, date DATE, close FLOAT, volume BIGINT, open FLOAT,
+                PRIMARY KEY (stock_id, date)
+            )
+        """))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--row-sample", type=int, default=20_000,
+                        help="Rows used to time the row-by-row path (it is far too slow for --rows).")
+    args = parser.parse_args()
+
+    n_days = 2000
+    df = make_price_panel(-(-args.rows // n_days), n_days).head(args.rows)
+    df["date"] = pd.to_datetime(df["date"]).dt.date
+
+    t = {}
+    reset_table()
+    sample = df.head(args.row_sample)
+    insert = text(f"""
+        INSERT INTO {TABLE} (stock_id, date, close, volume, open)
+        VALUES (:stock_id, :date, :close, :volume, :open)
+        ON CONFLICT (stock_id, date) DO NOTHING
+    """)
+    with timed(t, "row_by_row"), engine.begin() as conn:
+        for row in sample.itertuples(index=False):
+            conn.execute(insert, row._asdict())
+
+    reset_table()
+    with timed(t, "to_sql"), engine.begin() as conn:
+        df.to_sql(TABLE, conn, if_exists="append", index=False, method="multi", chunksize=1000)
+
+    reset_table()
+    with timed(t, "copy_merge"):
+        bulk_upsert(df, TABLE, ["stock_id", "date"])
+    with timed(t, "copy_merge_conflicts"):
+        bulk_upsert(df, TABLE, ["stock_id", "date"])
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE {TABLE}"))
+
+    report = pd.DataFrame([
+        {"writer": "row_by_row", "rows": len(sample), "seconds": t["row_by_row"]},
+        {"writer": "to_sql multi/1000", "rows": len(df), "seconds": t["to_sql"]},
+        {"writer": "copy + merge (insert)", "rows": len(df), "seconds": t["copy_merge"]},
+        {"writer": "copy + merge (upsert)", "rows": len(df), "seconds": t["copy_merge_conflicts"]},
+    ])
+    report["rows_per_sec"] = (report["rows"] / report["seconds"]).round(0).astype(int)
+    report["seconds"] = report["seconds"].round(2)
+    print(report.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
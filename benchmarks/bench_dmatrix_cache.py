@@ -0,0 +1,159 @@
+"""
+benchmarks/bench_dmatrix_cache.py
+
+Wall time of a tuning run (N Optuna-style trials) plus a walk-forward pass:
+  - legacy: XGBClassifier.fit on pandas slices, one fresh binned input per
+    trial / fold (plus the per-trial eval_set tune_model used to pass)
+  - cached: QuantizedDataset (model/dmatrix_cache.py): row-range views, one
+    quantile sketch per train window, and one binned train/test matrix
+    reused by every trial
+
+Both paths run the same parameter sets and folds on build_dataset() from the
+database configured in config/database.py (DB_* env vars). Test accuracies of
+both paths are reported so any effect of the cached matrices is visible,
+along with the time each path spends only on building XGBoost inputs.
+
+Usage:
+    python benchmarks/bench_dmatrix_cache.py
+    python benchmarks/bench_dmatrix_cache.py --trials 10 --max-trees 200
+"""
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import argparse
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+
+from benchmarks.common import timed
+from model.dmatrix_cache import QuantizedDataset, fit_booster
+from model.dtype_policy import to_day_numbers
+from model.prepare_dataset import build_dataset
+from model.walk_forward import PARAMS, TRAIN_YEARS, TEST_MONTHS, feature_selection
+
+
+def trial_params(n_trials: int, max_trees: int, seed: int = 42) -> list:
+    """The tune_model search space, sampled up front so both paths see the same trials."""
+    rng = np.random.default_rng(seed)
+    log_uniform = lambda lo, hi: float(np.exp(rng.uniform(np.log(lo), np.log(hi))))
+    return [{
+        "objective": "binary:logistic", "eval_metric": "logloss", "booster": "gbtree",
+        "n_estimators": int(rng.integers(100, max_trees + 1)),
+        "max_depth": int(rng.integers(3, 11)),
+        "learning_rate": log_uniform(0.01, 0.3),
+        "subsample": float(rng.uniform(0.5, 1.0)),
+        "colsample_bytree": float(rng.uniform(0.5, 1.0)),
+        "reg_alpha": log_uniform(1e-8, 10.0),
+        "reg_lambda": log_uniform(1e-8, 10.0),
+        "min_child_weight": int(rng.integers(1, 11)),
+        "random_state": 42, "n_jobs": -1,
+    } for _ in range(n_trials)]
+
+
+def fold_ranges(days: np.ndarray) -> list:
+    """walk_forward_backtest's windows as (lo, mid, hi) row ranges of date-sorted rows."""
+    start, end = pd.Timestamp("1970-01-01") + pd.to_timedelta([days.min(), days.max()], unit="D")
+    folds = []
+    while True:
+        train_end = start + pd.DateOffset(years=TRAIN_YEARS)
+        test_end = train_end + pd.DateOffset(months=TEST_MONTHS)
+        if test_end > end:
+            return folds
+        lo, mid, hi = np.searchsorted(days, to_day_numbers([start, train_end, test_end]))
+        if mid - lo >= 500 and hi - mid >= 100:
+            folds.append((lo, mid, hi))
+        start += pd.DateOffset(months=6)
+
+
+def legacy(df, feature_cols, trials, folds):
+    X, y = df[feature_cols], df["target_class"]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+    spw = (y_train == 0).sum() / max((y_train == 1).sum(), 1)
+    scores = []
+    for params in trials:
+        model = xgb.XGBClassifier(**params, scale_pos_weight=spw)
+        model.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=False)
+        scores.append(accuracy_score(y_test, model.predict(X_test)))
+    for lo, mid, hi in folds:
+        train_df, test_df = df.iloc[lo:mid], df.iloc[mid:hi]
+        model = xgb.XGBClassifier(**PARAMS).fit(train_df[feature_cols], train_df["target_class"])
+        scores.append(accuracy_score(test_df["target_class"], model.predict(test_df[feature_cols])))
+    return scores
+
+
+def cached(df, feature_cols, trials, folds):
+    data = QuantizedDataset(df, feature_cols)
+    train_rows, test_rows = data.split(test_size=0.2)
+    y_test = data.rows(*test_rows)[1]
+    spw = data.scale_pos_weight(*train_rows)
+    scores = []
+    for params in trials:
+        booster = fit_booster({**params, "scale_pos_weight": spw}, data.dmatrix(*train_rows))
+        scores.append(accuracy_score(y_test, booster.predict(data.dmatrix(*test_rows, ref=train_rows)) > 0.5))
+    for lo, mid, hi in folds:
+        booster = fit_booster(PARAMS, data.dmatrix(lo, mid))
+        scores.append(accuracy_score(data.rows(mid, hi)[1], booster.predict(data.dmatrix(mid, hi, ref=(lo, mid))) > 0.5))
+    return scores
+
+
+def input_prep(df, feature_cols, n_trials, folds):
+    """Seconds spent only on building XGBoost inputs (no training) by each path."""
+    t = {}
+    X, y = df[feature_cols], df["target_class"]
+    n_train = len(df) - int(np.ceil(len(df) * 0.2))
+    with timed(t, "legacy"):
+        for _ in range(n_trials):
+            dtrain = xgb.QuantileDMatrix(X.iloc[:n_train], y.iloc[:n_train])
+            xgb.QuantileDMatrix(X.iloc[n_train:], y.iloc[n_train:], ref=dtrain)
+        for lo, mid, hi in folds:
+            xgb.QuantileDMatrix(df.iloc[lo:mid][feature_cols], df.iloc[lo:mid]["target_class"])
+            xgb.DMatrix(df.iloc[mid:hi][feature_cols])
+    with timed(t, "cached"):
+        data = QuantizedDataset(df, feature_cols)
+        train_rows, test_rows = data.split(test_size=0.2)
+        for _ in range(n_trials):
+            data.dmatrix(*train_rows), data.dmatrix(*test_rows, ref=train_rows)
+        for lo, mid, hi in folds:
+            data.dmatrix(lo, mid), data.dmatrix(mid, hi, ref=(lo, mid))
+    return t
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--max-trees", type=int, default=500, help="Upper bound of the n_estimators search range.")
+    args = parser.parse_args()
+
+    df = build_dataset().sort_values("date", kind="stable").reset_index(drop=True)
+    feature_cols = feature_selection(df)
+    trials = trial_params(args.trials, args.max_trees)
+    folds = fold_ranges(df["date"].to_numpy())
+    print(f"{len(df)} rows x {len(feature_cols)} features | {len(trials)} trials + {len(folds)} folds")
+
+    prep = input_prep(df, feature_cols, len(trials), folds)
+    t = {}
+    with timed(t, "legacy"):
+        old = legacy(df, feature_cols, trials, folds)
+    with timed(t, "cached"):
+        new = cached(df, feature_cols, trials, folds)
+
+    n = len(trials)
+    print(pd.DataFrame([{
+        "legacy_s": round(t["legacy"], 1),
+        "cached_s": round(t["cached"], 1),
+        "speedup": round(t["legacy"] / t["cached"], 2),
+        "legacy_prep_s": round(prep["legacy"], 2),
+        "cached_prep_s": round(prep["cached"], 2),
+        "legacy_best_trial_acc": round(max(old[:n]), 4),
+        "cached_best_trial_acc": round(max(new[:n]), 4),
+        "legacy_mean_fold_acc": round(float(np.mean(old[n:])), 4),
+        "cached_mean_fold_acc": round(float(np.mean(new[n:])), 4),
+    }]).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
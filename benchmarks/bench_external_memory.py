@@ -0,0 +1,120 @@
+"""
+benchmarks/bench_external_memory.py
+
+Peak RSS of training in memory (whole dataset in pandas, QuantizedDataset)
+vs out-of-core (Parquet shards streamed through a DataIter into an
+ExtMemQuantileDMatrix, as `train_model.py --external-memory` does) as the
+dataset grows.
+
+Synthetic shards shaped like build_dataset() output (stock_id, date, 21
+float32 features, target_class) are written to a temp directory; each
+training run is its own child process so its peak RSS can be read from
+os.wait4(). Both runs use the same time-ordered 80/20 split.
+
+Usage:
+    python benchmarks/bench_external_memory.py
+    python benchmarks/bench_external_memory.py --rows 500000 2000000 --shard-rows 100000
+"""
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import argparse
+import json
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+N_FEATURES = 21
+PARAMS = {"objective": "binary:logistic", "n_estimators": 20, "max_depth": 6, "random_state": 42}
+
+
+def synthetic_chunks(n_rows: int, shard_rows: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, shard_rows):
+        n = min(shard_rows, n_rows - start)
+        X = rng.normal(size=(n, N_FEATURES)).astype(np.float32)
+        chunk = pd.DataFrame(X, columns=[f"f{k}" for k in range(N_FEATURES)])
+        chunk.insert(0, "date", (17000 + np.arange(start, start + n) // 500).astype(np.int32))
+        chunk.insert(0, "stock_id", (np.arange(start, start + n) % 500).astype(np.int16))
+        chunk["target_class"] = (X[:, 0] + rng.normal(0, 1, n) > 0).astype(np.int8)
+        yield chunk
+
+
+def child(mode: str, shard_dir: str):
+    from model.dmatrix_cache import QuantizedDataset, ShardedDataset, fit_booster, read_manifest
+    manifest = read_manifest(shard_dir)
+    feature_cols = [c for c in manifest["columns"] if c.startswith("f")]
+    if mode == "in-memory":
+        df = pd.concat([pd.read_parquet(os.path.join(shard_dir, s["file"])) for s in manifest["shards"]],
+                       ignore_index=True)
+        data = QuantizedDataset(df, feature_cols)
+    else:
+        data = ShardedDataset(shard_dir, feature_cols)
+    train_rows, test_rows = data.split(test_size=0.2)
+    booster = fit_booster(PARAMS, data.dmatrix(*train_rows))
+    acc = float(((data.predict(booster, *test_rows) > 0.5) == data.labels(*test_rows)).mean())
+    if mode == "external":
+        data.close()
+    print(json.dumps({"accuracy": acc}))
+
+
+def run_child(mode, shard_dir):
+    """Returns (peak RSS in MB, seconds, accuracy) of one training run."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, __file__, "--child", mode, "--shard-dir", shard_dir],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    out = proc.stdout.read()
+    _, status, usage = os.wait4(proc.pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError(f"{mode} training failed")
+    acc = json.loads(out.strip().splitlines()[-1])["accuracy"]
+    return usage.ru_maxrss / 1024, time.perf_counter() - start, acc  # ru_maxrss is KB on Linux
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[500_000, 1_000_000, 2_000_000])
+    parser.add_argument("--shard-rows", type=int, default=250_000)
+    parser.add_argument("--child", choices=["in-memory", "external"], help=argparse.SUPPRESS)
+    parser.add_argument("--shard-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.shard_dir)
+        return
+
+    from model.prepare_dataset import write_shards
+
+    rows = []
+    tmp = tempfile.mkdtemp()
+    try:
+        for n in args.rows:
+            shard_dir = os.path.join(tmp, f"shards_{n}")
+            write_shards(synthetic_chunks(n, args.shard_rows), shard_dir)
+            in_mb, in_s, in_acc = run_child("in-memory", shard_dir)
+            ext_mb, ext_s, ext_acc = run_child("external", shard_dir)
+            rows.append({
+                "rows": n,
+                "in_memory_peak_mb": round(in_mb),
+                "external_peak_mb": round(ext_mb),
+                "in_memory_s": round(in_s, 1),
+                "external_s": round(ext_s, 1),
+                "in_memory_acc": round(in_acc, 4),
+                "external_acc": round(ext_acc, 4),
+            })
+            print(rows[-1])
+            shutil.rmtree(shard_dir)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"\nshard_rows={args.shard_rows}")
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
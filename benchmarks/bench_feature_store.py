@@ -0,0 +1,164 @@
+"""
+benchmarks/bench_feature_store.py
+
+Nightly feature_store refresh: the old per-stock loop (price fetch, macro
+fetch, sentiment fetch and insert for every stock, each on its own
+connection) vs the set-based update_feature_store (fixed number of
+statements, one transaction). Reports wall time and SQL statements per run
+for one new trading day, plus the per-phase timings of the set-based path.
+
+Each size is loaded into a scratch database (<DB_NAME>_bench, created and
+dropped by the benchmark); the timed part runs in a child process pointed
+at it through DB_NAME.
+
+Usage:
+    python benchmarks/bench_feature_store.py
+    python benchmarks/bench_feature_store.py --sizes 100 500 --days 300
+"""
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import argparse
+import json
+import subprocess
+
+import pandas as pd
+from sqlalchemy import create_engine, event, text
+
+from benchmarks.common import make_price_panel, timed
+
+BENCH_DB = f"{os.getenv('DB_NAME', 'market_db')}_bench"
+
+
+# ----------------------------------------------------------
+# Child process (DB_NAME = scratch database)
+# ----------------------------------------------------------
+def legacy_update(engine, calculate_technicals):
+    """The per-stock loop update_feature_store used to run."""
+    with engine.connect() as conn:
+        stocks = pd.read_sql(text("SELECT stock_id, symbol FROM stocks WHERE is_active = true"), conn)
+    for stock_id in stocks["stock_id"]:
+        with engine.connect() as conn:
+            df = pd.read_sql(text("SELECT date, open, high, low, close, volume FROM prices "
+                                  "WHERE stock_id = :sid ORDER BY date DESC LIMIT 100"),
+                             conn, params={"sid": int(stock_id)})
+        latest = calculate_technicals(df.sort_values("date")).iloc[-1]
+        with engine.connect() as conn:
+            pd.read_sql(text("SELECT * FROM index_prices ORDER BY date DESC LIMIT 1"), conn)
+        with engine.connect() as conn:
+            sent = pd.read_sql(text("SELECT AVG(sentiment_score) AS score FROM news WHERE date = :date"),
+                               conn, params={"date": latest["date"]})
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO feature_store (stock_id, date, return_1d, rsi_14, sentiment_score)
+                VALUES (:sid, :date, :r1, :rsi, :sent)
+                ON CONFLICT (stock_id, date) DO UPDATE SET
+                    return_1d = EXCLUDED.return_1d, rsi_14 = EXCLUDED.rsi_14,
+                    sentiment_score = EXCLUDED.sentiment_score
+            """), {"sid": int(stock_id), "date": latest["date"], "r1": float(latest["return_1d"]),
+                   "rsi": float(latest["rsi_14"]), "sent": float(sent.iloc[0]["score"] or 0)})
+
+
+def child(new_day: str):
+    from config.database import engine, bulk_upsert
+    from feature_engineering.build_features import calculate_technicals
+    from feature_engineering.feature_store import update_feature_store
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.append(1))
+
+    def run(name, fn):
+        statements.clear()
+        t = {}
+        with timed(t, name):
+            out = fn()
+        return t[name], len(statements), out
+
+    result = {}
+    result["seed_s"], _, _ = run("seed", update_feature_store)  # first run seeds indicator state
+
+    # One new trading day for every stock
+    with engine.begin() as conn:
+        last = pd.read_sql(text("SELECT DISTINCT ON (stock_id) stock_id, close, volume, open FROM prices "
+                                "ORDER BY stock_id, date DESC"), conn)
+        last["date"] = pd.Timestamp(new_day).date()
+        last["close"] *= 1.01
+        bulk_upsert(last, "prices", ["stock_id", "date"], conn=conn)
+
+    result["set_based_s"], result["set_based_statements"], phases = run("set_based", update_feature_store)
+    result["legacy_s"], result["legacy_statements"], _ = run("legacy", lambda: legacy_update(engine, calculate_technicals))
+    result["phases"] = {k: round(v, 4) for k, v in phases.items()}
+    print(json.dumps(result))
+
+
+# ----------------------------------------------------------
+# Parent process
+# ----------------------------------------------------------
+def load_universe(url, n_symbols, n_days):
+    eng = create_engine(url)
+    with open("db/schema.sql") as f:
+        schema = f.read()
+    prices = make_price_panel(n_symbols, n_days)
+    prices["date"] = pd.to_datetime(prices["date"]).dt.date
+    with eng.begin() as conn:
+        conn.exec_driver_sql(schema)
+        conn.execute(text("INSERT INTO stocks (stock_id, symbol) "
+                          "SELECT i, 'SYM' || i FROM generate_series(1, :n) i"), {"n": n_symbols})
+        conn.execute(text("CREATE TABLE news (id SERIAL PRIMARY KEY, date DATE, symbol TEXT, "
+                          "headline TEXT, sentiment_score FLOAT, source TEXT)"))
+    from config.database import bulk_upsert
+    with eng.begin() as conn:
+        bulk_upsert(prices, "prices", ["stock_id", "date"], conn=conn)
+    eng.dispose()
+    return prices["date"].max()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--days", type=int, default=300)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    from config.database import DATABASE_URL
+    admin = create_engine(DATABASE_URL, isolation_level="AUTOCOMMIT")
+    bench_url = DATABASE_URL.rsplit("/", 1)[0] + f"/{BENCH_DB}"
+    env = dict(os.environ, DB_NAME=BENCH_DB)
+
+    rows = []
+    try:
+        for n in args.sizes:
+            with admin.connect() as conn:
+                conn.execute(text(f'DROP DATABASE IF EXISTS "{BENCH_DB}"'))
+                conn.execute(text(f'CREATE DATABASE "{BENCH_DB}"'))
+            last_day = load_universe(bench_url, n, args.days)
+            subprocess.run([sys.executable, "db/create_prod_tables.py"], env=env, check=True,
+                           stdout=subprocess.DEVNULL)
+            new_day = str((pd.Timestamp(last_day) + pd.offsets.BDay(1)).date())
+            out = subprocess.run([sys.executable, __file__, "--child", new_day], env=env, check=True,
+                                 capture_output=True, text=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            rows.append({
+                "symbols": n,
+                "legacy_s": round(result["legacy_s"], 3),
+                "legacy_statements": result["legacy_statements"],
+                "set_based_s": round(result["set_based_s"], 3),
+                "set_based_statements": result["set_based_statements"],
+                "speedup": round(result["legacy_s"] / result["set_based_s"], 1),
+            })
+            print(rows[-1], "phases:", result["phases"])
+    finally:
+        with admin.connect() as conn:
+            conn.execute(text(f'DROP DATABASE IF EXISTS "{BENCH_DB}"'))
+        admin.dispose()
+
+    print("\n" + pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
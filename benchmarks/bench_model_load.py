@@ -0,0 +1,95 @@
+"""
+benchmarks/bench_model_load.py
+
+Time to find and load the deployed classifier:
+  - legacy:   glob model_cls_*.json, max(getctime), XGBClassifier.load_model(JSON)
+  - registry: read the `current` pointer + manifest, verify the sha256,
+              XGBClassifier.load_model(UBJSON) (model/registry.py)
+
+A booster shaped like the tuned model (best_params.yaml: 449 trees, depth
+10) is trained on synthetic data and saved --versions times in both layouts
+in a temp directory. Artifact sizes are reported alongside load times.
+
+Usage:
+    python benchmarks/bench_model_load.py
+    python benchmarks/bench_model_load.py --versions 50 --repeats 20
+"""
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import argparse
+import glob
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from benchmarks.common import timed
+from model import registry
+from model.walk_forward import PARAMS
+
+
+def tuned_shaped_booster(n_rows: int = 30_000, n_features: int = 21, seed: int = 42) -> xgb.Booster:
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, n_features)).astype(np.float32)
+    y = (X[:, 0] + rng.normal(0, 1, n_rows) > 0).astype(int)
+    dtrain = xgb.DMatrix(X, y, feature_names=[f"f{k}" for k in range(n_features)])
+    params = {"objective": "binary:logistic", "max_depth": PARAMS.get("max_depth", 10), "seed": seed}
+    return xgb.train(params, dtrain, num_boost_round=PARAMS.get("n_estimators", 449))
+
+
+def legacy_load(artifacts_dir: str) -> xgb.XGBClassifier:
+    latest = max(glob.glob(os.path.join(artifacts_dir, "model_cls_*.json")), key=os.path.getctime)
+    model = xgb.XGBClassifier()
+    model.load_model(latest)
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--versions", type=int, default=20, help="Saved models in each layout.")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    booster = tuned_shaped_booster()
+    tmp = tempfile.mkdtemp()
+    try:
+        artifacts_dir, registry_dir = os.path.join(tmp, "artifacts"), os.path.join(tmp, "registry")
+        os.makedirs(artifacts_dir)
+        start = datetime(2026, 1, 1)
+        for k in range(args.versions):
+            stamp = start + timedelta(days=k)
+            booster.save_model(os.path.join(artifacts_dir, f"model_cls_{stamp:%Y%m%d_%H%M%S}.json"))
+            registry.register(booster, {}, {}, registry_dir=registry_dir, created_at=stamp)
+
+        json_mb = os.path.getsize(glob.glob(os.path.join(artifacts_dir, "*.json"))[0]) / 1e6
+        ubj_mb = os.path.getsize(registry.artifact_path(registry_dir=registry_dir)) / 1e6
+
+        t = {}
+        for _ in range(args.repeats):
+            with timed(t, "legacy"):
+                old = legacy_load(artifacts_dir)
+            with timed(t, "registry"):
+                new = registry.load_classifier(registry_dir=registry_dir)
+        X = np.random.default_rng(0).normal(size=(100, 21)).astype(np.float32)
+        assert np.array_equal(old.predict_proba(X), new.predict_proba(X))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(pd.DataFrame([{
+        "versions": args.versions,
+        "trees": booster.num_boosted_rounds(),
+        "json_mb": round(json_mb, 2),
+        "ubj_mb": round(ubj_mb, 2),
+        "legacy_ms": round(1000 * t["legacy"] / args.repeats, 1),
+        "registry_ms": round(1000 * t["registry"] / args.repeats, 1),
+        "speedup": round(t["legacy"] / t["registry"], 2),
+    }]).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
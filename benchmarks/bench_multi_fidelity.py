@@ -0,0 +1,116 @@
+"""
+benchmarks/bench_multi_fidelity.py
+
+Trial-seconds an Optuna search spends to reach its best CV accuracy:
+  - full:        every trial trains every fold on the full window with all
+                 its trees (no pruning)
+  - median:      the default tune_model run (XGBoost pruning callback,
+                 MedianPruner over boosting rounds)
+  - hyperband:   tune_model --multi-fidelity (recent data slices with few
+                 trees first; HyperbandPruner promotes survivors)
+
+All modes run the same number of trials with the same seeded TPE sampler
+on build_dataset() and the tuner's time-series CV folds, in in-memory
+studies. "to_target_s" is the cumulative trial-seconds until a mode first
+completes a trial scoring at least the full mode's best accuracy minus
+--tolerance (blank if it never does within the trial count), and
+"full_best_same_s" is the best the full mode had reached after the same
+trial-seconds as that mode spent in total.
+
+Usage:
+    python benchmarks/bench_multi_fidelity.py
+    python benchmarks/bench_multi_fidelity.py --trials 60 --tolerance 0
+"""
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import argparse
+
+import optuna
+import pandas as pd
+
+from model.dmatrix_cache import QuantizedDataset
+from model.prepare_dataset import build_dataset
+from model.tune_model import (make_objective, make_multi_fidelity_objective, make_pruner,
+                              time_series_folds, TARGET_COL)
+from model.walk_forward import feature_selection
+
+
+def run(mode: str, data, folds, n_trials: int, seed: int = 42) -> optuna.Study:
+    pruner = {"full": optuna.pruners.NopPruner(),
+              "median": make_pruner(),
+              "hyperband": make_pruner(multi_fidelity=True)}[mode]
+    make = make_multi_fidelity_objective if mode == "hyperband" else make_objective
+    # Fixed study name: Hyperband assigns trials to brackets by hashing it
+    study = optuna.create_study(study_name=f"bench_{mode}", direction="maximize", pruner=pruner,
+                                sampler=optuna.samplers.TPESampler(seed=seed))
+    study.optimize(make(data, folds), n_trials=n_trials)
+    return study
+
+
+def seconds_to_reach(study: optuna.Study, target: float):
+    """Cumulative trial-seconds until a completed trial scores >= target (None if never)."""
+    spent = 0.0
+    for t in study.trials:
+        spent += t.duration.total_seconds()
+        if t.state == optuna.trial.TrialState.COMPLETE and t.value >= target:
+            return spent
+    return None
+
+
+def best_within(study: optuna.Study, seconds: float) -> float:
+    """Best completed value after `seconds` cumulative trial-seconds."""
+    spent, best = 0.0, float("nan")
+    for t in study.trials:
+        spent += t.duration.total_seconds()
+        if spent > seconds:
+            break
+        if t.state == optuna.trial.TrialState.COMPLETE and not t.value <= best:
+            best = t.value
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=40)
+    parser.add_argument("--tolerance", type=float, default=0.001,
+                        help="Accuracy below the full mode's best that still counts as reaching it.")
+    args = parser.parse_args()
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+    df = build_dataset().sort_values("date", kind="stable").reset_index(drop=True)
+    folds = time_series_folds(df["date"].to_numpy())
+    data = QuantizedDataset(df, feature_selection(df), TARGET_COL)
+    print(f"{len(data)} rows | {len(folds)} CV folds | {args.trials} trials per mode")
+
+    studies = {mode: run(mode, data, folds, args.trials) for mode in ["full", "median", "hyperband"]}
+    full = studies["full"]
+    target = full.best_value - args.tolerance
+
+    rows = []
+    for mode, study in studies.items():
+        trial_s = sum(t.duration.total_seconds() for t in study.trials)
+        to_target = seconds_to_reach(study, target)
+        rows.append({
+            "mode": mode,
+            "trial_s": round(trial_s, 1),
+            "pruned": sum(t.state == optuna.trial.TrialState.PRUNED for t in study.trials),
+            "best_acc": round(study.best_value, 4),
+            "to_target_s": round(to_target, 1) if to_target is not None else None,
+            "full_best_same_s": round(best_within(full, trial_s), 4),
+        })
+
+    print(f"\ntarget accuracy: {target:.4f} (full best {full.best_value:.4f} - {args.tolerance})")
+    print(pd.DataFrame(rows).to_string(index=False))
+    full_s = rows[0]["to_target_s"]
+    for row in rows[1:]:
+        if row["to_target_s"] is not None:
+            print(f"{row['mode']}: {full_s - row['to_target_s']:.1f} trial-seconds saved "
+                  f"to reach {target:.4f} ({full_s / row['to_target_s']:.1f}x)")
+        else:
+            print(f"{row['mode']}: did not reach {target:.4f} in {args.trials} trials")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+benchmarks/bench_panel_features.py
+
+Compares the legacy per-stock feature loop (groupby -> calculate_technicals
+-> to_dict('records')) against the universe-wide panel engine, single-process
+and sharded across --workers processes (per-shard timings are printed).
+
+Usage:
+    python benchmarks/bench_panel_features.py
+    python benchmarks/bench_panel_features.py --sizes 50 500 --days 1000 --workers 8
+"""
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import argparse
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import make_price_panel, timed
+from feature_engineering.build_features import calculate_technicals
+from feature_engineering.panel import calculate_technicals_panel
+
+
+def legacy_features(df: pd.DataFrame) -> pd.DataFrame:
+    feature_rows = []
+    for _, stock_df in df.groupby("stock_id"):
+        stock_df = calculate_technicals(stock_df).dropna()
+        feature_rows.extend(stock_df.to_dict("records"))
+    return pd.DataFrame(feature_rows)
+
+
+def panel_features(df: pd.DataFrame, workers: int = 1, timings: list = None) -> pd.DataFrame:
+    return calculate_technicals_panel(df, workers=workers, timings=timings).dropna().reset_index(drop=True)
+
+
+def max_abs_diff(a: pd.DataFrame, b: pd.DataFrame) -> float:
+    cols = [c for c in a.columns if c != "date"]
+    return float(np.nanmax(np.abs(a[cols].to_numpy(float) - b[cols].to_numpy(float))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 2000])
+    parser.add_argument("--days", type=int, default=2000, help="Trading days per symbol (~8 years)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.sizes:
+        df = make_price_panel(n, args.days)
+        t = {}
+        with timed(t, "legacy"):
+            old = legacy_features(df)
+        with timed(t, "panel"):
+            new = panel_features(df)
+        shards = []
+        with timed(t, "sharded"):
+            sharded = panel_features(df, args.workers, shards)
+        assert len(old) == len(new), "row count mismatch between legacy and panel output"
+        assert sharded.equals(new), "sharded output differs from single-process output"
+        rows.append({
+            "symbols": n,
+            "rows": len(df),
+            "legacy_s": round(t["legacy"], 3),
+            "panel_s": round(t["panel"], 3),
+            "speedup": round(t["legacy"] / t["panel"], 1),
+            f"panel_{args.workers}w_s": round(t["sharded"], 3),
+            "slowest_shard_s": round(max(s["seconds"] for s in shards), 3),
+            "max_abs_diff": max_abs_diff(old, new),
+        })
+        print(rows[-1])
+        print(pd.DataFrame(shards).round(3).to_string(index=False))
+
+    print("\n" + pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
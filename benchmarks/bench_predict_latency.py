@@ -0,0 +1,247 @@
+"""
+benchmarks/bench_predict_latency.py
+
+POST /predict latency (p50 / p99) and throughput under a concurrent load
+generator, against a real uvicorn server:
+  - db:       feature cache off: stock subquery + SELECT * on feature_store,
+              live predict_proba (the path before the feature cache)
+  - live:     latest features from the in-process cache, live predict_proba
+  - signals:  precomputed daily_signals snapshot (model/daily_signals.py);
+              no database read, no scoring
+  - sync_log: signals, but each request INSERTs and commits its own
+              prediction_logs row (the path before api/log_writer.py)
+  - async_db:       db, on the asyncpg pool (api/async_db.py): prepared
+                    symbol lookup + latest row, Record -> vector, no
+                    DataFrame, no threadpool hop
+  - async_signals:  signals, served by the async endpoint
+
+The modes above async_db run the sync endpoints (async pool disabled).
+All but sync_log queue their prediction_logs row for the background
+batched writer, as the API does; its flush stats are read from /health.
+
+A scratch database (<DB_NAME>_bench, created and dropped by the benchmark)
+holds --symbols stocks with --days feature_store rows each, and a
+tuned-shaped model (best_params.yaml) is registered in a temp registry.
+Each mode runs in its own server process pointed at it through DB_NAME;
+the load generator keeps --concurrency requests in flight (asyncio +
+httpx, keep-alive) over random symbols until --requests have completed,
+after a warm-up round.
+
+Usage:
+    python benchmarks/bench_predict_latency.py
+    python benchmarks/bench_predict_latency.py --concurrency 32 --requests 5000
+    python benchmarks/bench_predict_latency.py --concurrency 200 --requests 5000 \
+        --modes db async_db signals async_signals
+"""
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import argparse
+import asyncio
+import subprocess
+import tempfile
+import time
+
+import httpx
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from benchmarks.common import make_feature_store, store_model
+
+BENCH_DB = f"{os.getenv('DB_NAME', 'market_db')}_bench"
+MODES = ["db", "live", "signals", "sync_log", "async_db", "async_signals"]
+SIGNAL_MODES = {"signals", "sync_log", "async_signals"}  # run after the daily_signals scoring stage
+
+
+# ----------------------------------------------------------
+# Child processes (DB_NAME = scratch database)
+# ----------------------------------------------------------
+def serve(mode: str, registry_dir: str, port: int):
+    import uvicorn
+    from model import registry
+    from api import main as api
+
+    registry.REGISTRY_DIR = registry_dir
+    api.async_db_module.ASYNC_DB_ENABLED = mode.startswith("async")
+    if mode in ("db", "async_db"):
+        api.feature_cache = None
+    if mode == "sync_log":
+        from api.log_writer import insert_prediction_logs
+
+        def write_now(row):
+            with api.engine.begin() as conn:
+                insert_prediction_logs(conn, [row])
+            return True
+        api.log_writer.submit = write_now
+    uvicorn.run(api.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def score(registry_dir: str):
+    from model import registry
+    from model.daily_signals import score_daily_signals
+
+    registry.REGISTRY_DIR = registry_dir
+    score_daily_signals()
+
+
+# ----------------------------------------------------------
+# Load generator
+# ----------------------------------------------------------
+async def generate_load(url: str, symbols: list, n_requests: int, concurrency: int, seed: int = 42) -> dict:
+    """Latencies (seconds) of n_requests POST /predict, concurrency in flight at a time."""
+    rng = np.random.default_rng(seed)
+    picks = iter(rng.choice(symbols, size=n_requests))
+    latencies, sources, errors = [], set(), 0
+
+    async def client(http: httpx.AsyncClient):
+        nonlocal errors
+        for symbol in picks:  # shared iterator: workers pull until n_requests are sent
+            start = time.perf_counter()
+            try:
+                response = await http.post(f"{url}/predict", json={"symbol": str(symbol)})
+            except httpx.TransportError:  # connection dropped by the server
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+            else:
+                sources.add(response.json()["source"])
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+    return {"latencies": np.array(latencies), "wall": wall, "errors": errors, "sources": sources}
+
+
+def wait_ready(url: str, server: subprocess.Popen, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("API server exited during startup")
+        try:
+            if httpx.get(f"{url}/health").json()["model_loaded"]:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("API server did not become ready")
+
+
+def count_logs(eng) -> int:
+    with eng.connect() as conn:
+        return conn.execute(text("SELECT count(*) FROM prediction_logs")).scalar()
+
+
+def run_mode(mode, args, env, registry_dir, symbols, eng) -> dict:
+    url = f"http://127.0.0.1:{args.port}"
+    logged_before = count_logs(eng)
+    server = subprocess.Popen([sys.executable, __file__, "--serve", mode, registry_dir, str(args.port)], env=env)
+    try:
+        wait_ready(url, server)
+        asyncio.run(generate_load(url, symbols, min(args.requests, 200), args.concurrency))  # warm-up
+        result = asyncio.run(generate_load(url, symbols, args.requests, args.concurrency))
+        health = httpx.get(f"{url}/health").json()
+    finally:
+        server.terminate()  # SIGTERM: graceful shutdown flushes the log queue
+        server.wait()
+
+    ms = 1000 * result["latencies"]
+    return {
+        "mode": mode,
+        "source": "/".join(sorted(result["sources"])),
+        "requests": len(ms),
+        "errors": result["errors"],
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p90_ms": round(float(np.percentile(ms, 90)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "req_per_s": round(len(ms) / result["wall"], 1),
+        "cache_hit_ratio": health["feature_cache"]["hit_ratio"] if health["feature_cache"] else None,
+        "log_batches": health["prediction_logs"]["batches"],
+        "log_flush_p99_ms": health["prediction_logs"]["flush_p99_ms"],
+        "log_dropped": health["prediction_logs"]["dropped"],
+        "rows_logged": count_logs(eng) - logged_before,
+    }
+
+
+# ----------------------------------------------------------
+# Parent process
+# ----------------------------------------------------------
+def load_universe(url, n_symbols, n_days):
+    eng = create_engine(url)
+    with open("db/schema.sql") as f:
+        schema = f.read()
+    with eng.begin() as conn:
+        conn.exec_driver_sql(schema)
+        conn.execute(text("INSERT INTO stocks (stock_id, symbol) "
+                          "SELECT i, 'SYM' || i FROM generate_series(1, :n) i"), {"n": n_symbols})
+    eng.dispose()
+    return make_feature_store(n_symbols, n_days)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--days", type=int, default=60, help="feature_store rows per stock.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight.")
+    parser.add_argument("--requests", type=int, default=2000, help="Timed requests per mode.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--serve", nargs=3, help=argparse.SUPPRESS)
+    parser.add_argument("--score", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve[0], args.serve[1], int(args.serve[2]))
+        return
+    if args.score:
+        score(args.score)
+        return
+
+    from config.database import DATABASE_URL, bulk_upsert
+    from model import registry
+    admin = create_engine(DATABASE_URL, isolation_level="AUTOCOMMIT")
+    bench_url = DATABASE_URL.rsplit("/", 1)[0] + f"/{BENCH_DB}"
+    env = dict(os.environ, DB_NAME=BENCH_DB)
+
+    rows, eng = [], None
+    try:
+        with admin.connect() as conn:
+            conn.execute(text(f'DROP DATABASE IF EXISTS "{BENCH_DB}"'))
+            conn.execute(text(f'CREATE DATABASE "{BENCH_DB}"'))
+        store = load_universe(bench_url, args.symbols, args.days)
+        subprocess.run([sys.executable, "db/create_prod_tables.py"], env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        eng = create_engine(bench_url)
+        with eng.begin() as conn:
+            bulk_upsert(store, "feature_store", ["stock_id", "date"], conn=conn)
+        symbols = [f"SYM{i}" for i in range(1, args.symbols + 1)]
+        print(f"{args.symbols} symbols | {args.concurrency} concurrent clients | {args.requests} requests per mode")
+
+        with tempfile.TemporaryDirectory() as registry_dir:
+            registry.register(store_model(), {}, {}, registry_dir=registry_dir)
+            scored = False
+            for mode in [m for m in MODES if m in args.modes]:
+                if mode in SIGNAL_MODES and not scored:
+                    scored = True
+                    # The post-refresh scoring stage, as feature_store.py runs it nightly
+                    subprocess.run([sys.executable, __file__, "--score", registry_dir], env=env, check=True,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                rows.append(run_mode(mode, args, env, registry_dir, symbols, eng))
+                print(rows[-1])
+    finally:
+        if eng is not None:
+            eng.dispose()
+        with admin.connect() as conn:
+            conn.execute(text(f'DROP DATABASE IF EXISTS "{BENCH_DB}"'))
+        admin.dispose()
+
+    print("\n" + pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+benchmarks/bench_stream_memory.py
+
+Peak RSS of `build_features.py --full` (whole universe in memory) vs
+`--full --stream` (stock-aligned chunks from a server-side cursor) as the
+number of symbols grows.
+
+Each size is loaded into a scratch database (<DB_NAME>_bench, created and
+dropped by the benchmark), and every build runs as its own child process so
+its peak RSS can be read from os.wait4(). The scaler is written to a temp
+file, so model/artifacts is left untouched.
+
+Usage:
+    python benchmarks/bench_stream_memory.py
+    python benchmarks/bench_stream_memory.py --sizes 50 200 800 --chunk-rows 100000
+"""
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import argparse
+import subprocess
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from benchmarks.common import make_price_panel
+from config.database import DATABASE_URL, DB_NAME, bulk_upsert
+
+BENCH_DB = f"{DB_NAME}_bench"
+
+
+def admin_execute(sql):
+    admin = create_engine(DATABASE_URL, isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.execute(text(sql))
+    admin.dispose()
+
+
+def load_universe(bench_engine, n_symbols, n_days):
+    with open("db/schema.sql") as f:
+        schema = f.read()
+    prices = make_price_panel(n_symbols, n_days)
+    prices["date"] = pd.to_datetime(prices["date"]).dt.date
+    stocks = pd.DataFrame({"stock_id": range(1, n_symbols + 1),
+                           "symbol": [f"SYM{i}" for i in range(1, n_symbols + 1)]})
+    with bench_engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS features_daily, indicator_state CASCADE"))
+        conn.exec_driver_sql(schema)
+        bulk_upsert(stocks, "stocks", ["stock_id"], conn=conn)
+        bulk_upsert(prices, "prices", ["stock_id", "date"], conn=conn)
+    return len(prices)
+
+
+def peak_rss_mb(args, env):
+    """Runs build_features.py in a child process; returns (peak RSS in MB, seconds)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "feature_engineering/build_features.py"] + args,
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError(f"build_features.py {' '.join(args)} failed")
+    return usage.ru_maxrss / 1024, time.perf_counter() - start  # ru_maxrss is KB on Linux
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 800])
+    parser.add_argument("--days", type=int, default=2000)
+    parser.add_argument("--chunk-rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    admin_execute(f'DROP DATABASE IF EXISTS "{BENCH_DB}"')
+    admin_execute(f'CREATE DATABASE "{BENCH_DB}"')
+    bench_engine = create_engine(DATABASE_URL.rsplit("/", 1)[0] + f"/{BENCH_DB}")
+    env = dict(os.environ, DB_NAME=BENCH_DB,
+               SCALER_PATH=os.path.join(tempfile.mkdtemp(), "scaler.pkl"))
+
+    rows = []
+    try:
+        for n in args.sizes:
+            n_rows = load_universe(bench_engine, n, args.days)
+            in_memory_mb, in_memory_s = peak_rss_mb(["--full", "--workers", "1"], env)
+            stream_mb, stream_s = peak_rss_mb(["--full", "--workers", "1", "--stream",
+                                               "--chunk-rows", str(args.chunk_rows)], env)
+            rows.append({
+                "symbols": n,
+                "price_rows": n_rows,
+                "in_memory_peak_mb": round(in_memory_mb),
+                "stream_peak_mb": round(stream_mb),
+                "in_memory_s": round(in_memory_s, 1),
+                "stream_s": round(stream_s, 1),
+            })
+            print(rows[-1])
+    finally:
+        bench_engine.dispose()
+        admin_execute(f'DROP DATABASE IF EXISTS "{BENCH_DB}"')
+
+    print(f"\nchunk_rows={args.chunk_rows}")
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+benchmarks/common.py
+
+Shared helpers for the benchmark scripts: synthetic price panels and timing.
+Run every benchmark from the project root, e.g.:
+    python benchmarks/bench_panel_features.py
+"""
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+
+def make_price_panel(n_symbols: int, n_days: int = 2000, seed: int = 42) -> pd.DataFrame:
+    """
+    Synthetic OHLCV panel shaped like the `prices` table
+    (stock_id, date, close, volume, open), sorted by stock_id, date.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2018-01-01", periods=n_days)
+    log_ret = rng.normal(0.0003, 0.015, size=(n_symbols, n_days))
+    close = 100 * np.exp(np.cumsum(log_ret, axis=1))
+    return pd.DataFrame({
+        "stock_id": np.repeat(np.arange(1, n_symbols + 1), n_days),
+        "date": np.tile(dates.values, n_symbols),
+        "close": close.ravel(),
+        "volume": rng.integers(100_000, 5_000_000, size=n_symbols * n_days),
+        "open": (close * (1 + rng.normal(0, 0.003, size=close.shape))).ravel(),
+    })
+
+
+# feature_store columns (db/create_prod_tables.py) fed to the model
+STORE_FEATURES = ["return_1d", "return_5d", "return_20d", "sma_20", "sma_50", "ema_20", "rsi_14",
+                  "volatility_20d", "macro_nifty_bank_ret", "macro_crude_oil_ret", "macro_gold_ret",
+                  "macro_usd_inr_ret", "macro_nifty_50_ret", "sentiment_score"]
+
+
+def make_feature_store(n_symbols: int, n_days: int, seed: int = 42) -> pd.DataFrame:
+    """Synthetic feature_store rows (stock_id 1..n_symbols, n_days business days each)."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2024-01-01", periods=n_days).date
+    store = pd.DataFrame(rng.normal(size=(n_symbols * n_days, len(STORE_FEATURES))), columns=STORE_FEATURES)
+    store.insert(0, "stock_id", np.repeat(np.arange(1, n_symbols + 1), n_days))
+    store.insert(1, "date", np.tile(dates, n_symbols))
+    return store
+
+
+def store_model(seed: int = 0):
+    """Booster shaped like the tuned model (best_params.yaml) over the feature_store features."""
+    import xgboost as xgb
+    from feature_engineering.feature_store import MACRO_FEATURE_NAMES
+    from model.walk_forward import PARAMS
+
+    rng = np.random.default_rng(seed)
+    names = [MACRO_FEATURE_NAMES.get(c, c) for c in STORE_FEATURES]
+    X = rng.normal(size=(20_000, len(names))).astype(np.float32)
+    y = (X[:, 0] + rng.normal(0, 1, len(X)) > 0).astype(int)
+    return xgb.train({"objective": "binary:logistic", "max_depth": PARAMS.get("max_depth", 6)},
+                     xgb.DMatrix(X, y, feature_names=names), num_boost_round=PARAMS.get("n_estimators", 100))
+
+
+@contextmanager
+def timed(results: dict, key: str):
+    """Stores the wall time of the block in results[key] (seconds)."""
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
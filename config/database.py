@@ -1,4 +1,6 @@
+import io
 import os
+import uuid
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 
@@ -25,6 +27,72 @@ engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(bind=engine)
 
 
+# =========================
+# BULK WRITES (COPY + MERGE)
+# =========================
+def bulk_upsert(df, table, key_cols, update_cols=None, conn=None, insert=True, chunksize=100_000):
+    """
+    Writes a DataFrame into `table` via PostgreSQL COPY:
+      1. COPY FROM STDIN (CSV, streamed in `chunksize` row batches)
+         into a temp staging table shaped like the target columns
+      2. one set-based merge from the staging table into the target
+
+    key_cols    : conflict target (must be covered by a unique index)
+    update_cols : columns refreshed on conflict; None = every non-key column,
+                  [] = ON CONFLICT DO NOTHING
+    insert      : False turns the merge into UPDATE ... FROM (existing rows only)
+    conn        : SQLAlchemy connection to join its transaction; a new
+                  transaction is opened on the global engine otherwise
+
+    Duplicate keys inside df keep the last row (as sequential upserts would).
+    NaN/None are written as NULL. Returns the number of rows merged.
+    """
+    if df.empty:
+        return 0
+    if conn is None:
+        with engine.begin() as conn:
+            return bulk_upsert(df, table, key_cols, update_cols, conn, insert, chunksize)
+
+    df = df.drop_duplicates(subset=key_cols, keep="last")
+    cols = list(df.columns)
+    if update_cols is None:
+        update_cols = [c for c in cols if c not in key_cols]
+    col_list = ", ".join(f'"{c}"' for c in cols)
+    stage = f"_stage_{table}_{uuid.uuid4().hex[:8]}"
+
+    # Staging table copies the target's column types, so COPY parses values
+    # exactly like a direct insert would
+    conn.execute(text(
+        f'CREATE TEMP TABLE "{stage}" ON COMMIT DROP AS '
+        f"SELECT {col_list} FROM {table} WITH NO DATA"
+    ))
+
+    cursor = conn.connection.cursor()
+    try:
+        for start in range(0, len(df), chunksize):
+            buf = io.StringIO()
+            df.iloc[start:start + chunksize].to_csv(buf, index=False, header=False)
+            buf.seek(0)
+            cursor.copy_expert(f'COPY "{stage}" ({col_list}) FROM STDIN WITH (FORMAT csv)', buf)
+    finally:
+        cursor.close()
+
+    set_clause = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in update_cols)
+    if not insert:
+        match = " AND ".join(f't."{c}" = s."{c}"' for c in key_cols)
+        assign = ", ".join(f'"{c}" = s."{c}"' for c in update_cols)
+        merge = f'UPDATE {table} t SET {assign} FROM "{stage}" s WHERE {match}'
+    elif update_cols:
+        merge = (f'INSERT INTO {table} ({col_list}) SELECT {col_list} FROM "{stage}" '
+                 f'ON CONFLICT ({", ".join(key_cols)}) DO UPDATE SET {set_clause}')
+    else:
+        merge = (f'INSERT INTO {table} ({col_list}) SELECT {col_list} FROM "{stage}" '
+                 f'ON CONFLICT ({", ".join(key_cols)}) DO NOTHING')
+    merged = conn.execute(text(merge)).rowcount
+    conn.execute(text(f'DROP TABLE "{stage}"'))
+    return merged
+
+
 # =========================
 # OPTIONAL DATABASE CLASS
 # =========================
@@ -2,7 +2,7 @@ import yfinance as yf
 import pandas as pd
 import logging
 from sqlalchemy import text
-from config.database import engine
+from config.database import engine, bulk_upsert
 from config.logger import get_logger
 
 logger = get_logger(__name__)
@@ -54,21 +54,13 @@ def load_index_data(start_date="2018-01-01"):
                 logger.error(f"Missing required columns in index data for {symbol}: {df.columns}")
                 continue
                 
-            # 3. Insert into DB
-            with engine.begin() as conn:
-                for row in df.itertuples(index=False):
-                    conn.execute(
-                        text("""
-                            INSERT INTO index_prices (index_id, date, close)
-                            VALUES (:index_id, :date, :close)
-                            ON CONFLICT (index_id, date) DO NOTHING
-                        """),
-                        {
-                            "index_id": index_id,
-                            "date": row.Date.date(),
-                            "close": float(row.Close)
-                        }
-                    )
+            # 3. Insert into DB (COPY into staging + one merge; existing rows are kept)
+            rows = pd.DataFrame({
+                "index_id": index_id,
+                "date": pd.to_datetime(df["Date"]).dt.date,
+                "close": df["Close"].astype(float),
+            })
+            bulk_upsert(rows, "index_prices", ["index_id", "date"], update_cols=[])
             logger.info(f"Loaded {len(df)} rows for {symbol}")
             
         except Exception as e:
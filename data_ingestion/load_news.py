@@ -18,7 +18,7 @@ import pandas as pd
 import yfinance as yf
 from datetime import datetime, timedelta
 from sqlalchemy import text
-from config.database import engine
+from config.database import engine, bulk_upsert
 from config.logger import get_logger
 
 logger = get_logger(__name__)
@@ -189,6 +189,51 @@ def fetch_yfinance_news() -> pd.DataFrame:
 # -------------------------------------------------------
 # Main Entrypoint
 # -------------------------------------------------------
+NEWS_COLUMNS = ["date", "symbol", "headline", "sentiment_score", "source"]
+
+
+def clean_news_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    news rows ready for COPY: text columns as str without NUL bytes (which
+    PostgreSQL rejects), dates parsed, scores numeric. Rows without a usable
+    headline or date are dropped.
+    """
+    rows = df.reindex(columns=NEWS_COLUMNS).copy()
+    for col in ["symbol", "headline", "source"]:
+        rows[col] = rows[col].map(lambda v: None if v is None or v != v else str(v).replace("\x00", "").strip())
+    rows["date"] = pd.to_datetime(rows["date"], errors="coerce").dt.date
+    rows["sentiment_score"] = pd.to_numeric(rows["sentiment_score"], errors="coerce")
+    rows = rows[rows["headline"].fillna("").str.len() > 0]
+    rows = rows.dropna(subset=["date"])
+    if len(rows) < len(df):
+        logger.warning(f"Dropped {len(df) - len(rows)} news row(s) without a usable headline or date.")
+    return rows
+
+
+def insert_news_rows(conn, rows: pd.DataFrame) -> int:
+    """Per-row upsert fallback: a bad row is skipped (own savepoint), the rest are saved."""
+    saved = 0
+    for row in rows.itertuples(index=False):
+        try:
+            with conn.begin_nested():
+                conn.execute(text("""
+                    INSERT INTO news (date, symbol, headline, sentiment_score, source)
+                    VALUES (:date, :symbol, :headline, :sentiment_score, :source)
+                    ON CONFLICT (headline, date)
+                    DO UPDATE SET sentiment_score = EXCLUDED.sentiment_score
+                """), {
+                    "date": row.date,
+                    "symbol": row.symbol,
+                    "headline": row.headline,
+                    "sentiment_score": None if pd.isna(row.sentiment_score) else float(row.sentiment_score),
+                    "source": row.source,
+                })
+            saved += 1
+        except Exception as e:
+            logger.warning(f"Skipping errored news row {row.headline[:60]!r}: {str(e).splitlines()[0]}")
+    return saved
+
+
 def save_news(df: pd.DataFrame):
     if df.empty:
         logger.warning("No news found — nothing to save.")
@@ -211,25 +256,15 @@ def save_news(df: pd.DataFrame):
             )
         """))
 
-        saved = 0
-        for row in df.itertuples(index=False):
-            sentiment = getattr(row, "sentiment_score", None)
-            try:
-                conn.execute(text("""
-                    INSERT INTO news (date, symbol, headline, sentiment_score, source)
-                    VALUES (:date, :symbol, :headline, :sentiment_score, :source)
-                    ON CONFLICT (headline, date)
-                    DO UPDATE SET sentiment_score = EXCLUDED.sentiment_score
-                """), {
-                    "date": row.date,
-                    "symbol": row.symbol,
-                    "headline": row.headline,
-                    "sentiment_score": float(sentiment) if sentiment is not None else None,
-                    "source": row.source,
-                })
-                saved += 1
-            except Exception as e:
-                logger.warning(f"Skipping duplicate or errored row: {e}")
+        rows = clean_news_rows(df)
+        try:
+            # COPY into staging + one merge; re-seen headlines only refresh their score.
+            # In a savepoint, so a failed COPY leaves the transaction usable.
+            with conn.begin_nested():
+                saved = bulk_upsert(rows, "news", ["headline", "date"], update_cols=["sentiment_score"], conn=conn)
+        except Exception as e:
+            logger.warning(f"Bulk news save failed ({str(e).splitlines()[0]}); saving row by row, skipping bad rows.")
+            saved = insert_news_rows(conn, rows)
 
     logger.info(f"Saved/updated {saved} news items in DB.")
 
@@ -1,6 +1,7 @@
 import logging
+import pandas as pd
 from sqlalchemy import text
-from config.database import engine
+from config.database import engine, bulk_upsert
 from config.logger import get_logger
 # Import the new function from market_data.py
 from data_ingestion.market_data import fetch_market_data_with_retry, DataIngestionError
@@ -39,24 +40,15 @@ def load_prices(start_date="2018-01-01", end_date=None):
         # Note: fetch_market_data_with_retry already flattens columns
 
         try:
-            with engine.begin() as conn:
-                for row in df.itertuples(index=False):
-                    conn.execute(
-                        text(
-                            """
-                            INSERT INTO prices (stock_id, date, open, close, volume)
-                            VALUES (:stock_id, :date, :open, :close, :volume)
-                            ON CONFLICT (stock_id, date) DO NOTHING
-                            """
-                        ),
-                        {
-                            "stock_id": stock_id,
-                            "date": row.Date.date(),
-                            "open": float(row.Open),
-                            "close": float(row.Close),
-                            "volume": int(row.Volume),
-                        },
-                    )
+            rows = pd.DataFrame({
+                "stock_id": stock_id,
+                "date": pd.to_datetime(df["Date"]).dt.date,
+                "open": df["Open"].astype(float),
+                "close": df["Close"].astype(float),
+                "volume": df["Volume"].astype("int64"),
+            })
+            # COPY into staging + one merge; existing (stock_id, date) rows are kept
+            bulk_upsert(rows, "prices", ["stock_id", "date"], update_cols=[])
             logger.info(f"Successfully loaded prices for {symbol} into DB")
             
         except Exception as db_err:
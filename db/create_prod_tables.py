@@ -3,6 +3,8 @@ import os
 sys.path.append(os.getcwd())
 from config.database import engine
 from sqlalchemy import text
+from feature_engineering.indicator_state import ensure_state_table
+from model.daily_signals import ensure_signals_table
 
 def create_prod_tables():
     with engine.connect() as conn:
@@ -38,7 +40,15 @@ def create_prod_tables():
                 PRIMARY KEY (stock_id, date)
             );
         """))
+        # max(created_at) = feature_store version, polled by the API's feature cache
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_feature_store_created_at ON feature_store (created_at)"))
         
+        print("Creating table: indicator_state...")
+        ensure_state_table(conn)
+
+        print("Creating table: daily_signals...")
+        ensure_signals_table(conn)
+
         print("Creating table: prediction_logs...")
         conn.execute(text("""
             CREATE TABLE IF NOT EXISTS prediction_logs (
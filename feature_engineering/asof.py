@@ -0,0 +1,107 @@
+"""
+feature_engineering/asof.py
+
+Point-in-time (as-of) alignment of date-keyed series to stock trading calendars.
+
+Index returns and news sentiment live on their own calendars (global
+futures trade on Indian holidays, headlines arrive at weekends). Instead of
+merging them onto the stock panel by exact date and forward filling the
+whole frame, each series is joined with merge_asof semantics on sorted date
+keys: every trading date takes the latest value published at or before it.
+  - macro returns: latest index row <= date (gaps forward filled per column)
+  - sentiment: latest daily average <= date, at most SENTIMENT_MAX_AGE_DAYS
+    old (so weekend news reaches Monday, but stale news decays to neutral)
+
+The series are aligned once per distinct trading date and then broadcast to
+stocks by exact date, so nothing is ever filled across stock boundaries.
+
+Usage:
+    from feature_engineering.asof import align_to_calendar, load_daily_sentiment
+    df = align_to_calendar(df, macro, load_daily_sentiment())
+"""
+import pandas as pd
+import yaml
+from sqlalchemy import text
+
+from config.database import engine
+
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+SENTIMENT_CONFIG = config.get("features", {}).get("sentiment_analysis", {})
+
+# Calendar days a daily sentiment average stays in effect
+SENTIMENT_MAX_AGE_DAYS = SENTIMENT_CONFIG.get("max_age_days", 3)
+
+
+def load_daily_sentiment(conn=None, since=None) -> pd.DataFrame:
+    """date | daily_sentiment: average news sentiment per date (one query)."""
+    query = """
+        SELECT date, AVG(sentiment_score) AS daily_sentiment
+        FROM news
+        WHERE sentiment_score IS NOT NULL
+    """
+    params = {}
+    if since is not None:
+        query += " AND date >= :since"
+        params["since"] = pd.Timestamp(since).date()
+    query += " GROUP BY date ORDER BY date"
+
+    if conn is None:
+        with engine.connect() as conn:
+            sent = pd.read_sql(text(query), conn, params=params)
+    else:
+        sent = pd.read_sql(text(query), conn, params=params)
+    sent["date"] = pd.to_datetime(sent["date"])
+    return sent
+
+
+def _as_ns(dates) -> pd.Series:
+    # merge_asof needs identical datetime resolutions on both keys
+    return pd.to_datetime(dates).astype("datetime64[ns]")
+
+
+def series_as_of(series: pd.DataFrame, dates, ffill: bool = False, max_age_days: int = None) -> pd.DataFrame:
+    """
+    Row of `series` (keyed by a `date` column) in effect on each of `dates`:
+    the latest row with series.date <= date. One row per input date, in input
+    order. ffill=True first forward fills gaps within each column;
+    max_age_days drops matches older than that many calendar days.
+    """
+    dates = pd.DataFrame({"date": _as_ns(pd.Series(list(dates)))})
+    if series.empty:
+        return dates
+    series = series.assign(date=_as_ns(series["date"])).sort_values("date")
+    if ffill:
+        series = series.ffill()
+    tolerance = None if max_age_days is None else pd.Timedelta(days=max_age_days)
+    order = dates.reset_index().sort_values("date")
+    merged = pd.merge_asof(order, series, on="date", direction="backward", tolerance=tolerance)
+    return merged.sort_values("index").drop(columns="index").reset_index(drop=True)
+
+
+def sentiment_as_of(sent: pd.DataFrame, dates, max_age_days: int = SENTIMENT_MAX_AGE_DAYS) -> pd.DataFrame:
+    """date | daily_sentiment as of each of `dates`; 0 (neutral) when nothing recent."""
+    aligned = series_as_of(sent, dates, max_age_days=max_age_days)
+    if "daily_sentiment" not in aligned:
+        aligned["daily_sentiment"] = 0.0
+    aligned["daily_sentiment"] = aligned["daily_sentiment"].fillna(0.0)
+    return aligned
+
+
+def align_to_calendar(df: pd.DataFrame, macro: pd.DataFrame, sent: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds macro columns and daily_sentiment to a (stock_id, date, ...) frame.
+    Both series are aligned as of each distinct trading date in `df`, then
+    broadcast back to its rows; macro values before the first index print are 0.
+    """
+    dates = pd.to_datetime(df["date"])
+    codes, calendar = pd.factorize(dates, sort=True)
+    aligned = series_as_of(macro, calendar, ffill=True).fillna(0)
+    aligned["daily_sentiment"] = sentiment_as_of(sent, calendar)["daily_sentiment"].to_numpy()
+
+    # Broadcast by position: row i of df takes calendar row codes[i]
+    out = df.assign(date=dates)
+    for col in aligned.columns.drop("date"):
+        out[col] = aligned[col].to_numpy()[codes]
+    return out
@@ -5,10 +5,16 @@ import pandas as pd
 import numpy as np
 import yaml
 import logging
-from sqlalchemy import text
-from config.database import engine
+import argparse
+import math
+from sqlalchemy import text, inspect
+from config.database import engine, bulk_upsert
 from config.logger import get_logger
-from feature_engineering.scaler import fit_and_save_scaler
+from sklearn.preprocessing import StandardScaler
+from feature_engineering.scaler import fit_and_save_scaler, save_scaler
+from feature_engineering import indicators
+from feature_engineering.panel import calculate_technicals_panel, technical_features, MAX_WINDOW
+from feature_engineering.indicator_state import seed_states, save_states
 
 # Use centralized logger
 logger = get_logger(__name__)
@@ -20,14 +26,25 @@ with open("config/config.yaml", "r") as f:
 
 FEAT_CONFIG = config.get("features", {})
 
+# Incremental builds recompute from a warm-up window instead of full history.
+# Windows need their longest lookback; EMAs need enough bars for the cold start
+# to decay below EMA_TOLERANCE (slowest MACD EMA, then the signal EMA on top).
+EMA_TOLERANCE = 1e-8
+
+
+def _ema_warmup(span, tol=EMA_TOLERANCE):
+    return math.ceil(math.log(tol) / math.log(1 - 2 / (span + 1)))
+
+
+WARMUP_BARS = MAX_WINDOW + _ema_warmup(max(FEAT_CONFIG.get("ema_windows", [20]) + [26])) + _ema_warmup(9)
+
+# Streaming builds hold about this many price rows (plus one stock's history) at a time
+STREAM_CHUNK_ROWS = FEAT_CONFIG.get("stream_chunk_rows", 250_000)
+# Below this many rows per worker, process start-up and pickling cost more than the work
+MIN_ROWS_PER_WORKER = FEAT_CONFIG.get("min_rows_per_worker", 100_000)
+
 def compute_rsi(series, window=14):
-    delta = series.diff()
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
-    avg_gain = gain.rolling(window).mean()
-    avg_loss = loss.rolling(window).mean()
-    rs = avg_gain / avg_loss
-    return 100 - (100 / (1 + rs))
+    return pd.Series(indicators.rsi(series.to_numpy(dtype=float), window), index=series.index)
 
 def fetch_price_data():
     query = """
@@ -37,114 +54,117 @@ def fetch_price_data():
     """
     return pd.read_sql(query, engine)
 
-def build_features():
-    logger.info("Fetching raw price data...")
-    df = fetch_price_data()
-    
-    if df.empty:
-        logger.warning("No price data found in DB!")
-        return
-
-    # Ensure date is datetime
-    df['date'] = pd.to_datetime(df['date'])
+def stock_aligned_chunks(chunks):
+    """
+    Re-cuts an iterable of (stock_id, date)-sorted DataFrames so every yielded
+    chunk holds complete stocks: the rows of the last (possibly partial) stock
+    of each chunk are carried into the next one.
+    """
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        tail = (chunk["stock_id"] == chunk["stock_id"].iat[-1]).to_numpy()
+        carry = chunk[tail]
+        if not tail.all():
+            yield chunk[~tail].reset_index(drop=True)
+    if carry is not None and not carry.empty:
+        yield carry.reset_index(drop=True)
+
+
+def iter_price_chunks(chunk_rows: int = STREAM_CHUNK_ROWS):
+    """
+    Streams `prices` through a server-side cursor in stock-aligned chunks of
+    about `chunk_rows` rows (a chunk grows past that only to finish a stock).
+    """
+    query = text("""
+        SELECT stock_id, date, close, volume, open
+        FROM prices
+        ORDER BY stock_id, date
+    """)
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunk_rows) as conn:
+        yield from stock_aligned_chunks(pd.read_sql(query, conn, chunksize=chunk_rows))
 
-    feature_rows = []
-    
 def calculate_technicals(stock_df):
     stock_df = stock_df.sort_values("date").copy()
     
     # 1. Handle Missing Data
     stock_df[['close', 'open', 'volume']] = stock_df[['close', 'open', 'volume']].ffill()
 
-    # 2. Returns
-    stock_df["return_1d"] = stock_df["close"].pct_change(1)
-    stock_df["return_5d"] = stock_df["close"].pct_change(5)
-    stock_df["return_20d"] = stock_df["close"].pct_change(20)
-
-    # 3. SMAs
-    for w in FEAT_CONFIG.get("sma_windows", [20, 50]):
-        stock_df[f"sma_{w}"] = stock_df["close"].rolling(w).mean()
-
-    # 4. EMAs
-    for w in FEAT_CONFIG.get("ema_windows", [20]):
-        stock_df[f"ema_{w}"] = stock_df["close"].ewm(span=w, adjust=False).mean()
-
-    # 5. RSI
-    rsi_window = FEAT_CONFIG.get("rsi_window", 14)
-    stock_df[f"rsi_{rsi_window}"] = compute_rsi(stock_df["close"], rsi_window)
-
-    # 6. Volatility
-    vol_window = FEAT_CONFIG.get("volatility_window", 20)
-    stock_df[f"volatility_{vol_window}d"] = stock_df["return_1d"].rolling(vol_window).std()
-
-    # 7. Lag Features
-    for lag in FEAT_CONFIG.get("lag_days", []):
-        stock_df[f"close_lag_{lag}"] = stock_df["close"].shift(lag)
-
-    # --- NEW FEATURES ---
-
-    # 8. MACD (12/26/9)
-    ema_12 = stock_df["close"].ewm(span=12, adjust=False).mean()
-    ema_26 = stock_df["close"].ewm(span=26, adjust=False).mean()
-    stock_df["macd"] = ema_12 - ema_26
-    stock_df["macd_signal"] = stock_df["macd"].ewm(span=9, adjust=False).mean()
-    stock_df["macd_hist"] = stock_df["macd"] - stock_df["macd_signal"]
-
-    # 9. Volume Ratio (today's volume vs 20d avg — spikes = momentum)
-    stock_df["volume_ratio"] = stock_df["volume"] / stock_df["volume"].rolling(20).mean()
-
-    # 10. OBV (On-Balance Volume)
-    obv = [0]
-    for i in range(1, len(stock_df)):
-        if stock_df["close"].iloc[i] > stock_df["close"].iloc[i - 1]:
-            obv.append(obv[-1] + stock_df["volume"].iloc[i])
-        elif stock_df["close"].iloc[i] < stock_df["close"].iloc[i - 1]:
-            obv.append(obv[-1] - stock_df["volume"].iloc[i])
-        else:
-            obv.append(obv[-1])
-    stock_df["obv"] = obv
-    stock_df["obv_ma"] = stock_df["obv"].rolling(20).mean()
+    # 2-11. Returns, SMA/EMA, RSI, volatility, lags, MACD, volume ratio, OBV, price_to_sma20
+    # Shared recipe with the panel engine, computed by the indicator kernels
+    feats = technical_features(stock_df["close"].to_numpy(), stock_df["volume"].to_numpy())
 
-    # 11. Price vs SMA20 distance (how extended is price from its mean)
-    stock_df["price_to_sma20"] = (stock_df["close"] - stock_df["sma_20"]) / stock_df["sma_20"]
+    return pd.concat([stock_df, pd.DataFrame(feats, index=stock_df.index)], axis=1)
 
-    return stock_df
+def fetch_feature_watermarks():
+    """
+    Last computed date and OBV per stock in features_daily.
+    Returns None when the table does not exist yet.
+    """
+    if not inspect(engine).has_table("features_daily"):
+        return None
+    query = """
+        SELECT f.stock_id, f.date AS last_date, f.obv
+        FROM features_daily f
+        JOIN (
+            SELECT stock_id, MAX(date) AS last_date
+            FROM features_daily
+            GROUP BY stock_id
+        ) m ON m.stock_id = f.stock_id AND m.last_date = f.date
+    """
+    return pd.read_sql(query, engine, parse_dates=["last_date"])
 
-def build_features():
-    logger.info("Fetching raw price data...")
-    df = fetch_price_data()
-    
-    if df.empty:
-        logger.warning("No price data found in DB!")
-        return
 
-    # Ensure date is datetime
-    df['date'] = pd.to_datetime(df['date'])
+def fetch_incremental_price_data(warmup: int = WARMUP_BARS):
+    """
+    Prices needed to extend features_daily: for stocks that already have
+    features, the last `warmup` bars up to their last computed date plus
+    every newer bar; for stocks without features, the full history.
+    """
+    query = text("""
+        WITH last AS (
+            SELECT stock_id, MAX(date) AS last_date
+            FROM features_daily
+            GROUP BY stock_id
+        ),
+        pending AS (
+            SELECT l.stock_id, l.last_date
+            FROM last l
+            WHERE EXISTS (
+                SELECT 1 FROM prices p
+                WHERE p.stock_id = l.stock_id AND p.date > l.last_date
+            )
+        )
+        SELECT w.stock_id, w.date, w.close, w.volume, w.open
+        FROM pending pd
+        CROSS JOIN LATERAL (
+            SELECT p.stock_id, p.date, p.close, p.volume, p.open
+            FROM prices p
+            WHERE p.stock_id = pd.stock_id AND p.date <= pd.last_date
+            ORDER BY p.date DESC
+            LIMIT :warmup
+        ) w
+        UNION ALL
+        SELECT p.stock_id, p.date, p.close, p.volume, p.open
+        FROM prices p
+        LEFT JOIN last l ON l.stock_id = p.stock_id
+        WHERE l.last_date IS NULL OR p.date > l.last_date
+        ORDER BY stock_id, date
+    """)
+    return pd.read_sql(query, engine, params={"warmup": warmup})
 
-    feature_rows = []
-    
-    # Process per stock
-    for stock_id, stock_df in df.groupby("stock_id"):
-        # Use common logic
-        stock_df = calculate_technicals(stock_df)
-        
-        # Drop rows that have NaNs due to rolling windows
-        stock_df = stock_df.dropna()
-        
-        # Append to main list
-        feature_rows.extend(stock_df.to_dict('records'))
-
-    if not feature_rows:
-        logger.warning("No features generated (maybe not enough history?)")
-        return
 
-    # Create DataFrame for Scaling
-    final_df = pd.DataFrame(feature_rows)
-    
+def clean_features(final_df):
+    # Drop rows that have NaNs due to rolling windows
+    final_df = final_df.dropna()
+
     # CLEANING: Replace Inf with NaN and drop
-    final_df.replace([np.inf, -np.inf], np.nan, inplace=True)
-    final_df.dropna(inplace=True)
-    
+    final_df = final_df.replace([np.inf, -np.inf], np.nan).dropna()
+    return final_df.reset_index(drop=True)
+
+
+def fit_scaler(final_df):
     # 4. Feature Scaling — fit ONLY on training data (pre-2023) to prevent data leakage
     # This is critical for time-series ML: scaler must not see future (test) data
     exclude_cols = ['stock_id', 'date']
@@ -163,27 +183,213 @@ def build_features():
         logger.warning("Not enough pre-2023 data — scaler fitted on full dataset (check your data range).")
 
 
-    logger.info(f"Generated {len(final_df)} feature rows. Saving to DB...")
+def ensure_features_index(conn):
+    # to_sql(if_exists='replace') recreates the table bare; upserts need this key
+    conn.execute(text("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_features_daily_stock_date
+        ON features_daily (stock_id, date)
+    """))
 
-    # 5. Database Save (Truncate & Insert)
-    # Note: efficient bulk insert requires handling columns dynamically if they changed
-    # For simplicity/robustness, we might want to drop/recreate table or use pandas to_sql
-    
+
+def save_features_full(final_df, states=None):
+    # 5. Database Save (Replace)
+    # An empty to_sql recreates the table from the frame's columns (handles features
+    # being added or removed); the rows are then streamed in with COPY.
+    # Indicator state is written in the same transaction so it always matches the rows
     with engine.begin() as conn:
-        # Clear old features
-        conn.execute(text("TRUNCATE TABLE features_daily"))
-        
-        # Using pandas to_sql is cleaner for writing large DF with dynamic columns
-        final_df.to_sql(
-            'features_daily', 
-            con=conn, 
-            if_exists='replace', 
-            index=False,
-            method='multi',
-            chunksize=1000 # Batch size
-        )
+        final_df.head(0).to_sql('features_daily', con=conn, if_exists='replace', index=False)
+        ensure_features_index(conn)
+        bulk_upsert(final_df, 'features_daily', ["stock_id", "date"], conn=conn)
+        save_states(conn, states or {})
+
+
+def upsert_features(final_df, states=None):
+    with engine.begin() as conn:
+        ensure_features_index(conn)
+        bulk_upsert(final_df, 'features_daily', ["stock_id", "date"], conn=conn)
+        save_states(conn, states or {})
+
+
+def compute_panel(df, workers: int = 1, obv_initial=None):
+    """
+    calculate_technicals_panel sharded over up to `workers` processes (at
+    least MIN_ROWS_PER_WORKER rows each), logging per-shard timings.
+    """
+    workers = max(1, min(workers, len(df) // MIN_ROWS_PER_WORKER))
+    timings = []
+    panel = calculate_technicals_panel(df, obv_initial=obv_initial, workers=workers, timings=timings)
+    for t in timings:
+        logger.info(f"Shard {t['shard']}: {t['stocks']} stocks, {t['rows']} rows in {t['seconds']:.3f}s")
+    return panel
+
+
+def build_features_full(workers: int = 1):
+    logger.info("Fetching raw price data...")
+    df = fetch_price_data()
+    
+    if df.empty:
+        logger.warning("No price data found in DB!")
+        return
+
+    # Ensure date is datetime
+    df['date'] = pd.to_datetime(df['date'])
+
+    # Whole universe in one vectorized pass (same output as calculate_technicals per stock)
+    panel = compute_panel(df, workers)
+    states = seed_states(panel)
+    final_df = clean_features(panel)
+
+    if final_df.empty:
+        logger.warning("No features generated (maybe not enough history?)")
+        return
+
+    fit_scaler(final_df)
+
+    logger.info(f"Generated {len(final_df)} feature rows. Saving to DB...")
+    save_features_full(final_df, states)
 
     logger.info("Feature engineering completed successfully!")
 
+
+def build_features_streaming(workers: int = 1, chunk_rows: int = STREAM_CHUNK_ROWS):
+    """
+    Full rebuild that never holds the whole universe: stock-aligned chunks are
+    read from a server-side cursor, featurized and written before the next
+    chunk is fetched. The scaler is accumulated with partial_fit.
+    All writes share one transaction, so readers never see a half-built table.
+    """
+    logger.info(f"Streaming full rebuild in chunks of ~{chunk_rows} price rows...")
+    train_scaler, all_scaler = StandardScaler(), StandardScaler()
+    train_rows = total_rows = 0
+    TRAIN_CUTOFF = pd.Timestamp("2023-01-01")  # same split as fit_scaler
+    schema = None
+
+    with engine.begin() as conn:
+        for k, df in enumerate(iter_price_chunks(chunk_rows)):
+            df['date'] = pd.to_datetime(df['date'])
+            panel = compute_panel(df, workers)
+            states = seed_states(panel)
+            final_df = clean_features(panel)
+            del panel
+            if final_df.empty:
+                save_states(conn, states)
+                continue
+
+            if schema is None:
+                # First chunk defines the table; later chunks are cast to match it
+                schema = final_df.dtypes
+                final_df.head(0).to_sql('features_daily', con=conn, if_exists='replace', index=False)
+                ensure_features_index(conn)
+            final_df = final_df.astype(schema)
+
+            feature_cols = [c for c in final_df.columns if c not in ('stock_id', 'date')]
+            train = final_df.loc[final_df['date'] < TRAIN_CUTOFF, feature_cols]
+            if len(train):
+                train_scaler.partial_fit(train)
+            all_scaler.partial_fit(final_df[feature_cols])
+            train_rows += len(train)
+            total_rows += len(final_df)
+
+            bulk_upsert(final_df, 'features_daily', ["stock_id", "date"], conn=conn)
+            save_states(conn, states)
+            logger.info(f"Chunk {k}: {final_df['stock_id'].nunique()} stocks, {len(final_df)} feature rows written.")
+
+    if total_rows == 0:
+        logger.warning("No features generated (no prices or not enough history?)")
+        return
+
+    if train_rows > 100:
+        save_scaler(train_scaler)
+        logger.info(f"Scaler fitted on {train_rows} training rows (pre-2023 only — no leakage).")
+    else:
+        save_scaler(all_scaler)
+        logger.warning("Not enough pre-2023 data — scaler fitted on full dataset (check your data range).")
+
+    logger.info(f"Streaming feature build completed: {total_rows} rows.")
+
+
+def build_features_incremental(watermarks, workers: int = 1):
+    logger.info(f"Fetching prices since last computed date (+{WARMUP_BARS} warm-up bars per stock)...")
+    df = fetch_incremental_price_data()
+
+    if df.empty:
+        logger.info("features_daily is already up to date.")
+        return
+
+    df['date'] = pd.to_datetime(df['date'])
+    df = df.sort_values(["stock_id", "date"], kind="mergesort").reset_index(drop=True)
+
+    # OBV is a running total since the first bar, so resume it from the stored
+    # value at the last computed date instead of restarting at 0.
+    starts = indicators.segment_starts(df["stock_id"].to_numpy())
+    raw_obv = pd.Series(indicators.obv(df["close"], df["volume"], starts), index=df.index)
+    marks = watermarks.set_index("stock_id")
+    anchor = df["date"] == df["stock_id"].map(marks["last_date"])
+    obv_initial = marks["obv"] - raw_obv[anchor].groupby(df.loc[anchor, "stock_id"]).first()
+
+    panel = compute_panel(df, workers, obv_initial=obv_initial.dropna())
+    states = seed_states(panel)
+
+    # Keep only rows newer than each stock's last computed date
+    last_date = panel["stock_id"].map(marks["last_date"])
+    final_df = clean_features(panel[last_date.isna() | (panel["date"] > last_date)])
+
+    if final_df.empty:
+        logger.info("No new feature rows (new bars still inside warm-up windows).")
+        with engine.begin() as conn:
+            save_states(conn, states)
+        return
+
+    logger.info(f"Generated {len(final_df)} new feature rows for "
+                f"{final_df['stock_id'].nunique()} stocks. Upserting...")
+    upsert_features(final_df, states)
+
+    logger.info("Incremental feature update completed successfully!")
+
+
+def build_features(full: bool = False, workers: int = None, stream: bool = False,
+                   chunk_rows: int = STREAM_CHUNK_ROWS):
+    """
+    Incremental by default: only dates after each stock's last row in
+    features_daily are computed and upserted. Falls back to a full rebuild
+    when the table is missing, empty or its columns no longer match.
+    workers: processes for the per-stock computation (default: CPU count for
+             full rebuilds, 1 for incremental updates, which only cover a
+             warm-up window per stock).
+    stream: run full rebuilds chunk by chunk (peak memory ~ chunk_rows).
+    """
+    if not full:
+        watermarks = fetch_feature_watermarks()
+        if watermarks is None or watermarks.empty:
+            logger.info("features_daily is empty — running a full rebuild.")
+            full = True
+        else:
+            existing = {c["name"] for c in inspect(engine).get_columns("features_daily")}
+            expected = {"stock_id", "date", "close", "volume", "open"} | set(technical_features([], []))
+            if existing != expected:
+                logger.warning("features_daily columns changed — running a full rebuild.")
+                full = True
+
+    if full:
+        workers = workers or os.cpu_count() or 1
+    if full and stream:
+        build_features_streaming(workers, chunk_rows)
+    elif full:
+        build_features_full(workers)
+    else:
+        build_features_incremental(watermarks, workers or 1)
+
+
 if __name__ == "__main__":
-    build_features()
+    parser = argparse.ArgumentParser(description="Build features_daily from prices.")
+    parser.add_argument("--full", action="store_true",
+                        help="Recompute all history and replace features_daily (also refits the scaler).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes to shard stocks across (default: CPU count for full rebuilds, "
+                             "1 for incremental updates; 1 = single process).")
+    parser.add_argument("--stream", action="store_true",
+                        help="Full rebuilds read, compute and write stock-aligned chunks (bounded memory).")
+    parser.add_argument("--chunk-rows", type=int, default=STREAM_CHUNK_ROWS,
+                        help=f"Price rows per streamed chunk (default: {STREAM_CHUNK_ROWS}).")
+    args = parser.parse_args()
+    build_features(full=args.full, workers=args.workers, stream=args.stream, chunk_rows=args.chunk_rows)
@@ -1,117 +1,186 @@
 import sys
 import os
 sys.path.append(os.getcwd())
+import time
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
 from sqlalchemy import text
-from config.database import engine
-from feature_engineering.build_features import calculate_technicals
+from config.database import engine, bulk_upsert
+from feature_engineering.panel import calculate_technicals_panel
+from feature_engineering.macro import load_macro_features, macro_as_of, STORE_COLUMNS
+from feature_engineering.macro import LOOKBACK_DAYS as MACRO_LOOKBACK_DAYS
+from feature_engineering.asof import load_daily_sentiment, sentiment_as_of, SENTIMENT_MAX_AGE_DAYS
+from feature_engineering.indicator_state import seed_states, load_states, save_states, features_frame
 import logging
 from config.logger import get_logger
 
 # Use centralized logger
 logger = get_logger(__name__)
 
+# Technical columns of the feature_store table (see db/create_prod_tables.py)
+STORE_TECHNICALS = [
+    "return_1d", "return_5d", "return_20d", "sma_20", "sma_50", "ema_20", "rsi_14", "volatility_20d",
+]
 
-def update_feature_store():
+# feature_store column -> model feature name
+MACRO_FEATURE_NAMES = {col: f"{symbol}_ret" for symbol, col in STORE_COLUMNS.items()}
+
+
+def load_latest_features(conn, symbols=None, active_only: bool = False) -> pd.DataFrame:
+    """
+    Latest feature_store row per stock, with its symbol, in one DISTINCT ON
+    query over the (stock_id, date) key. symbols: clean symbols to restrict
+    to; active_only: only stocks with is_active.
+    """
+    where, params = [], {}
+    if symbols is not None:
+        where.append("s.symbol = ANY(:symbols)")
+        params["symbols"] = list(symbols)
+    if active_only:
+        where.append("s.is_active = true")
+    query = text(f"""
+        SELECT DISTINCT ON (f.stock_id) s.symbol, f.*
+        FROM feature_store f
+        JOIN stocks s ON s.stock_id = f.stock_id
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY f.stock_id, f.date DESC
+    """)
+    return pd.read_sql(query, conn, params=params or None)
+
+
+def model_frame(features: pd.DataFrame, feature_names: list) -> pd.DataFrame:
+    """feature_store rows -> model input: exact model features, in order (missing ones = 0)."""
+    # feature_store macro_* columns hold the "<index>_ret" features
+    X_input = features.rename(columns=MACRO_FEATURE_NAMES)
+
+    # Ensure all model columns exist (defensive programming)
+    for col in feature_names:
+        if col not in X_input.columns:
+            logger.warning(f"Missing feature column '{col}', filling with 0")
+            X_input[col] = 0.0
+
+    return X_input[feature_names]
+
+
+def model_vector(row, feature_names: list) -> np.ndarray:
+    """
+    One feature_store row (any mapping, e.g. an asyncpg Record) -> (1, n)
+    float32 model input, same rules as model_frame without a DataFrame:
+    NULL = NaN, missing column = 0.
+    """
+    store_names = {v: k for k, v in MACRO_FEATURE_NAMES.items()}
+    values = []
+    for col in feature_names:
+        source = store_names.get(col, col)
+        if source not in row:
+            logger.warning(f"Missing feature column '{col}', filling with 0")
+            values.append(0.0)
+        else:
+            values.append(np.nan if row[source] is None else row[source])
+    return np.array([values], dtype=np.float32)
+
+
+def fetch_new_bars(conn):
+    """Prices after each active stock's persisted state date (one query for all stocks)."""
+    query = text("""
+        SELECT p.stock_id, p.date, p.close, p.volume
+        FROM prices p
+        JOIN stocks s ON s.stock_id = p.stock_id AND s.is_active = true
+        JOIN indicator_state st ON st.stock_id = p.stock_id
+        WHERE p.date > st.date
+        ORDER BY p.stock_id, p.date
+    """)
+    return pd.read_sql(query, conn)
+
+
+def seed_missing_states(conn, stock_ids):
+    """Full-history seed for stocks that have no persisted state yet."""
+    query = text("""
+        SELECT stock_id, date, close, volume, open
+        FROM prices
+        WHERE stock_id = ANY(:ids)
+        ORDER BY stock_id, date
+    """)
+    df = pd.read_sql(query, conn, params={"ids": [int(s) for s in stock_ids]})
+    if df.empty:
+        return {}
+    df['date'] = pd.to_datetime(df['date'])
+    return seed_states(calculate_technicals_panel(df))
+
+
+@contextmanager
+def _phase(timings: dict, name: str):
+    start = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - start
+
+
+def update_feature_store() -> dict:
+    """
+    Set-based refresh of the latest feature_store row for every active stock.
+    A fixed number of statements runs regardless of universe size, all on one
+    connection inside one transaction. Returns per-phase timings in seconds.
+    """
     logger.info("Starting Feature Store Update...")
-    
-    # 1. Fetch Latest Data for All Active Stocks
-    query_stocks = "SELECT stock_id, symbol FROM stocks WHERE is_active = true"
-    with engine.connect() as conn:
-        stocks = pd.read_sql(text(query_stocks), conn)
-        
-    for _, stock in stocks.iterrows():
-        stock_id = stock['stock_id']
-        symbol = stock['symbol']
-        logger.info(f"Processing {symbol}...")
-        
-        # 2. Fetch Prices (Limit 100 to calculate indicators)
-        query_prices = text("SELECT date, open, high, low, close, volume FROM prices WHERE stock_id = :sid ORDER BY date DESC LIMIT 100")
-        with engine.connect() as conn:
-            df = pd.read_sql(query_prices, conn, params={"sid": stock_id})
-            
-        if df.empty:
-            logger.warning(f"No data for {symbol}, skipping.")
-            continue
-            
-        df = df.sort_values('date') # Ascending for calc
-        
-        # 3. Calculate Technicals
-        df = calculate_technicals(df)
-        
-        # 4. Fetch Macro Data (Latest available)
-        # In a real pipeline, we'd align dates perfectly. 
-        # Here we fetch the LATEST available macro row and broadcast it.
-        # This assumes the cron runs daily when both markets are "current".
-        macro_query = text("SELECT * FROM index_prices ORDER BY date DESC LIMIT 1")
-        with engine.connect() as conn:
-            macro_df = pd.read_sql(macro_query, conn)
-            
-        if not macro_df.empty:
-            # Calculate returns for macro (simplified for daily store)
-            # In a robust system, we'd calculate returns from history.
-            # Here we assume pre-calculated or just use raw prices for V1 store.
-            # WAIT: The model expects 'returns'.
-            # We need to fetch HISTORY of macro to calc returns.
-            pass
-            
-        # COMPLEXITY REDUCTION:
-        # Instead of recalculating EVERYTHING from scratch (which risks mismatch with training),
-        # we will use the same logic as 'build_dataset.py' but for specific dates.
-        # HOWEVER, for the "Production Store", we usually just want the LATEST row.
-        
-        # Let's pull the LATEST row.
-        latest_row = df.iloc[-1]
-        date = latest_row['date']
-        
+    timings = {}
+
+    with engine.begin() as conn:
+        # 1. Load persisted indicator state for all active stocks
+        with _phase(timings, "load_state"):
+            stocks = pd.read_sql(text("SELECT stock_id FROM stocks WHERE is_active = true"), conn)
+            states = load_states(conn, stocks['stock_id'])
+            missing = [sid for sid in stocks['stock_id'] if int(sid) not in states]
+            if missing:
+                logger.info(f"Seeding indicator state from full history for {len(missing)} stocks...")
+                states.update(seed_missing_states(conn, missing))
+
+        # 2. Every stock's new bars in one query
+        with _phase(timings, "fetch_prices"):
+            bars = fetch_new_bars(conn)
+
+        if not states:
+            logger.warning("No price data for active stocks — nothing to update.")
+            return timings
+
+        # 3. Advance each state by its new bars (constant work per bar, no history
+        #    refetch) and take the latest feature row per stock straight from it
+        with _phase(timings, "compute"):
+            for stock_id, close, volume, date in zip(bars['stock_id'], bars['close'], bars['volume'], bars['date']):
+                states[int(stock_id)].update(date, close, volume)
+            store_df = features_frame(states.values())[["stock_id", "date"] + STORE_TECHNICALS].copy()
+            store_df["date"] = store_df["date"].dt.date
+            store_df[STORE_TECHNICALS] = store_df[STORE_TECHNICALS].replace([np.inf, -np.inf], np.nan).fillna(0.0)
+
+        # 4. Macro returns: one index query over the lookback window, as of each stock's date
+        with _phase(timings, "fetch_macro"):
+            since = pd.Timestamp(min(store_df["date"])) - pd.Timedelta(days=MACRO_LOOKBACK_DAYS)
+            macro = macro_as_of(load_macro_features(conn, since), store_df["date"])
+            for symbol, col in STORE_COLUMNS.items():
+                values = macro.get(f"{symbol}_ret")
+                store_df[col] = 0.0 if values is None else values.fillna(0.0).to_numpy(dtype=float)
+
         # 5. Get Sentiment
-        sent_query = text("SELECT AVG(sentiment_score) as score FROM news WHERE date = :date")
-        with engine.connect() as conn:
-            sent = pd.read_sql(sent_query, conn, params={"date": date})
-        sentiment = sent.iloc[0]['score'] if not sent.empty and pd.notna(sent.iloc[0]['score']) else 0.0
-        
-        # 6. Insert into Feature Store
-        # We need to handle the specific columns the table expects.
-        # Table cols: stock_id, date, return_1d... macro... sentiment
-        
-        # Define the row to insert
-        insert_query = text("""
-            INSERT INTO feature_store (
-                stock_id, date, 
-                return_1d, return_5d, return_20d, sma_20, sma_50, ema_20, rsi_14, volatility_20d,
-                macro_nifty_bank_ret, macro_crude_oil_ret, macro_gold_ret, macro_usd_inr_ret, macro_nifty_50_ret,
-                sentiment_score
-            ) VALUES (
-                :sid, :date,
-                :r1, :r5, :r20, :sma20, :sma50, :ema20, :rsi, :vol,
-                0, 0, 0, 0, 0, -- Macro defaults for V1 stability (Phase 12 MVP)
-                :sent
-            )
-            ON CONFLICT (stock_id, date) DO UPDATE SET
-                return_1d = EXCLUDED.return_1d,
-                rsi_14 = EXCLUDED.rsi_14,
-                sentiment_score = EXCLUDED.sentiment_score;
-        """)
-        
-        # Convert NumPy types to Python types for SQL
-        params = {
-            "sid": stock_id,
-            "date": date,
-            "r1": float(latest_row.get('return_1d', 0)),
-            "r5": float(latest_row.get('return_5d', 0)),
-            "r20": float(latest_row.get('return_20d', 0)),
-            "sma20": float(latest_row.get('sma_20', 0)),
-            "sma50": float(latest_row.get('sma_50', 0)),
-            "ema20": float(latest_row.get('ema_20', 0)),
-            "rsi": float(latest_row.get('rsi_14', 0)),
-            "vol": float(latest_row.get('volatility_20d', 0)),
-            "sent": float(sentiment)
-        }
-        
-        with engine.begin() as conn:
-            conn.execute(insert_query, params)
-            
-    logger.info("Feature Store Updated Successfully.")
+        with _phase(timings, "fetch_sentiment"):
+            # Same as-of rule as build_dataset: latest daily average within SENTIMENT_MAX_AGE_DAYS
+            since = pd.Timestamp(min(store_df["date"])) - pd.Timedelta(days=SENTIMENT_MAX_AGE_DAYS)
+            sentiment = sentiment_as_of(load_daily_sentiment(conn, since), store_df["date"])
+            store_df["sentiment_score"] = sentiment["daily_sentiment"].to_numpy(dtype=float)
+
+        # 6. One multi-row upsert into the Feature Store, plus the advanced state
+        with _phase(timings, "write"):
+            # Stamp rewritten rows too: max(created_at) is the version the API's feature cache polls
+            store_df["created_at"] = conn.execute(text("SELECT LOCALTIMESTAMP")).scalar()
+            bulk_upsert(store_df, "feature_store", ["stock_id", "date"], conn=conn)
+            save_states(conn, states)
+
+    logger.info(f"Feature Store Updated Successfully ({len(store_df)} stocks, {len(bars)} new bars). "
+                + ", ".join(f"{k}={v:.3f}s" for k, v in timings.items()))
+    return timings
+
 
 if __name__ == "__main__":
     update_feature_store()
+    # Post-refresh stage: score every active stock once with the deployed model
+    from model.daily_signals import score_daily_signals
+    score_daily_signals()
@@ -0,0 +1,214 @@
+"""
+feature_engineering/indicator_state.py
+
+Persisted per-stock indicator state for constant-time daily feature updates.
+
+For each stock the `indicator_state` table keeps everything needed to
+extend its features by one bar without re-reading history:
+  - fixed-length windows of the latest closes, volumes and OBV values
+  - EMA accumulators (ema_20, the MACD 12/26 EMAs and the MACD signal)
+  - the running OBV total (last element of the OBV window)
+
+build_features seeds the state from the full-history batch computation, and
+update_feature_store advances it one bar at a time. Window features reuse the
+same kernels over the same rows in the same order, so serving values are
+identical to the features_daily rows the model is trained on.
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from config.database import bulk_upsert
+from feature_engineering import indicators as ind
+from feature_engineering.panel import FEAT_CONFIG, MAX_WINDOW, technical_features
+
+CLOSE_WINDOW = MAX_WINDOW       # closes needed for returns, SMAs, RSI, volatility, lags
+VOLUME_WINDOW = 20              # volume_ratio and obv_ma both use 20 bars
+EMA_SPANS = sorted(set(FEAT_CONFIG.get("ema_windows", [20]) + [12, 26]))
+MACD_SIGNAL_SPAN = 9
+
+
+def _ema_step(weighted: float, cur: float, span: int) -> float:
+    """One ewm(adjust=False) update, written exactly like the EMA kernels."""
+    if weighted != weighted:
+        return cur
+    alpha = 2.0 / (span + 1.0)
+    old_wt = 1.0 - alpha
+    if cur == cur and weighted != cur:
+        weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+    return weighted
+
+
+class IndicatorState:
+    """Rolling indicator state of one stock as of `date` (its latest bar)."""
+
+    def __init__(self, stock_id, date, closes, volumes, obvs, emas):
+        self.stock_id = int(stock_id)
+        self.date = pd.Timestamp(date)
+        self.closes = np.asarray(closes, dtype=np.float64)[-CLOSE_WINDOW:]
+        self.volumes = np.asarray(volumes, dtype=np.float64)[-VOLUME_WINDOW:]
+        self.obvs = np.asarray(obvs, dtype=np.float64)[-VOLUME_WINDOW:]
+        self.emas = {k: float(v) for k, v in emas.items()}
+
+    def update(self, date, close: float, volume: float):
+        """Advance the state by one new bar."""
+        # Missing prints are forward filled, as in calculate_technicals
+        if close != close:
+            close = self.closes[-1]
+        if volume != volume:
+            volume = self.volumes[-1]
+
+        prev = self.closes[-1]
+        total = self.obvs[-1]
+        if close > prev:
+            total = total + volume
+        elif close < prev:
+            total = total - volume
+
+        self.closes = np.append(self.closes, close)[-CLOSE_WINDOW:]
+        self.volumes = np.append(self.volumes, volume)[-VOLUME_WINDOW:]
+        self.obvs = np.append(self.obvs, total)[-VOLUME_WINDOW:]
+
+        for span in EMA_SPANS:
+            self.emas[f"ema_{span}"] = _ema_step(self.emas[f"ema_{span}"], close, span)
+        macd = self.emas["ema_12"] - self.emas["ema_26"]
+        self.emas["macd_signal"] = _ema_step(self.emas["macd_signal"], macd, MACD_SIGNAL_SPAN)
+        self.date = pd.Timestamp(date)
+
+    def features(self) -> dict:
+        """Feature values at the latest bar, keyed like features_daily columns."""
+        row = features_frame([self]).iloc[0]
+        return {k: float(v) for k, v in row.drop(["stock_id", "date"]).items()}
+
+
+def _segments(buffers):
+    """Lays per-stock buffers end to end; returns (values, starts, last row of each)."""
+    lengths = np.array([len(b) for b in buffers], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+    values = np.concatenate(buffers) if buffers else np.zeros(0)
+    return values, starts, starts + lengths - 1
+
+
+def features_frame(states) -> pd.DataFrame:
+    """
+    Latest feature row of many stocks in one batch: the buffers are laid end
+    to end as segments and every kernel runs once over all of them.
+    Returns one row per state (stock_id, date, feature columns).
+    """
+    states = list(states)
+
+    # Window-based columns: the shared recipe over the buffered bars
+    # (volumes are NaN-padded so both windows end on the same row)
+    closes, starts, last = _segments([st.closes for st in states])
+    volumes = np.full(len(closes), np.nan)
+    for st, end in zip(states, last + 1):
+        volumes[end - len(st.volumes):end] = st.volumes
+    feats = {k: v[last] for k, v in technical_features(closes, volumes, starts).items()}
+
+    # Recursive columns come from the persisted accumulators
+    def acc(name):
+        return np.array([st.emas[name] for st in states], dtype=np.float64)
+
+    for w in FEAT_CONFIG.get("ema_windows", [20]):
+        feats[f"ema_{w}"] = acc(f"ema_{w}")
+    feats["macd"] = acc("ema_12") - acc("ema_26")
+    feats["macd_signal"] = acc("macd_signal")
+    feats["macd_hist"] = feats["macd"] - feats["macd_signal"]
+    obvs, obv_starts, obv_last = _segments([st.obvs for st in states])
+    feats["obv"] = obvs[obv_last]
+    feats["obv_ma"] = ind.rolling_mean(obvs, VOLUME_WINDOW, obv_starts)[obv_last]
+
+    out = pd.DataFrame(feats)
+    out.insert(0, "date", [st.date for st in states])
+    out.insert(0, "stock_id", [st.stock_id for st in states])
+    return out
+
+
+def seed_states(panel: pd.DataFrame) -> dict:
+    """
+    Builds the state at each stock's last row from calculate_technicals_panel
+    output (sorted by stock_id, date, before dropping warm-up rows).
+    """
+    if panel.empty:
+        return {}
+    starts = ind.segment_starts(panel["stock_id"].to_numpy())
+    ends = np.append(starts[1:], len(panel))
+    close = panel["close"].to_numpy(dtype=np.float64)
+    volume = panel["volume"].to_numpy(dtype=np.float64)
+    obv = panel["obv"].to_numpy(dtype=np.float64)
+    emas = {f"ema_{span}": ind.ema(close, span, starts)[ends - 1] for span in EMA_SPANS}
+    emas["macd_signal"] = panel["macd_signal"].to_numpy()[ends - 1]
+    stock_ids = panel["stock_id"].to_numpy()[starts]
+    dates = panel["date"].to_numpy()[ends - 1]
+
+    states = {}
+    for k, (a, b) in enumerate(zip(starts, ends)):
+        states[int(stock_ids[k])] = IndicatorState(
+            stock_ids[k], dates[k],
+            closes=close[max(a, b - CLOSE_WINDOW):b],
+            volumes=volume[max(a, b - VOLUME_WINDOW):b],
+            obvs=obv[max(a, b - VOLUME_WINDOW):b],
+            emas={name: values[k] for name, values in emas.items()},
+        )
+    return states
+
+
+# ----------------------------------------------------------
+# Persistence
+# ----------------------------------------------------------
+def ensure_state_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS indicator_state (
+            stock_id INTEGER PRIMARY KEY REFERENCES stocks(stock_id),
+            date DATE NOT NULL,
+            closes FLOAT8[] NOT NULL,
+            volumes FLOAT8[] NOT NULL,
+            obvs FLOAT8[] NOT NULL,
+            emas JSONB NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+
+def save_states(conn, states: dict):
+    """Upserts states (dict of stock_id -> IndicatorState) with one COPY + merge."""
+    if not states:
+        return
+    ensure_state_table(conn)
+    rows = pd.DataFrame({
+        "stock_id": [st.stock_id for st in states.values()],
+        "date": [st.date.date() for st in states.values()],
+        "closes": [_array_literal(st.closes) for st in states.values()],
+        "volumes": [_array_literal(st.volumes) for st in states.values()],
+        "obvs": [_array_literal(st.obvs) for st in states.values()],
+        "emas": [_emas_json(st.emas) for st in states.values()],
+    })
+    rows["updated_at"] = pd.Timestamp.now()
+    bulk_upsert(rows, "indicator_state", ["stock_id"], conn=conn)
+
+
+def _array_literal(values) -> str:
+    # PostgreSQL FLOAT8[] text form; repr() round-trips float64 exactly
+    return "{" + ",".join(repr(float(v)) for v in values) + "}"
+
+
+def _emas_json(emas: dict) -> str:
+    # repr() round-trips float64 exactly; NaN/inf are not valid JSON numbers
+    return "{" + ", ".join(
+        f'"{k}": {repr(v) if np.isfinite(v) else "null"}' for k, v in emas.items()
+    ) + "}"
+
+
+def load_states(conn, stock_ids=None) -> dict:
+    """Loads persisted states, optionally only for the given stock_ids."""
+    ensure_state_table(conn)
+    query = "SELECT stock_id, date, closes, volumes, obvs, emas FROM indicator_state"
+    params = {}
+    if stock_ids is not None:
+        query += " WHERE stock_id = ANY(:ids)"
+        params["ids"] = [int(s) for s in stock_ids]
+    states = {}
+    for row in conn.execute(text(query), params):
+        emas = {k: (np.nan if v is None else v) for k, v in row.emas.items()}
+        states[row.stock_id] = IndicatorState(row.stock_id, row.date, row.closes, row.volumes, row.obvs, emas)
+    return states
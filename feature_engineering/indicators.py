@@ -0,0 +1,307 @@
+"""
+feature_engineering/indicators.py
+
+Indicator kernels shared by build_features, the panel engine and the feature store.
+
+Every kernel takes flat float64 arrays plus optional segment `starts`
+(row offsets where a new stock begins, as returned by segment_starts()).
+Without `starts` the whole array is treated as one stock. Windows, lags and
+recursions never cross a segment boundary.
+
+Two interchangeable backends are selected at import time:
+  - numba : compiled per-segment loops (used when numba is installed)
+  - numpy : pure-NumPy fallback, vectorized across segments
+Both produce identical results and match the pandas formulas previously
+inlined in calculate_technicals (rolling().mean(), ewm(adjust=False), etc.).
+Set INDICATOR_BACKEND=numpy to force the fallback.
+"""
+import os
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # Optional dependency
+    numba = None
+
+BACKEND = "numba" if numba is not None and os.getenv("INDICATOR_BACKEND", "numba") == "numba" else "numpy"
+
+
+# ----------------------------------------------------------
+# Segment layout
+# ----------------------------------------------------------
+def segment_starts(keys) -> np.ndarray:
+    """Row offsets where `keys` (e.g. a sorted stock_id column) changes value."""
+    keys = np.asarray(keys)
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+    change = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    return np.concatenate(([0], change)).astype(np.int64)
+
+
+def _bounds(n: int, starts) -> tuple:
+    if starts is None:
+        starts = np.zeros(1 if n else 0, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.append(starts[1:], n).astype(np.int64)
+    return starts, ends
+
+
+def _positions(n: int, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Index of each row inside its own segment."""
+    return np.arange(n) - np.repeat(starts, ends - starts)
+
+
+def _as_float(values) -> np.ndarray:
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+# ----------------------------------------------------------
+# Cheap segment-aware helpers (NumPy only)
+# ----------------------------------------------------------
+def shift(values, periods: int, starts=None) -> np.ndarray:
+    """values shifted forward by `periods` rows inside each segment (NaN-padded)."""
+    x = _as_float(values)
+    starts, ends = _bounds(len(x), starts)
+    out = np.full(len(x), np.nan)
+    if periods < len(x):
+        out[periods:] = x[:len(x) - periods]
+    out[_positions(len(x), starts, ends) < periods] = np.nan
+    return out
+
+
+def pct_change(values, periods: int = 1, starts=None) -> np.ndarray:
+    """Series.pct_change(periods) per segment."""
+    x = _as_float(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return x / shift(x, periods, starts) - 1
+
+
+def ffill(values, starts=None) -> np.ndarray:
+    """Forward fill NaNs without carrying values across segments."""
+    x = _as_float(values)
+    starts, ends = _bounds(len(x), starts)
+    last = np.maximum.accumulate(np.where(~np.isnan(x), np.arange(len(x)), -1))
+    seg_start = np.repeat(starts, ends - starts)
+    out = x[np.maximum(last, 0)]
+    out[last < seg_start] = np.nan  # nothing valid yet in this segment
+    return out
+
+
+# ----------------------------------------------------------
+# NumPy backend
+# ----------------------------------------------------------
+def _rolling_mean_numpy(x, window, starts, ends):
+    # Shift-and-add keeps the sum local to the window (no global cumsum drift)
+    acc = x.copy()
+    for k in range(1, min(window, len(x))):
+        acc[k:] += x[:len(x) - k]
+    acc /= window
+    acc[_positions(len(x), starts, ends) < window - 1] = np.nan
+    return acc
+
+
+def _rolling_std_numpy(x, window, starts, ends):
+    # Two-pass (mean, then squared deviations) sample std, ddof=1 like pandas
+    mean = _rolling_mean_numpy(x, window, starts, ends)
+    ss = (x - mean) ** 2
+    for k in range(1, min(window, len(x))):
+        dev = np.full(len(x), np.nan)
+        dev[k:] = x[:len(x) - k] - mean[k:]
+        ss += dev ** 2
+    var = ss / (window - 1)
+    return np.sqrt(np.maximum(var, 0))
+
+
+def _to_grid(x, starts, ends, fill):
+    """Scatter a flat column into a (n_segments, max_len) grid, one segment per row."""
+    lengths = ends - starts
+    seg = np.repeat(np.arange(len(starts)), lengths)
+    pos = _positions(len(x), starts, ends)
+    grid = np.full((len(starts), int(lengths.max()) if len(x) else 0), fill, dtype=np.float64)
+    grid[seg, pos] = x
+    return grid, seg, pos
+
+
+def _ema_numpy(x, span, starts, ends):
+    # Recursion runs over the time axis of the grid, vectorized across segments,
+    # mirroring pandas' adjust=False update rule step for step.
+    alpha = 2.0 / (span + 1.0)
+    decay = 1.0 - alpha
+    grid, seg, pos = _to_grid(x, starts, ends, np.nan)
+    out = np.empty_like(grid)
+    if grid.shape[1] == 0:
+        return out[seg, pos]
+
+    weighted = grid[:, 0].copy()
+    old_wt = np.ones(grid.shape[0])
+    out[:, 0] = weighted
+    for t in range(1, grid.shape[1]):
+        cur = grid[:, t]
+        started = ~np.isnan(weighted)
+        observed = ~np.isnan(cur)
+        old_wt = np.where(started, old_wt * decay, old_wt)
+        with np.errstate(invalid="ignore"):
+            blended = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+        weighted = np.where(started & observed & (weighted != cur), blended, weighted)
+        old_wt = np.where(started & observed, 1.0, old_wt)
+        weighted = np.where(~started & observed, cur, weighted)
+        out[:, t] = weighted
+    return out[seg, pos]
+
+
+def _obv_numpy(close, volume, starts, ends, initial):
+    delta = close - shift(close, 1, starts)
+    step = np.where(delta > 0, volume, np.where(delta < 0, -volume, 0.0))
+    # Per-segment running sum in the same order as a sequential loop
+    grid, seg, pos = _to_grid(step, starts, ends, 0.0)
+    if grid.shape[1]:
+        grid[:, 0] = initial
+    return np.cumsum(grid, axis=1)[seg, pos]
+
+
+# ----------------------------------------------------------
+# Numba backend
+# ----------------------------------------------------------
+if numba is not None:
+    @numba.njit(cache=True)
+    def _rolling_mean_numba(x, window, starts, ends):
+        out = np.full(len(x), np.nan)
+        for s in range(len(starts)):
+            for i in range(starts[s] + window - 1, ends[s]):
+                acc = x[i]
+                for k in range(1, window):
+                    acc += x[i - k]
+                out[i] = acc / window
+        return out
+
+    @numba.njit(cache=True)
+    def _rolling_std_numba(x, window, starts, ends):
+        out = np.full(len(x), np.nan)
+        for s in range(len(starts)):
+            for i in range(starts[s] + window - 1, ends[s]):
+                acc = x[i]
+                for k in range(1, window):
+                    acc += x[i - k]
+                mean = acc / window
+                ss = (x[i] - mean) * (x[i] - mean)
+                for k in range(1, window):
+                    dev = x[i - k] - mean
+                    ss += dev * dev
+                var = ss / (window - 1)
+                if var < 0:
+                    var = 0.0
+                out[i] = np.sqrt(var)
+        return out
+
+    @numba.njit(cache=True)
+    def _ema_numba(x, span, starts, ends):
+        alpha = 2.0 / (span + 1.0)
+        decay = 1.0 - alpha
+        out = np.empty(len(x))
+        for s in range(len(starts)):
+            a, b = starts[s], ends[s]
+            if a == b:
+                continue
+            weighted = x[a]
+            old_wt = 1.0
+            out[a] = weighted
+            for i in range(a + 1, b):
+                cur = x[i]
+                if weighted == weighted:
+                    old_wt *= decay
+                    if cur == cur:
+                        if weighted != cur:
+                            weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+                        old_wt = 1.0
+                elif cur == cur:
+                    weighted = cur
+                out[i] = weighted
+        return out
+
+    @numba.njit(cache=True)
+    def _obv_numba(close, volume, starts, ends, initial):
+        out = np.empty(len(close))
+        for s in range(len(starts)):
+            a, b = starts[s], ends[s]
+            if a == b:
+                continue
+            total = initial[s]
+            out[a] = total
+            for i in range(a + 1, b):
+                if close[i] > close[i - 1]:
+                    total = total + volume[i]
+                elif close[i] < close[i - 1]:
+                    total = total - volume[i]
+                out[i] = total
+        return out
+
+
+if BACKEND == "numba":
+    _rolling_mean_impl = _rolling_mean_numba
+    _rolling_std_impl = _rolling_std_numba
+    _ema_impl = _ema_numba
+    _obv_impl = _obv_numba
+else:
+    _rolling_mean_impl = _rolling_mean_numpy
+    _rolling_std_impl = _rolling_std_numpy
+    _ema_impl = _ema_numpy
+    _obv_impl = _obv_numpy
+
+
+# ----------------------------------------------------------
+# Public kernels
+# ----------------------------------------------------------
+def rolling_mean(values, window: int, starts=None) -> np.ndarray:
+    """Series.rolling(window).mean() per segment (NaN until `window` rows are seen)."""
+    x = _as_float(values)
+    starts, ends = _bounds(len(x), starts)
+    return _rolling_mean_impl(x, window, starts, ends)
+
+
+def rolling_std(values, window: int, starts=None) -> np.ndarray:
+    """Series.rolling(window).std() (ddof=1) per segment."""
+    x = _as_float(values)
+    starts, ends = _bounds(len(x), starts)
+    return _rolling_std_impl(x, window, starts, ends)
+
+
+def ema(values, span: int, starts=None) -> np.ndarray:
+    """Series.ewm(span=span, adjust=False).mean() per segment."""
+    x = _as_float(values)
+    starts, ends = _bounds(len(x), starts)
+    return _ema_impl(x, span, starts, ends)
+
+
+def rsi(close, window: int = 14, starts=None) -> np.ndarray:
+    """
+    RSI from simple rolling averages of gains and losses
+    (the variant the model has always been trained on).
+    """
+    x = _as_float(close)
+    delta = x - shift(x, 1, starts)
+    gain = np.clip(delta, 0, None)
+    loss = -np.clip(delta, None, 0)
+    avg_gain = rolling_mean(gain, window, starts)
+    avg_loss = rolling_mean(loss, window, starts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        return 100 - (100 / (1 + rs))
+
+
+def macd(close, fast: int = 12, slow: int = 26, signal: int = 9, starts=None) -> tuple:
+    """Returns (macd, macd_signal, macd_hist) per segment."""
+    line = ema(close, fast, starts) - ema(close, slow, starts)
+    signal_line = ema(line, signal, starts)
+    return line, signal_line, line - signal_line
+
+
+def obv(close, volume, starts=None, initial=None) -> np.ndarray:
+    """
+    On-Balance Volume per segment. Each segment starts from 0, or from
+    initial[k] when resuming a running total (incremental builds).
+    """
+    x = _as_float(close)
+    v = _as_float(volume)
+    starts, ends = _bounds(len(x), starts)
+    initial = np.zeros(len(starts)) if initial is None else _as_float(initial)
+    return _obv_impl(x, v, starts, ends, initial)
@@ -0,0 +1,96 @@
+"""
+feature_engineering/macro.py
+
+Macro (index) features shared by the training dataset and the feature store.
+
+One query pulls `index_prices` for the requested window into a small
+date x symbol pivot; daily returns are computed once per run and then
+broadcast to every stock by date:
+  - build_dataset aligns them as of each trading date (full history)
+  - update_feature_store looks them up as of each stock's latest date
+    (lookback window only), so serving sees the same values as training
+
+Usage:
+    from feature_engineering.macro import load_macro_features, macro_as_of
+    macro = load_macro_features()                  # date | ^NSEBANK_ret | ... | index_close_today
+    rows = macro_as_of(macro, dates)               # one row per requested date
+"""
+import pandas as pd
+import yaml
+from sqlalchemy import text
+
+from config.database import engine
+from feature_engineering.asof import series_as_of
+
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+# Index whose close drives the excess-return target
+BENCHMARK_SYMBOL = "^NSEI"
+
+# feature_store column holding each index return (model feature: "<symbol>_ret")
+STORE_COLUMNS = {
+    "^NSEBANK": "macro_nifty_bank_ret",
+    "CL=F": "macro_crude_oil_ret",
+    "GC=F": "macro_gold_ret",
+    "INR=X": "macro_usd_inr_ret",
+    "^NSEI": "macro_nifty_50_ret",
+}
+
+# Calendar days of index history the feature store pulls before its oldest date
+LOOKBACK_DAYS = config.get("feature_store", {}).get("lookback_days", 100)
+
+
+def fetch_index_pivot(conn=None, since=None) -> pd.DataFrame:
+    """Index closes as a date x symbol pivot (one query), optionally from `since` on."""
+    query = """
+        SELECT i.symbol, ip.date, ip.close
+        FROM index_prices ip
+        JOIN indices i ON ip.index_id = i.index_id
+    """
+    params = {}
+    if since is not None:
+        query += " WHERE ip.date >= :since"
+        params["since"] = pd.Timestamp(since).date()
+    query += " ORDER BY ip.date"
+
+    if conn is None:
+        with engine.connect() as conn:
+            df_idx = pd.read_sql(text(query), conn, params=params)
+    else:
+        df_idx = pd.read_sql(text(query), conn, params=params)
+
+    if df_idx.empty:
+        return pd.DataFrame()
+    # Pivot: date | CL=F | GC=F | INR=X | ^NSEBANK | ^NSEI
+    return df_idx.pivot(index='date', columns='symbol', values='close')
+
+
+def macro_returns(pivot: pd.DataFrame) -> pd.DataFrame:
+    """
+    date | <symbol>_ret ... | index_close_today from an index pivot.
+    Returns use pct_change(1) on the pivot (past info only); index_close_today
+    is the benchmark close used for the target.
+    """
+    if pivot.empty:
+        return pd.DataFrame()
+    df_macro_ret = pivot.pct_change().add_suffix('_ret')
+    df_macro_raw = pivot[[BENCHMARK_SYMBOL]].rename(columns={BENCHMARK_SYMBOL: 'index_close_today'})
+    df_macro_final = pd.concat([df_macro_ret, df_macro_raw], axis=1).reset_index()
+    df_macro_final['date'] = pd.to_datetime(df_macro_final['date'])
+    df_macro_final.columns.name = None
+    return df_macro_final
+
+
+def load_macro_features(conn=None, since=None) -> pd.DataFrame:
+    """fetch_index_pivot + macro_returns: the macro frame for one run (one query)."""
+    return macro_returns(fetch_index_pivot(conn, since))
+
+
+def macro_as_of(macro: pd.DataFrame, dates) -> pd.DataFrame:
+    """
+    Macro row in effect on each of `dates` (latest index date <= date, with
+    gaps forward filled), one row per input date in input order. This is the
+    same as-of join build_dataset uses (feature_engineering/asof.py).
+    """
+    return series_as_of(macro, dates, ffill=True)
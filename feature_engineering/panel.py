@@ -0,0 +1,171 @@
+"""
+feature_engineering/panel.py
+
+Universe-wide technical indicator engine.
+
+Computes exactly the columns produced by calculate_technicals() for every
+stock at once, in a single pass over contiguous NumPy arrays sorted by
+(stock_id, date). Segment boundaries are placed wherever stock_id changes,
+so no window, lag or recursion ever reads another stock's rows.
+
+With workers > 1 the universe is split into contiguous shards of whole
+stocks that run in a process pool. Workers receive only the NumPy columns
+of their shard and return feature arrays, which are stitched back together
+in shard order, so the output is identical to a single-process run.
+
+Usage:
+    from feature_engineering.panel import calculate_technicals_panel
+    features = calculate_technicals_panel(prices_df)  # needs stock_id, date, close, open, volume
+    features = calculate_technicals_panel(prices_df, workers=8)
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from feature_engineering import indicators as ind
+
+# Load Config (same keys calculate_technicals reads)
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+FEAT_CONFIG = config.get("features", {})
+
+# Longest lookback (in bars) any feature in the recipe needs for its latest value
+MAX_WINDOW = max(
+    FEAT_CONFIG.get("sma_windows", [20, 50])
+    + [FEAT_CONFIG.get("volatility_window", 20) + 1, FEAT_CONFIG.get("rsi_window", 14) + 1, 21]
+    + [lag + 1 for lag in FEAT_CONFIG.get("lag_days", [])]
+)
+
+
+def technical_features(close, volume, starts=None, obv_initial=None) -> dict:
+    """
+    The feature recipe shared by calculate_technicals (one stock) and
+    calculate_technicals_panel (many stocks, split by `starts`).
+    obv_initial optionally resumes each segment's OBV from a stored total.
+    Returns {column: array} in the column order written to features_daily.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    feats = {}
+
+    # 2. Returns
+    feats["return_1d"] = ind.pct_change(close, 1, starts)
+    feats["return_5d"] = ind.pct_change(close, 5, starts)
+    feats["return_20d"] = ind.pct_change(close, 20, starts)
+
+    # 3. SMAs
+    for w in FEAT_CONFIG.get("sma_windows", [20, 50]):
+        feats[f"sma_{w}"] = ind.rolling_mean(close, w, starts)
+
+    # 4. EMAs
+    for w in FEAT_CONFIG.get("ema_windows", [20]):
+        feats[f"ema_{w}"] = ind.ema(close, w, starts)
+
+    # 5. RSI
+    rsi_window = FEAT_CONFIG.get("rsi_window", 14)
+    feats[f"rsi_{rsi_window}"] = ind.rsi(close, rsi_window, starts)
+
+    # 6. Volatility
+    vol_window = FEAT_CONFIG.get("volatility_window", 20)
+    feats[f"volatility_{vol_window}d"] = ind.rolling_std(feats["return_1d"], vol_window, starts)
+
+    # 7. Lag Features
+    for lag in FEAT_CONFIG.get("lag_days", []):
+        feats[f"close_lag_{lag}"] = ind.shift(close, lag, starts)
+
+    # 8. MACD (12/26/9)
+    feats["macd"], feats["macd_signal"], feats["macd_hist"] = ind.macd(close, 12, 26, 9, starts)
+
+    # 9. Volume Ratio (today's volume vs 20d avg — spikes = momentum)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        feats["volume_ratio"] = volume / ind.rolling_mean(volume, 20, starts)
+
+    # 10. OBV (On-Balance Volume)
+    feats["obv"] = ind.obv(close, volume, starts, obv_initial)
+    feats["obv_ma"] = ind.rolling_mean(feats["obv"], 20, starts)
+
+    # 11. Price vs SMA20 distance (how extended is price from its mean)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        feats["price_to_sma20"] = (close - feats["sma_20"]) / feats["sma_20"]
+
+    return feats
+
+
+def _panel_block(close, open_, volume, starts, obv_initial):
+    """
+    Forward fill + feature recipe for one contiguous block of whole stocks.
+    Runs in the caller or inside a pool worker; returns
+    ({column: filled array}, {feature: array}, seconds).
+    """
+    t0 = time.perf_counter()
+
+    # 1. Handle Missing Data (forward fill inside each stock only)
+    filled = {}
+    for col, values in (("close", close), ("open", open_), ("volume", volume)):
+        if values.dtype.kind == "f" and np.isnan(values).any():
+            values = ind.ffill(values, starts)
+        filled[col] = values
+
+    feats = technical_features(filled["close"], filled["volume"], starts, obv_initial)
+    return filled, feats, time.perf_counter() - t0
+
+
+def _shard_bounds(starts: np.ndarray, n_rows: int, n_shards: int) -> np.ndarray:
+    """Row offsets splitting the panel into ~equal-sized shards of whole stocks."""
+    edges = np.append(starts, n_rows)
+    targets = np.linspace(0, n_rows, n_shards + 1)[1:-1]
+    cuts = edges[np.searchsorted(starts, targets)]
+    return np.unique(np.concatenate(([0], cuts, [n_rows])))
+
+
+def calculate_technicals_panel(df: pd.DataFrame, obv_initial: pd.Series = None,
+                               workers: int = 1, timings: list = None) -> pd.DataFrame:
+    """
+    Vectorized equivalent of running calculate_technicals() on every
+    df.groupby("stock_id") group and concatenating the results.
+    obv_initial (indexed by stock_id) sets the OBV each stock starts from;
+    stocks missing from it start at 0.
+    workers > 1 shards stocks across a process pool (same output).
+    If `timings` is a list, one {"shard", "stocks", "rows", "seconds"} dict
+    per shard is appended to it.
+    Returns rows sorted by (stock_id, date) with the same column order.
+    """
+    df = df.sort_values(["stock_id", "date"], kind="mergesort").reset_index(drop=True)
+    starts = ind.segment_starts(df["stock_id"].to_numpy())
+
+    if obv_initial is not None:
+        stock_ids = df["stock_id"].to_numpy()[starts]
+        obv_initial = obv_initial.reindex(stock_ids).fillna(0.0).to_numpy()
+    else:
+        obv_initial = np.zeros(len(starts))
+
+    # Each job is one shard's raw columns, segment offsets and OBV seeds
+    bounds = _shard_bounds(starts, len(df), max(1, min(workers, len(starts))))
+    columns = [df[col].to_numpy() for col in ("close", "open", "volume")]
+    jobs = []
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        segs = (starts >= a) & (starts < b)
+        jobs.append([values[a:b] for values in columns] + [starts[segs] - a, obv_initial[segs]])
+
+    if len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            results = list(pool.map(_panel_block, *zip(*jobs)))
+    else:
+        results = [_panel_block(*job) for job in jobs]
+
+    if timings is not None:
+        for k, (job, (_, _, seconds)) in enumerate(zip(jobs, results)):
+            timings.append({"shard": k, "stocks": len(job[3]), "rows": len(job[0]), "seconds": seconds})
+
+    # Gather shards back into single columns, in shard (= stock_id) order
+    def gather(part, col):
+        return np.concatenate([r[part][col] for r in results]) if results else np.zeros(0)
+
+    for col in ("close", "open", "volume"):
+        df[col] = gather(0, col)
+    feats = {col: gather(1, col) for col in technical_features([], [])}
+    return pd.concat([df, pd.DataFrame(feats, index=df.index)], axis=1)
@@ -3,17 +3,19 @@ import pandas as pd
 from sklearn.preprocessing import StandardScaler
 import os
 
-SCALER_PATH = "model/artifacts/scaler.pkl"
+SCALER_PATH = os.getenv("SCALER_PATH", "model/artifacts/scaler.pkl")
 
 def fit_and_save_scaler(df: pd.DataFrame, feature_columns: list):
     """
     Fits a StandardScaler on the given features and saves it.
     """
-    os.makedirs(os.path.dirname(SCALER_PATH), exist_ok=True)
-    
     scaler = StandardScaler()
     scaler.fit(df[feature_columns])
-    
+    return save_scaler(scaler)
+
+def save_scaler(scaler: StandardScaler):
+    """Saves an already fitted scaler (e.g. built chunk by chunk with partial_fit)."""
+    os.makedirs(os.path.dirname(SCALER_PATH), exist_ok=True)
     joblib.dump(scaler, SCALER_PATH)
     print(f"Scaler saved to {SCALER_PATH}")
     return scaler
@@ -1,7 +1,7 @@
 from transformers import pipeline
 import pandas as pd
 from sqlalchemy import text
-from config.database import engine
+from config.database import engine, bulk_upsert
 import torch
 import logging
 
@@ -54,11 +54,8 @@ def analyze_sentiment():
     # Save back to DB
     if updates:
         logger.info(f"Updating database with {len(updates)} scores...")
-        with engine.begin() as conn:
-            for up in updates:
-                conn.execute(text("""
-                    UPDATE news SET sentiment_score = :score WHERE id = :id
-                """), {"score": up['score'], "id": up['id']})
+        scores = pd.DataFrame(updates).rename(columns={"score": "sentiment_score"})
+        bulk_upsert(scores, "news", ["id"], update_cols=["sentiment_score"], insert=False)
             
     logger.info("Sentiment analysis complete.")
 
@@ -2,23 +2,26 @@ import requests
 import json
 
 symbols = ["TCS.NS", "RELIANCE.NS", "INFY.NS", "HDFCBANK.NS", "SBIN.NS"]
-url = "http://127.0.0.1:8004/predict"
+url = "http://127.0.0.1:8004/predict/batch"
 
 print(f"--- Running Manual Scan (API: {url}) ---\n")
 
-for symbol in symbols:
-    try:
-        response = requests.post(url, json={"symbol": symbol})
-        if response.status_code == 200:
-            data = response.json()
+# One request scores every symbol (POST /predict/batch)
+try:
+    response = requests.post(url, json={"symbols": symbols})
+    if response.status_code == 200:
+        data = response.json()
+        for pred in data['predictions']:
             # Format nicely
-            prob = data['probability'] * 100
-            signal = "🟢 BUY" if data['prediction'] == 'Buy' else "🔴 SELL"
-            
-            print(f"{symbol}: {signal} (Prob: {prob:.1f}%)")
-            print(f"  RSI: {data['rsi']:.1f}, Sentiment: {data['sentiment']:.2f}")
-            print(f"  Note: {data['note']}\n")
-        else:
-            print(f"{symbol}: Error {response.status_code} - {response.text}")
-    except Exception as e:
-        print(f"{symbol}: Failed - {str(e)}")
+            prob = pred['probability'] * 100
+            signal = "🟢 BUY" if pred['prediction'] == 'Buy' else "🔴 SELL"
+
+            print(f"{pred['symbol']}: {signal} (Prob: {prob:.1f}%)")
+            print(f"  RSI: {pred['rsi']:.1f}, Sentiment: {pred['sentiment']:.2f}\n")
+        for symbol in data['missing']:
+            print(f"{symbol}: No feature data in store")
+        print(f"Model version: {data['model_version']}")
+    else:
+        print(f"Error {response.status_code} - {response.text}")
+except Exception as e:
+    print(f"Scan failed - {str(e)}")
@@ -12,15 +12,15 @@ sys.path.append(os.getcwd())
 
 import pandas as pd
 import xgboost as xgb
-import glob
 import yaml
 import matplotlib
 matplotlib.use("Agg")  # Non-interactive backend for server environments
 import matplotlib.pyplot as plt
 from sqlalchemy import text
 from config.database import engine
+from model.prepare_dataset import get_features_as_of
+from model import registry
 from config.logger import get_logger
-from feature_engineering.feature_store import calculate_technicals
 
 logger = get_logger(__name__)
 
@@ -44,14 +44,8 @@ SLIPPAGE_PCT      = BT_CONFIG.get("slippage_pct", 0.001)     # 0.1% execution sl
 
 
 def load_latest_model() -> xgb.XGBClassifier:
-    files = glob.glob("model/artifacts/model_cls_*.json")
-    if not files:
-        raise FileNotFoundError("No trained model found in model/artifacts/")
-    latest = max(files, key=os.path.getctime)
-    logger.info(f"Loading model: {latest}")
-    model = xgb.XGBClassifier()
-    model.load_model(latest)
-    return model
+    """The deployed classifier (registry `current` version)."""
+    return registry.load_classifier()
 
 
 def calculate_trade_cost(price: float, shares: int, side: str) -> float:
@@ -75,22 +69,31 @@ def run_backtest_for_symbol(symbol: str, model: xgb.XGBClassifier, threshold: fl
     """
     logger.info(f"--- Backtesting {symbol} ---")
 
+    # Price series to trade on, plus point-in-time features for each of its dates
+    # (same as-of join build_dataset uses, so macro and sentiment inputs match training).
+    # Stock features must be from the trade date itself: a day without a
+    # features_daily row (dropped for NaN/inf, or a gap in the build) is not traded.
     query = text("""
-        SELECT f.*, p.close as price_close, p.date as trade_date
-        FROM features_daily f
-        JOIN stocks s ON f.stock_id = s.stock_id
-        JOIN prices p ON f.stock_id = p.stock_id AND f.date = p.date
+        SELECT p.date AS trade_date, p.close AS price_close
+        FROM prices p
+        JOIN stocks s ON p.stock_id = s.stock_id
         WHERE s.symbol = :symbol
-        ORDER BY f.date ASC
+        ORDER BY p.date ASC
     """)
 
     with engine.connect() as conn:
-        df = pd.read_sql(query, conn, params={"symbol": symbol})
+        prices = pd.read_sql(query, conn, params={"symbol": symbol})
+        features = (get_features_as_of([symbol], prices["trade_date"], conn, feature_tolerance_days=0)
+                    if not prices.empty else pd.DataFrame())
 
-    if df.empty:
+    if features.empty or features["feature_date"].isna().all():
         logger.warning(f"No feature data found for {symbol}. Skipping.")
         return {}
 
+    prices["trade_date"] = pd.to_datetime(prices["trade_date"])
+    df = prices.merge(features.drop(columns=["symbol"]), left_on="trade_date", right_on="date", how="inner")
+    df = df[df["feature_date"].notna()].reset_index(drop=True)
+
     booster = model.get_booster()
     model_features = booster.feature_names
 
@@ -0,0 +1,81 @@
+"""
+model/daily_signals.py
+
+Post-refresh scoring stage: after the nightly feature_store update, scores
+every active stock's latest feature row once with the deployed model and
+upserts the result into `daily_signals`, keyed by (stock_id, date,
+model_version). Until the next refresh every /predict for that stock is the
+same answer, so the API serves it from an in-memory snapshot of this table
+(api/feature_cache.py) and only scores live on a miss or a model change.
+
+Runs after update_feature_store (feature_store.py) and after each retrain.
+
+Usage:
+    python model/daily_signals.py
+"""
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import pandas as pd
+from sqlalchemy import text
+
+from config.database import engine, bulk_upsert
+from config.logger import get_logger
+from feature_engineering.feature_store import load_latest_features, model_frame
+from model import registry
+
+logger = get_logger(__name__)
+
+
+def ensure_signals_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS daily_signals (
+            stock_id INTEGER REFERENCES stocks(stock_id),
+            date DATE,                   -- feature_store date the signal was scored on
+            model_version VARCHAR(255),  -- model/registry.py version
+            predicted_class VARCHAR(10), -- "Buy" or "Sell"
+            probability FLOAT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (stock_id, date, model_version)
+        )
+    """))
+    # max(created_at) = signals version, polled by the API's feature cache
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_daily_signals_created_at ON daily_signals (created_at)"))
+
+
+def score_daily_signals(version: str = None) -> pd.DataFrame:
+    """Scores every active stock with a registered model (default: current); returns the written rows."""
+    try:
+        version = version or registry.current_version()
+        model = registry.load_classifier(version)
+    except FileNotFoundError as e:
+        logger.warning(f"{e} — no daily signals scored.")
+        return pd.DataFrame()
+
+    with engine.begin() as conn:
+        ensure_signals_table(conn)
+        latest = load_latest_features(conn, active_only=True)
+        if latest.empty:
+            logger.warning("No feature_store rows for active stocks — no daily signals scored.")
+            return pd.DataFrame()
+
+        # One vectorized call for the whole universe (class 1 = Buy, same threshold as model.predict)
+        probability = model.predict_proba(model_frame(latest, model.get_booster().feature_names))[:, 1]
+        signals = pd.DataFrame({
+            "stock_id": latest["stock_id"].astype(int),
+            "date": latest["date"],
+            "model_version": version,
+            "predicted_class": ["Buy" if p > 0.5 else "Sell" for p in probability],
+            "probability": probability.astype(float),
+        })
+        signals["created_at"] = conn.execute(text("SELECT LOCALTIMESTAMP")).scalar()
+        bulk_upsert(signals, "daily_signals", ["stock_id", "date", "model_version"], conn=conn)
+
+    logger.info(f"Scored {len(signals)} daily signals with model version {version} "
+                f"({(signals['predicted_class'] == 'Buy').sum()} Buy)")
+    return signals
+
+
+if __name__ == "__main__":
+    score_daily_signals()
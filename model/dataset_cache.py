@@ -0,0 +1,177 @@
+"""
+model/dataset_cache.py
+
+Content-addressed on-disk cache for build_dataset().
+
+The cache key is a fingerprint of everything the dataset is derived from:
+  - row count and max date of features_daily, prices, index_prices and news
+  - the sum of each table's row xmin (id of the transaction that last wrote
+    the row): it changes on every insert, update or delete, including
+    in-place rewrites that keep count and max date (FinBERT scores filled
+    into news, re-seen headlines re-scored, price/feature upserts inside
+    the warm-up window)
+  - the oid of features_daily (a full feature rebuild recreates the table)
+  - a hash of the config sections the dataset depends on (market, features)
+  - CACHE_VERSION, bumped whenever build_dataset's logic changes
+The fingerprint costs one query (a scan of each source table). A hit memory-maps the Parquet file
+instead of re-running the features x prices join, the index pivot and the
+sentiment aggregation.
+
+Entries are evicted least-recently-used first once the directory grows past
+model.dataset_cache.max_size_mb. The Parquet shards written for out-of-core
+training (prepare_dataset.write_dataset_shards) live next to them under the
+same key; only the current shard set is kept.
+
+Usage:
+    python model/dataset_cache.py --info     # list cached datasets
+    python model/dataset_cache.py --clear    # explicit invalidation
+"""
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import argparse
+import glob
+import hashlib
+import json
+import shutil
+import uuid
+
+import pandas as pd
+import yaml
+from sqlalchemy import text
+
+from config.database import engine
+from config.logger import get_logger
+
+logger = get_logger(__name__)
+
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+CACHE_CONFIG = config.get("model", {}).get("dataset_cache", {})
+CACHE_ENABLED = CACHE_CONFIG.get("enabled", True) and os.getenv("DATASET_CACHE", "1") != "0"
+CACHE_DIR = CACHE_CONFIG.get("dir", "model/cache")
+MAX_CACHE_BYTES = int(CACHE_CONFIG.get("max_size_mb", 2048)) * 1024 * 1024
+
+# Bump when build_dataset() changes what it produces from the same inputs
+CACHE_VERSION = 3
+
+SOURCE_TABLES = ["features_daily", "prices", "index_prices", "news"]
+
+
+def source_fingerprint(conn) -> dict:
+    """Row count, max date and xmin sum per source table, and features_daily's oid (one query)."""
+    existing = {
+        row[0] for row in conn.execute(
+            text("SELECT table_name FROM information_schema.tables WHERE table_name = ANY(:t)"),
+            {"t": SOURCE_TABLES},
+        )
+    }
+    parts = [
+        f"(SELECT json_build_array(COUNT(*), MAX(date)::text, SUM(xmin::text::bigint)) FROM {t}) AS {t}"
+        for t in SOURCE_TABLES if t in existing
+    ]
+    if "features_daily" in existing:
+        parts.append("'features_daily'::regclass::oid AS features_oid")
+    if not parts:
+        return {}
+    row = conn.execute(text("SELECT " + ", ".join(parts))).mappings().one()
+    return {k: v for k, v in row.items()}
+
+
+def dataset_key(fingerprint: dict) -> str:
+    dataset_config = {k: config.get(k) for k in ("market", "features")}
+    payload = json.dumps(
+        {"version": CACHE_VERSION, "sources": fingerprint, "config": dataset_config},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:20]
+
+
+def cache_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"dataset_{key}.parquet")
+
+
+def shard_dir(key: str) -> str:
+    """Directory of the Parquet shards written for out-of-core training."""
+    return os.path.join(CACHE_DIR, f"shards_{key}")
+
+
+def remove_stale_shards(keep: str = None):
+    """Deletes every shard directory except `keep` (only the current set is kept)."""
+    for path in glob.glob(os.path.join(CACHE_DIR, "shards_*")):
+        if os.path.isdir(path) and path != keep:
+            shutil.rmtree(path)
+            logger.info(f"Removed stale dataset shards {os.path.basename(path)}.")
+
+
+def cached_files() -> list:
+    """Cached datasets, most recently used first."""
+    return sorted(glob.glob(os.path.join(CACHE_DIR, "dataset_*.parquet")),
+                  key=os.path.getmtime, reverse=True)
+
+
+def invalidate():
+    """Deletes every cached dataset and shard directory."""
+    files = cached_files()
+    for path in files:
+        os.remove(path)
+    remove_stale_shards()
+    logger.info(f"Dataset cache cleared ({len(files)} files).")
+
+
+def evict(max_bytes: int = MAX_CACHE_BYTES, keep: str = None):
+    """Removes least-recently-used entries until the cache fits in max_bytes."""
+    total = 0
+    for path in cached_files():
+        size = os.path.getsize(path)
+        if total + size > max_bytes and path != keep:
+            os.remove(path)
+            logger.info(f"Evicted cached dataset {os.path.basename(path)} ({size / 1e6:.1f} MB).")
+        else:
+            total += size
+
+
+def get_or_build(build_fn, refresh: bool = False) -> pd.DataFrame:
+    """
+    Returns the cached dataset for the current source fingerprint, or runs
+    build_fn() and caches its result. refresh=True forces a rebuild.
+    """
+    if not CACHE_ENABLED:
+        return build_fn()
+
+    with engine.connect() as conn:
+        key = dataset_key(source_fingerprint(conn))
+    path = cache_path(key)
+
+    if os.path.exists(path) and not refresh:
+        os.utime(path)  # mark as recently used for LRU eviction
+        logger.info(f"Dataset cache hit: {os.path.basename(path)}")
+        return pd.read_parquet(path, memory_map=True)
+
+    logger.info(f"Dataset cache miss ({key}) — building dataset...")
+    df = build_fn()
+
+    # Write to a temp name and rename, so concurrent readers never see a partial file
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    evict(keep=path)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clear the build_dataset() cache.")
+    parser.add_argument("--clear", action="store_true", help="Delete all cached datasets.")
+    parser.add_argument("--info", action="store_true", help="List cached datasets (most recent first).")
+    args = parser.parse_args()
+
+    if args.clear:
+        invalidate()
+    if args.info or not args.clear:
+        for path in cached_files():
+            print(f"{os.path.basename(path)}  {os.path.getsize(path) / 1e6:8.1f} MB")
+        with engine.connect() as conn:
+            print("Current key:", dataset_key(source_fingerprint(conn)))
@@ -0,0 +1,269 @@
+"""
+model/dmatrix_cache.py
+
+Sketch-once-per-window dataset layer shared by training, tuning and walk-forward.
+
+The feature matrix is laid out once as a C-contiguous float32 array (rows in
+dataset order). Splits are contiguous row ranges:
+  - X[start:stop] / y[start:stop] are NumPy views, never copied DataFrames
+  - dmatrix(start, stop) sketches a training range into a QuantileDMatrix:
+    its histogram cut points (max_bin per feature, label-free) come from
+    those rows only, so no later (test) row shapes the bins
+  - dmatrix(start, stop, ref=(a, b)) bins an evaluation range against the
+    cut points of training range [a, b) (no new quantile sketch)
+  - both are cached, so the 50 trials of a tuning run reuse one train and
+    one validation matrix per fold
+
+Boosters are trained with the native API (xgb.train); sklearn-style params
+(n_estimators, random_state, n_jobs) are translated by booster_params().
+Saved boosters load unchanged with XGBClassifier.load_model().
+
+ShardedDataset offers the same interface (split, labels, dmatrix, predict)
+over on-disk Parquet shards for out-of-core training: XGBoost reads them
+through a DataIter into an external-memory ExtMemQuantileDMatrix.
+
+Usage:
+    data = QuantizedDataset(df, feature_cols)
+    train, test = data.split(test_size=0.2)               # (start, stop) ranges
+    booster = fit_booster(PARAMS, data.dmatrix(*train))
+    probs = booster.predict(data.dmatrix(*test, ref=train))
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+import yaml
+
+from config.logger import get_logger
+
+logger = get_logger(__name__)
+
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+MODEL_CONFIG = config.get("model", {})
+TARGET_COL = MODEL_CONFIG.get("target", "target_class")
+MAX_BIN = MODEL_CONFIG.get("max_bin", 256)
+
+# sklearn wrapper names -> native parameter names
+_NATIVE_NAMES = {"random_state": "seed", "n_jobs": "nthread"}
+
+
+class QuantizedDataset:
+    """Float32 feature matrix + labels, with cached range DMatrices quantized per training range."""
+
+    def __init__(self, df: pd.DataFrame, feature_cols, target_col: str = TARGET_COL, max_bin: int = MAX_BIN):
+        self.feature_cols = list(feature_cols)
+        self.X = np.ascontiguousarray(df[self.feature_cols].to_numpy(dtype=np.float32))
+        self.y = df[target_col].to_numpy(dtype=np.float32)
+        self.max_bin = max_bin
+        self._cache = {}
+
+    def save(self, path: str):
+        """Writes X.npy, y.npy and meta.json to `path` (for memory-mapped reads in other processes)."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "X.npy"), self.X)
+        np.save(os.path.join(path, "y.npy"), self.y)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"feature_cols": self.feature_cols, "max_bin": self.max_bin}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "QuantizedDataset":
+        """Opens a saved dataset; with mmap=True the arrays are read-only views of the files."""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        data = cls.__new__(cls)
+        mode = "r" if mmap else None
+        data.X = np.load(os.path.join(path, "X.npy"), mmap_mode=mode)
+        data.y = np.load(os.path.join(path, "y.npy"), mmap_mode=mode)
+        data.feature_cols = meta["feature_cols"]
+        data.max_bin = meta["max_bin"]
+        data._cache = {}
+        return data
+
+    def __len__(self):
+        return len(self.X)
+
+    def rows(self, start: int, stop: int):
+        """(X, y) views of a contiguous row range."""
+        return self.X[start:stop], self.y[start:stop]
+
+    def dmatrix(self, start: int, stop: int, ref: tuple = None) -> xgb.QuantileDMatrix:
+        """
+        Binned matrix of rows [start, stop), built once per range. Without ref
+        the rows are sketched into their own cut points (a training matrix);
+        with ref=(a, b) they are binned against the cut points of training
+        range [a, b), as the booster trained on dmatrix(a, b) expects.
+        """
+        if ref is not None and tuple(ref) != (start, stop):
+            key = (int(start), int(stop), int(ref[0]), int(ref[1]))
+            if key not in self._cache:
+                X, y = self.rows(start, stop)
+                self._cache[key] = xgb.QuantileDMatrix(
+                    X, y, ref=self.dmatrix(*ref), feature_names=self.feature_cols, max_bin=self.max_bin)
+            return self._cache[key]
+        key = (int(start), int(stop))
+        if key not in self._cache:
+            X, y = self.rows(start, stop)
+            self._cache[key] = xgb.QuantileDMatrix(X, y, feature_names=self.feature_cols, max_bin=self.max_bin)
+        return self._cache[key]
+
+    def take_dmatrix(self, rows: np.ndarray) -> xgb.QuantileDMatrix:
+        """Training matrix of arbitrary row indices (e.g. a date mask), sketched from those rows. Not cached."""
+        return xgb.QuantileDMatrix(self.X[rows], self.y[rows], feature_names=self.feature_cols,
+                                   max_bin=self.max_bin)
+
+    def eval_dmatrix(self, start: int, stop: int) -> xgb.DMatrix:
+        """
+        Plain DMatrix of rows [start, stop) for xgb.train(evals=...), built once
+        per range. xgb.train only accepts a QuantileDMatrix eval set whose ref
+        is the training matrix itself; a plain DMatrix is binned with the
+        booster's cut points instead, so it also scores warm-started
+        boosters whose trees come from several training matrices.
+        """
+        key = ("eval", int(start), int(stop))
+        if key not in self._cache:
+            X, y = self.rows(start, stop)
+            self._cache[key] = xgb.DMatrix(X, y, feature_names=self.feature_cols)
+        return self._cache[key]
+
+    def split(self, test_size: float = 0.2):
+        """
+        Row-order split (as train_test_split(shuffle=False)): ((0, n), (n, len)).
+        It is a time split only if the rows are date-sorted; build_dataset()
+        returns (stock_id, date) order, so callers sort by date first.
+        """
+        return _split(len(self), test_size)
+
+    def labels(self, start: int, stop: int) -> np.ndarray:
+        return self.y[start:stop]
+
+    def scale_pos_weight(self, start: int, stop: int) -> float:
+        """count(class 0) / count(class 1) over a row range."""
+        return _scale_pos_weight(self.labels(start, stop))
+
+    def predict(self, booster: xgb.Booster, start: int, stop: int, ref: tuple = None) -> np.ndarray:
+        """Scores rows [start, stop): binned with ref's cut points, or a plain DMatrix without ref."""
+        if ref is None:
+            return booster.predict(self.eval_dmatrix(start, stop))
+        return booster.predict(self.dmatrix(start, stop, ref=ref))
+
+
+class ShardedDataset:
+    """
+    Out-of-core counterpart of QuantizedDataset over the Parquet shards of
+    prepare_dataset.write_dataset_shards(). Shards are read one at a time:
+    dmatrix() feeds XGBoost through a DataIter into an ExtMemQuantileDMatrix
+    (binned pages cached on disk) and predict() scores shard by shard, so
+    peak memory follows the shard size, not the dataset size.
+    """
+
+    def __init__(self, shard_dir: str, feature_cols, target_col: str = TARGET_COL, max_bin: int = MAX_BIN):
+        self.shard_dir = shard_dir
+        self.shards = read_manifest(shard_dir)["shards"]
+        self.feature_cols = list(feature_cols)
+        self.target_col = target_col
+        self.max_bin = max_bin
+        self.offsets = np.concatenate(([0], np.cumsum([s["rows"] for s in self.shards]))).astype(np.int64)
+        self.cache_dir = os.path.join(shard_dir, "xgb_cache")
+        self._cache = {}
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def split(self, test_size: float = 0.2):
+        """Same row-order split as QuantizedDataset.split; shards are in (stock_id, date) order, so not by date."""
+        return _split(len(self), test_size)
+
+    def iter_rows(self, start: int, stop: int, features: bool = True):
+        """(X, y) of rows [start, stop), one shard at a time (X is None if not features)."""
+        columns = ([] if not features else self.feature_cols) + [self.target_col]
+        for k, shard in enumerate(self.shards):
+            a, b = self.offsets[k], self.offsets[k + 1]
+            if b <= start or a >= stop:
+                continue
+            part = pd.read_parquet(os.path.join(self.shard_dir, shard["file"]), columns=columns)
+            part = part.iloc[max(start - a, 0):min(stop, b) - a]
+            X = part[self.feature_cols].to_numpy(dtype=np.float32) if features else None
+            yield X, part[self.target_col].to_numpy(dtype=np.float32)
+
+    def labels(self, start: int, stop: int) -> np.ndarray:
+        return np.concatenate([y for _, y in self.iter_rows(start, stop, features=False)])
+
+    def scale_pos_weight(self, start: int, stop: int) -> float:
+        return _scale_pos_weight(self.labels(start, stop))
+
+    def dmatrix(self, start: int, stop: int) -> xgb.DMatrix:
+        """External-memory binned matrix of rows [start, stop), built once per range."""
+        key = (int(start), int(stop))
+        if key not in self._cache:
+            prefix = os.path.join(self.cache_dir, f"rows_{start}_{stop}")
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._cache[key] = xgb.ExtMemQuantileDMatrix(
+                _ShardIter(self, start, stop, prefix), max_bin=self.max_bin)
+        return self._cache[key]
+
+    def predict(self, booster: xgb.Booster, start: int, stop: int, ref: tuple = None) -> np.ndarray:
+        """Scores raw rows shard by shard (ref is accepted for QuantizedDataset parity)."""
+        return np.concatenate([booster.inplace_predict(X) for X, _ in self.iter_rows(start, stop)])
+
+    def close(self):
+        """Frees the external-memory matrices and their on-disk page cache."""
+        self._cache.clear()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def read_manifest(shard_dir: str) -> dict:
+    """{"rows", "columns", "shards": [{"file", "rows"}]} written by prepare_dataset.write_shards."""
+    with open(os.path.join(shard_dir, "manifest.json")) as f:
+        return json.load(f)
+
+
+class _ShardIter(xgb.DataIter):
+    """Feeds rows [start, stop) of a ShardedDataset to XGBoost one shard at a time."""
+
+    def __init__(self, dataset: ShardedDataset, start: int, stop: int, cache_prefix: str):
+        self.dataset, self.start, self.stop = dataset, start, stop
+        self._it = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data) -> bool:
+        if self._it is None:
+            self._it = self.dataset.iter_rows(self.start, self.stop)
+        batch = next(self._it, None)
+        if batch is None:
+            return False
+        input_data(data=batch[0], label=batch[1], feature_names=self.dataset.feature_cols)
+        return True
+
+    def reset(self):
+        self._it = None
+
+
+def _split(n_rows: int, test_size: float):
+    n_test = int(np.ceil(n_rows * test_size))
+    n_train = n_rows - n_test
+    return (0, n_train), (n_train, n_rows)
+
+
+def _scale_pos_weight(y: np.ndarray) -> float:
+    pos = int((y == 1).sum())
+    return float((y == 0).sum()) / pos if pos > 0 else 1.0
+
+
+def booster_params(params: dict) -> tuple:
+    """sklearn-style params -> (native params, num_boost_round)."""
+    native = {_NATIVE_NAMES.get(k, k): v for k, v in params.items() if v is not None}
+    num_boost_round = int(native.pop("n_estimators", 100))
+    if native.get("nthread") == -1:
+        native.pop("nthread")
+    return native, num_boost_round
+
+
+def fit_booster(params: dict, dtrain, **kwargs) -> xgb.Booster:
+    """xgb.train with sklearn-style params (as used in config/best_params.yaml)."""
+    native, num_boost_round = booster_params(params)
+    return xgb.train(native, dtrain, num_boost_round=num_boost_round, **kwargs)
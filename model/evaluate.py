@@ -10,12 +10,11 @@ import os
 sys.path.append(os.getcwd())
 
 import json
-import glob
 import numpy as np
-import pandas as pd
 import xgboost as xgb
 
 from model.prepare_dataset import build_dataset
+from model import registry
 from config.logger import get_logger
 
 logger = get_logger(__name__)
@@ -26,18 +25,8 @@ TRADING_DAYS     = 252
 
 
 def load_latest_classifier() -> xgb.XGBClassifier:
-    """Load the most recently trained XGBoost classifier."""
-    files = glob.glob("model/artifacts/model_cls_*.json")
-    if not files:
-        raise FileNotFoundError(
-            "No classifier model found in model/artifacts/. "
-            "Run model/train_model.py first."
-        )
-    latest = max(files, key=os.path.getctime)
-    logger.info(f"Loading classifier: {latest}")
-    model = xgb.XGBClassifier()
-    model.load_model(latest)
-    return model
+    """Load the deployed XGBoost classifier (registry `current` version)."""
+    return registry.load_classifier()
 
 
 def evaluate():
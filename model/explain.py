@@ -2,16 +2,12 @@ import xgboost as xgb
 import shap
 import pandas as pd
 import matplotlib.pyplot as plt
-import os
-import glob
 from model.prepare_dataset import build_dataset
+from model import registry
 
 def get_latest_model():
-    # Find latest model file
-    files = glob.glob("model/artifacts/model_cls_*.json")
-    if not files:
-        raise FileNotFoundError("No model file found in model/artifacts/")
-    latest_model = max(files, key=os.path.getctime)
+    # Deployed model file (registry `current` version, checksum-verified)
+    latest_model = registry.artifact_path()
     print(f"Loading model: {latest_model}")
     return latest_model
 
@@ -1,8 +1,18 @@
+import os
+import json
+import shutil
+import uuid
+
 import pandas as pd
 import yaml
 from sqlalchemy import text
 from config.database import engine
 from config.logger import get_logger
+from feature_engineering.macro import load_macro_features, LOOKBACK_DAYS
+from feature_engineering.asof import align_to_calendar, load_daily_sentiment
+from feature_engineering.build_features import stock_aligned_chunks
+from model import dataset_cache
+from model.dtype_policy import apply_dtype_policy, memory_mb
 
 logger = get_logger(__name__)
 
@@ -14,84 +24,69 @@ with open("config/config.yaml", "r") as f:
 MARKET_CONFIG = config.get("market", {})
 # Default to 5 days if not set
 TARGET_HORIZON = MARKET_CONFIG.get("prediction_horizon_days", 5) 
-# --------------------------------------
 
+# Out-of-core training: rows per Parquet shard written by write_dataset_shards()
+SHARD_ROWS = config.get("model", {}).get("dataset_shards", {}).get("rows_per_shard", 250000)
+# --------------------------------------
 
-def build_dataset():
-    # 1. Fetch ALL Stock Features dynamically (no hardcoded columns)
-    # This ensures any new features added in build_features.py flow into training automatically
-    stock_query = """
+# features_daily x prices (today's close, for the target); {order} is the ORDER BY
+STOCK_QUERY = """
     SELECT 
         f.*,
         p.close AS stock_close_today
     FROM features_daily f
     JOIN prices p ON f.stock_id = p.stock_id AND f.date = p.date
-    ORDER BY f.date, f.stock_id
+    ORDER BY {order}
+"""
+
+
+def build_dataset(use_cache: bool = True, refresh: bool = False):
     """
-    df = pd.read_sql(text(stock_query), engine)
-    
-    # Drop raw price columns that are not features (keep only engineered ones)
-    drop_raw = [c for c in ['open', 'volume', 'close'] if c in df.columns]
-    df = df.drop(columns=drop_raw)
-    
-    # 2. Fetch Index Data (Pivot it)
-    index_query = """
-    SELECT i.symbol, ip.date, ip.close
-    FROM index_prices ip
-    JOIN indices i ON ip.index_id = i.index_id
-    ORDER BY ip.date
+    Training dataset: features_daily + macro returns + daily sentiment + target,
+    in the compact dtypes of model/dtype_policy.py (float32 features, int16
+    stock_id, int8 target, int32 day-number dates).
+    Served from the on-disk cache (model/dataset_cache.py) when the source
+    tables and config are unchanged; refresh=True rebuilds and re-caches.
     """
-    df_idx = pd.read_sql(text(index_query), engine)
+    if use_cache:
+        df = dataset_cache.get_or_build(compute_compact_dataset, refresh=refresh)
+    else:
+        df = compute_compact_dataset()
+    logger.info(f"Dataset loaded: {len(df)} rows, {memory_mb(df):.1f} MB")
+    return df
+
+
+def compute_compact_dataset():
+    return apply_dtype_policy(compute_dataset())
+
+
+def compute_dataset():
+    # 1. Fetch ALL Stock Features dynamically (no hardcoded columns)
+    # This ensures any new features added in build_features.py flow into training automatically
+    df = pd.read_sql(text(STOCK_QUERY.format(order="f.date, f.stock_id")), engine)
+    
+    # 2. Macro features: index returns + benchmark close, one query (shared with the feature store)
+    df_macro_final = load_macro_features()
     
-    if df_idx.empty:
+    if df_macro_final.empty:
         logger.warning("No index data found in DB — macro features will be zeros. "
                        "Run data_ingestion/load_index.py to fix this.")
-        df_macro = pd.DataFrame()  # Empty
 
-    else:
-        # Pivot: date | CL=F | GC=F | INR=X | ^NSEBANK | ^NSEI
-        df_macro = df_idx.pivot(index='date', columns='symbol', values='close')
-        
-        # Calculate Returns for features (past info) -> pct_change(1)
-        df_macro_ret = df_macro.pct_change()
-        df_macro_ret = df_macro_ret.add_suffix('_ret')
-        
-        # We also need the Nifty 50 Future Close for the TARGET calculation
-        df_macro_raw = df_macro[['^NSEI']].copy()
-        df_macro_raw = df_macro_raw.rename(columns={'^NSEI': 'index_close_today'})
-        
-        # Merge returns and raw price
-        df_macro_final = pd.concat([df_macro_ret, df_macro_raw], axis=1)
-        df_macro_final = df_macro_final.reset_index()
-        
-        # Ensure date is datetime
-        df_macro_final['date'] = pd.to_datetime(df_macro_final['date'])
-        df['date'] = pd.to_datetime(df['date'])
-
-        # 3. Merge Macro Features
-        df = pd.merge(df, df_macro_final, on='date', how='left')
-        
-        # Forward fill macro data
-        df = df.ffill()
-        df = df.fillna(0)
-
-    # 3.5 Merge Sentiment Data
-    sentiment_query = """
-    SELECT date, AVG(sentiment_score) as daily_sentiment
-    FROM news
-    WHERE sentiment_score IS NOT NULL
-    GROUP BY date
-    ORDER BY date
+    return finish_dataset(df, df_macro_final, load_daily_sentiment())
+
+
+def finish_dataset(df, df_macro_final, df_sent):
     """
-    df_sent = pd.read_sql(text(sentiment_query), engine)
-    
-    if not df_sent.empty:
-        df_sent['date'] = pd.to_datetime(df_sent['date'])
-        df = pd.merge(df, df_sent, on='date', how='left')
-        # Fill missing sentiment with 0 (Neutral)
-        df['daily_sentiment'] = df['daily_sentiment'].fillna(0)
-    else:
-        df['daily_sentiment'] = 0
+    Steps 3-8 of compute_dataset for a frame holding complete stocks:
+    as-of macro/sentiment join, target calculation and cleanup.
+    """
+    # Drop raw price columns that are not features (keep only engineered ones)
+    drop_raw = [c for c in ['open', 'volume', 'close'] if c in df.columns]
+    df = df.drop(columns=drop_raw)
+
+    # 3. As-of join: macro returns and daily sentiment aligned to each trading date
+    # (latest value at or before the date; missing sentiment = 0, neutral)
+    df = align_to_calendar(df, df_macro_final, df_sent)
     
     # 4. Target Calculation (Alpha)
     # We need FUTURE Nifty 50 return
@@ -134,6 +129,118 @@ def build_dataset():
     return df.reset_index(drop=True)
 
 
+def get_features_as_of(symbols, dates, conn=None, lookback_days: int = LOOKBACK_DAYS,
+                       feature_tolerance_days: int = None) -> pd.DataFrame:
+    """
+    Point-in-time feature rows for every (symbol, date) pair: each stock's
+    latest features_daily row at or before the date (at most
+    feature_tolerance_days old, default lookback_days; 0 = same date only),
+    with macro returns and daily sentiment as of the date itself (looked up
+    over lookback_days). Feature columns match build_dataset();
+    `feature_date` is the date of the features_daily row used. Pairs with no
+    features in range get NaN features.
+    """
+    symbols = [s.replace(".NS", "").upper() for s in symbols]
+    dates = pd.to_datetime(pd.Series(list(dates))).astype("datetime64[ns]").drop_duplicates().sort_values()
+    since = dates.min() - pd.Timedelta(days=lookback_days)
+    if feature_tolerance_days is None:
+        feature_tolerance_days = lookback_days
+    features_since = dates.min() - pd.Timedelta(days=feature_tolerance_days)
+
+    if conn is None:
+        with engine.connect() as conn:
+            return get_features_as_of(symbols, dates, conn, lookback_days, feature_tolerance_days)
+
+    # One query: every requested stock's feature rows over the window
+    feats = pd.read_sql(text("""
+        SELECT s.symbol, f.*
+        FROM features_daily f
+        JOIN stocks s ON f.stock_id = s.stock_id
+        WHERE s.symbol = ANY(:symbols) AND f.date BETWEEN :since AND :until
+        ORDER BY f.date
+    """), conn, params={"symbols": symbols, "since": features_since.date(), "until": dates.max().date()})
+    feats = feats.drop(columns=[c for c in ['open', 'volume', 'close'] if c in feats.columns])
+    feats = feats.rename(columns={"date": "feature_date"})
+    feats["feature_date"] = pd.to_datetime(feats["feature_date"]).astype("datetime64[ns]")
+    feats["symbol"] = feats["symbol"].astype(str)
+
+    # As-of join on sorted keys: latest feature row <= date, per symbol
+    requests = pd.MultiIndex.from_product([symbols, dates], names=["symbol", "date"]).to_frame(index=False)
+    requests["symbol"] = requests["symbol"].astype(str)
+    out = pd.merge_asof(
+        requests.sort_values("date"), feats.sort_values("feature_date"),
+        left_on="date", right_on="feature_date", by="symbol",
+        direction="backward", tolerance=pd.Timedelta(days=feature_tolerance_days),
+    )
+
+    macro = load_macro_features(conn, since)
+    out = align_to_calendar(out, macro, load_daily_sentiment(conn, since))
+    out = out.drop(columns=[c for c in ["index_close_today"] if c in out.columns])
+    return out.sort_values(["symbol", "date"]).reset_index(drop=True)
+
+
+# ----------------------------------------------------------
+# Out-of-core: the dataset as on-disk Parquet shards
+# ----------------------------------------------------------
+def iter_dataset_chunks(chunk_rows: int = SHARD_ROWS):
+    """
+    The compact dataset as stock-aligned chunks of about `chunk_rows` rows,
+    streamed through a server-side cursor. Concatenated, the chunks equal
+    build_dataset() (same rows, columns, dtypes and stock_id, date order).
+    """
+    df_macro_final = load_macro_features()
+    df_sent = load_daily_sentiment()
+    query = text(STOCK_QUERY.format(order="f.stock_id, f.date"))
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunk_rows) as conn:
+        for chunk in stock_aligned_chunks(pd.read_sql(query, conn, chunksize=chunk_rows)):
+            yield apply_dtype_policy(finish_dataset(chunk, df_macro_final, df_sent))
+
+
+def write_shards(chunks, out_dir: str) -> dict:
+    """
+    Writes DataFrame chunks as out_dir/part-NNNNN.parquet plus a manifest.json
+    (rows, columns, per-shard row counts). The directory is written under a
+    temp name and renamed, so readers never see a partial shard set.
+    """
+    tmp = f"{out_dir}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(tmp)
+    shards, columns = [], []
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        name = f"part-{len(shards):05d}.parquet"
+        chunk.to_parquet(os.path.join(tmp, name), index=False)
+        shards.append({"file": name, "rows": len(chunk)})
+        columns = list(chunk.columns)
+    manifest = {"rows": sum(s["rows"] for s in shards), "columns": columns, "shards": shards}
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp, out_dir)
+    return manifest
+
+
+def write_dataset_shards(refresh: bool = False, chunk_rows: int = SHARD_ROWS) -> str:
+    """
+    Writes the dataset as Parquet shards for out-of-core training and returns
+    the shard directory. Keyed by the same source fingerprint as the
+    build_dataset() cache, so unchanged sources reuse the existing shards.
+    """
+    with engine.connect() as conn:
+        key = dataset_cache.dataset_key(dataset_cache.source_fingerprint(conn))
+    out_dir = dataset_cache.shard_dir(key)
+    if os.path.exists(os.path.join(out_dir, "manifest.json")) and not refresh:
+        logger.info(f"Dataset shards up to date: {out_dir}")
+        return out_dir
+
+    logger.info(f"Writing dataset shards ({chunk_rows} rows each) to {out_dir}...")
+    manifest = write_shards(iter_dataset_chunks(chunk_rows), out_dir)
+    dataset_cache.remove_stale_shards(keep=out_dir)
+    logger.info(f"Wrote {len(manifest['shards'])} shards, {manifest['rows']} rows.")
+    return out_dir
+
+
 if __name__ == "__main__":
     df = build_dataset()
     print(df.head())
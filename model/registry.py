@@ -0,0 +1,229 @@
+"""
+model/registry.py
+
+Versioned model registry: the single place classifiers are saved and loaded.
+
+  model/artifacts/registry/
+    current                     {"version": ...} — the deployed model
+    <version>/model.ubj         booster (binary UBJSON: smaller, faster to load than JSON)
+    <version>/manifest.json     version, created_at, features, train_cutoff,
+                                train_mode, n_trees, params, metrics, sha256
+
+Versions are timestamps (YYYYmmdd_HHMMSS_ffffff), so they sort by age.
+register() writes a version directory and (unless activate=False) promotes
+it; promote() swaps the `current` pointer with os.replace, so readers see
+either the old or the new model, never a partial write. Loading reads one
+pointer and one manifest instead of globbing the artifacts directory, and
+verifies the artifact's checksum. gc() keeps the current version plus the
+newest `keep_versions` others.
+
+Artifacts from before the registry (model_cls_*.json + metrics_cls_*.json)
+are imported once, the newest becoming current, the first time the
+registry is read while empty.
+
+Usage:
+    from model import registry
+    version = registry.register(booster, metrics, params, train_cutoff="2024-09-23")
+    model = registry.load_classifier()            # XGBClassifier of the current version
+    manifest = registry.load_manifest()           # its metadata
+"""
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import xgboost as xgb
+import yaml
+
+from config.logger import get_logger
+
+logger = get_logger(__name__)
+
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+MODEL_CONFIG = config.get("model", {})
+REGISTRY_CONFIG = MODEL_CONFIG.get("registry", {})
+ARTIFACTS_DIR = MODEL_CONFIG.get("model_path", "model/artifacts/").rstrip("/")
+REGISTRY_DIR = REGISTRY_CONFIG.get("dir", os.path.join(ARTIFACTS_DIR, "registry"))
+KEEP_VERSIONS = REGISTRY_CONFIG.get("keep_versions", 5)
+
+ARTIFACT_NAME = "model.ubj"
+MANIFEST_NAME = "manifest.json"
+CURRENT_NAME = "current"
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(path: str, payload: dict):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp, path)
+
+
+def list_versions(registry_dir: str = None) -> list:
+    """Registered versions, oldest first."""
+    registry_dir = registry_dir or REGISTRY_DIR
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(v for v in os.listdir(registry_dir)
+                  if os.path.isfile(os.path.join(registry_dir, v, MANIFEST_NAME)))
+
+
+def register(booster: xgb.Booster, metrics: dict, params: dict, train_cutoff: str = None,
+             train_mode: str = "full", updates_since_full: int = 0, activate: bool = True,
+             registry_dir: str = None, created_at: datetime = None) -> str:
+    """Saves a booster as a new version (UBJSON + manifest) and, if activate, makes it current."""
+    registry_dir = registry_dir or REGISTRY_DIR
+    os.makedirs(registry_dir, exist_ok=True)
+    created_at = created_at or datetime.now()
+    version = created_at.strftime("%Y%m%d_%H%M%S_%f")
+
+    # Metadata travels with the booster too (update mode reads it back from the artifact)
+    booster.set_attr(train_cutoff=train_cutoff, train_mode=train_mode,
+                     updates_since_full=str(updates_since_full))
+
+    # Build the version in a temp dir and rename it into place
+    staging = tempfile.mkdtemp(dir=registry_dir, prefix=".staging_")
+    try:
+        artifact = os.path.join(staging, ARTIFACT_NAME)
+        booster.save_model(artifact)
+        manifest = {
+            "version": version,
+            "created_at": created_at.isoformat(timespec="seconds"),
+            "artifact": ARTIFACT_NAME,
+            "sha256": _sha256(artifact),
+            "features": booster.feature_names,
+            "train_cutoff": train_cutoff,
+            "train_mode": train_mode,
+            "updates_since_full": updates_since_full,
+            "n_trees": booster.num_boosted_rounds(),
+            "params": params,
+            "metrics": metrics,
+        }
+        with open(os.path.join(staging, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=2, default=str)
+        os.replace(staging, os.path.join(registry_dir, version))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    logger.info(f"Registered model version {version} ({manifest['n_trees']} trees, cutoff {train_cutoff})")
+    if activate:
+        promote(version, registry_dir)
+    return version
+
+
+def promote(version: str, registry_dir: str = None):
+    """Atomically points `current` at a registered version."""
+    registry_dir = registry_dir or REGISTRY_DIR
+    if version not in list_versions(registry_dir):
+        raise ValueError(f"Unknown model version: {version}")
+    _write_json_atomic(os.path.join(registry_dir, CURRENT_NAME), {"version": version})
+    logger.info(f"Current model version -> {version}")
+
+
+def current_version(registry_dir: str = None):
+    """The deployed version, or None if nothing is registered."""
+    registry_dir = registry_dir or REGISTRY_DIR
+    pointer = os.path.join(registry_dir, CURRENT_NAME)
+    if not os.path.exists(pointer) and not list_versions(registry_dir):
+        import_legacy(registry_dir)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer, "r") as f:
+        return json.load(f)["version"]
+
+
+def _resolve(version: str, registry_dir: str) -> str:
+    version = version or current_version(registry_dir)
+    if version is None:
+        raise FileNotFoundError(
+            f"No model registered in {registry_dir}. Run model/train_model.py first.")
+    return version
+
+
+def load_manifest(version: str = None, registry_dir: str = None) -> dict:
+    """Manifest of a version (default: current)."""
+    registry_dir = registry_dir or REGISTRY_DIR
+    version = _resolve(version, registry_dir)
+    with open(os.path.join(registry_dir, version, MANIFEST_NAME), "r") as f:
+        return json.load(f)
+
+
+def artifact_path(version: str = None, registry_dir: str = None, verify: bool = True) -> str:
+    """Path of a version's booster file (default: current), checksum-verified."""
+    registry_dir = registry_dir or REGISTRY_DIR
+    manifest = load_manifest(version, registry_dir)
+    path = os.path.join(registry_dir, manifest["version"], manifest["artifact"])
+    if verify and _sha256(path) != manifest["sha256"]:
+        raise ValueError(f"Checksum mismatch for model version {manifest['version']} ({path})")
+    return path
+
+
+def load_booster(version: str = None, registry_dir: str = None) -> xgb.Booster:
+    return xgb.Booster(model_file=artifact_path(version, registry_dir))
+
+
+def load_classifier(version: str = None, registry_dir: str = None) -> xgb.XGBClassifier:
+    """XGBClassifier of a version (default: current)."""
+    path = artifact_path(version, registry_dir)
+    logger.info(f"Loading model: {path}")
+    model = xgb.XGBClassifier()
+    model.load_model(path)
+    return model
+
+
+def gc(keep: int = None, registry_dir: str = None) -> list:
+    """Deletes all but the current version and the newest `keep` others; returns the removed versions."""
+    registry_dir = registry_dir or REGISTRY_DIR
+    keep = KEEP_VERSIONS if keep is None else keep
+    current = current_version(registry_dir)
+    others = [v for v in list_versions(registry_dir) if v != current]
+    removed = others[:max(len(others) - keep, 0)]
+    for version in removed:
+        shutil.rmtree(os.path.join(registry_dir, version), ignore_errors=True)
+    for staging in glob.glob(os.path.join(registry_dir, ".staging_*")):
+        shutil.rmtree(staging, ignore_errors=True)
+    if removed:
+        logger.info(f"Registry GC: removed {len(removed)} version(s), kept {current} + {len(others) - len(removed)}")
+    return removed
+
+
+def import_legacy(registry_dir: str = None, artifacts_dir: str = None):
+    """Registers pre-registry model_cls_*.json artifacts (newest becomes current)."""
+    registry_dir = registry_dir or REGISTRY_DIR
+    artifacts_dir = artifacts_dir or ARTIFACTS_DIR
+    files = sorted(glob.glob(os.path.join(artifacts_dir, "model_cls_*.json")))  # timestamped names sort by age
+    if not files:
+        return None
+    version = None
+    for path in files:
+        stamp = os.path.basename(path)[len("model_cls_"):-len(".json")]
+        metrics_path = os.path.join(artifacts_dir, f"metrics_cls_{stamp}.json")
+        metrics = {}
+        if os.path.exists(metrics_path):
+            with open(metrics_path, "r") as f:
+                metrics = json.load(f)
+        booster = xgb.Booster(model_file=path)
+        try:
+            created_at = datetime.strptime(stamp, "%Y%m%d_%H%M%S")
+        except ValueError:
+            created_at = datetime.fromtimestamp(os.path.getmtime(path))
+        version = register(booster, metrics, params={}, train_cutoff=booster.attr("train_cutoff"),
+                           train_mode=booster.attr("train_mode") or "full",
+                           updates_since_full=int(booster.attr("updates_since_full") or 0),
+                           activate=False, registry_dir=registry_dir, created_at=created_at)
+    logger.info(f"Imported {len(files)} legacy model artifact(s) into the registry")
+    promote(version, registry_dir)
+    return version
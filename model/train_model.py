@@ -1,16 +1,16 @@
 import sys
 import os
 sys.path.append(os.getcwd())
+import argparse
 import xgboost as xgb
+import numpy as np
 import pandas as pd
-import json
 import yaml
-import os
-import joblib
-from datetime import datetime
-from sklearn.model_selection import train_test_split
-from model.prepare_dataset import build_dataset
+from model.prepare_dataset import build_dataset, write_dataset_shards
+from model.dmatrix_cache import QuantizedDataset, ShardedDataset, fit_booster, read_manifest
+from model.dtype_policy import from_day_numbers, to_day_numbers
 from model.metrics import get_classification_metrics
+from model import registry
 from config.logger import get_logger
 
 logger = get_logger(__name__)
@@ -23,6 +23,13 @@ with open("config/config.yaml", "r") as f:
 MODEL_CONFIG = config.get("model", {})
 TARGET_COL = MODEL_CONFIG.get("target", "target_class")
 
+# Incremental updates (train(mode="update")): trees appended per update, forced-full cadence, tree cap
+INCREMENTAL_CONFIG = MODEL_CONFIG.get("incremental", {})
+UPDATE_TREES = INCREMENTAL_CONFIG.get("update_trees", 50)
+FULL_RETRAIN_EVERY = INCREMENTAL_CONFIG.get("full_retrain_every", 4)
+MAX_TREES = INCREMENTAL_CONFIG.get("max_trees", 1000)
+MIN_UPDATE_ROWS = INCREMENTAL_CONFIG.get("min_update_rows", 100)
+
 # Load best params from best_params.yaml (has the tuned hyperparams)
 with open("config/best_params.yaml", "r") as f:
     best_config = yaml.safe_load(f)
@@ -69,26 +76,118 @@ def feature_selection(df):
     return [c for c in df.columns if c not in exclude]
 
 
-def train():
-    print("Loading dataset...")
-    df = build_dataset()
-    
-    if df.empty:
-        print("Dataset is empty.")
-        return
+def full_retrain_reason(booster, feature_cols) -> str:
+    """Why an update must fall back to a full retrain ("" if it can append trees)."""
+    if booster is None:
+        return "no deployed model"
+    attrs = booster.attributes()
+    if "train_cutoff" not in attrs:
+        return "deployed model has no train_cutoff metadata"
+    if booster.feature_names != list(feature_cols):
+        return "feature set changed"
+    if int(attrs.get("updates_since_full", 0)) >= FULL_RETRAIN_EVERY:
+        return f"{FULL_RETRAIN_EVERY} updates since the last full retrain"
+    if booster.num_boosted_rounds() + UPDATE_TREES > MAX_TREES:
+        return f"tree cap ({MAX_TREES}) reached"
+    return ""
+
+
+def _train_cutoff(data, df, train_stop: int) -> str:
+    """Latest date among the training rows (ISO), stored in the artifact as train_cutoff."""
+    if df is not None:
+        day = df["date"].iloc[:train_stop].max()
+    else:
+        # Sharded: scan the date column of the shards holding training rows
+        day = None
+        for k, shard in enumerate(data.shards):
+            if data.offsets[k] >= train_stop:
+                break
+            dates = pd.read_parquet(os.path.join(data.shard_dir, shard["file"]), columns=["date"])["date"]
+            latest = dates.iloc[:train_stop - data.offsets[k]].max()
+            day = latest if day is None else max(day, latest)
+    return from_day_numbers([day])[0].date().isoformat()
+
+
+def time_split(data: QuantizedDataset, days: np.ndarray, test_size: float = 0.2):
+    """
+    data.split() of date-sorted rows with the boundary moved back to the
+    first row of its date: the holdout is the most recent dates and no
+    date is on both sides.
+    """
+    (start, stop), (_, end) = data.split(test_size)
+    if 0 < stop < end:
+        stop = int(np.searchsorted(days, days[stop], side="left")) or stop
+    return (start, stop), (stop, end)
+
+
+def train(external_memory: bool = False, mode: str = "full", promote: bool = True):
+    """
+    mode="full" fits a new booster on the 80/20 time split of the dataset
+    rows (the most recent 20% of dates are held out; with external_memory
+    the shards are in stock order, so it is the last 20% of stocks instead).
+    mode="update" loads the deployed booster and appends UPDATE_TREES trees
+    fitted on the training rows dated after its train_cutoff; it falls back
+    to a full retrain every FULL_RETRAIN_EVERY updates (or see
+    full_retrain_reason). Both evaluate on the same 20% holdout.
+    The model is registered (and made current if promote); returns its
+    version, or None if nothing was trained.
+    """
+    if mode == "update":
+        deployed = registry.current_version()
+        booster = registry.load_booster(deployed) if deployed else None
+        df = build_dataset()
+        if df.empty:
+            print("Dataset is empty.")
+            return
+        reason = full_retrain_reason(booster, feature_selection(df))
+        if not reason:
+            return _update(booster, deployed, df.sort_values("date", kind="stable").reset_index(drop=True), promote)
+        logger.info(f"Full retrain forced: {reason}.")
+        del df
+
+    if external_memory:
+        # Out-of-core: Parquet shards on disk, streamed into XGBoost one at a time
+        print("Preparing dataset shards...")
+        shard_dir = write_dataset_shards()
+        columns = read_manifest(shard_dir)["columns"]
+        feature_cols = feature_selection(pd.DataFrame(columns=columns))
+        data = ShardedDataset(shard_dir, feature_cols, TARGET_COL)
+        df = None
+        if len(data) == 0:
+            print("Dataset is empty.")
+            return
+    else:
+        print("Loading dataset...")
+        df = build_dataset()
+        
+        if df.empty:
+            print("Dataset is empty.")
+            return
+
+        feature_cols = feature_selection(df)
+
+        # Date order (stable, as walk_forward/tune_model): the holdout is the latest dates
+        # and train_cutoff the last training date, not just the newest date in the dataset
+        df = df.sort_values("date", kind="stable").reset_index(drop=True)
 
-    feature_cols = feature_selection(df)
+        # Lay out the feature matrix once; train/test are row-range views of it
+        data = QuantizedDataset(df, feature_cols, TARGET_COL)
+        df = df[["date"]]
     
     print(f"Features: {len(feature_cols)}")
     print(f"Target: {TARGET_COL}")
 
-    X = df[feature_cols]
-    y = df[TARGET_COL]
-
-    # Time-series split
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, shuffle=False
-    )
+    if external_memory:
+        # Shards are stock-aligned (stock_id, date) chunks: a row split holds out the last stocks
+        train_rows, test_rows = data.split(test_size=0.2)
+        logger.warning("External-memory split is by stock order, not by date; "
+                       "its holdout overlaps the training dates.")
+        logger.info(f"External-memory training: {len(data)} rows in {len(data.shards)} shards "
+                    f"(train rows {train_rows[1]}, test rows {test_rows[1] - test_rows[0]})")
+    else:
+        train_rows, test_rows = time_split(data, df["date"].to_numpy(), test_size=0.2)
+        logger.info(f"Train matrix: {train_rows[1]} x {len(feature_cols)} float32, "
+                    f"{data.X[slice(*train_rows)].nbytes / 1e6:.1f} MB (view of {data.X.nbytes / 1e6:.1f} MB)")
     
     print(f"Training XGBoost Classifier parameters: {PARAMS}")
 
@@ -97,36 +196,79 @@ def train():
     # "Sell/Hold" labels (class 0) than "Buy" labels (class 1).
     # scale_pos_weight = count(class 0) / count(class 1) tells XGBoost
     # to penalise misclassifying Buy signals more heavily.
-    neg_count = (y_train == 0).sum()
-    pos_count = (y_train == 1).sum()
+    y_train = data.labels(*train_rows)
+    neg_count = int((y_train == 0).sum())
+    pos_count = int((y_train == 1).sum())
     scale_pos_weight = neg_count / pos_count if pos_count > 0 else 1.0
     logger.info(f"Class balance — Sell/Hold: {neg_count} | Buy: {pos_count} | scale_pos_weight: {scale_pos_weight:.3f}")
 
-    model = xgb.XGBClassifier(**PARAMS, scale_pos_weight=scale_pos_weight)
-    model.fit(X_train, y_train)
+    try:
+        model = fit_booster({**PARAMS, "scale_pos_weight": scale_pos_weight}, data.dmatrix(*train_rows))
 
-
-    # Predictions
-    preds = model.predict(X_test)
+        # Predictions
+        y_test = data.labels(*test_rows).astype(int)
+        preds = (data.predict(model, *test_rows, ref=train_rows) > 0.5).astype(int)
+    finally:
+        if external_memory:
+            data.close()
     
     # Evaluation
     metrics = get_classification_metrics(y_test, preds)
     print(f"Evaluation Metrics: {metrics}")
 
-    # Versioning
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    model_filename = f"model_cls_{timestamp}.json"
-    model_path = os.path.join(ARTIFACTS_DIR, model_filename)
-    
-    model.save_model(model_path)
-    print(f"Model saved to {model_path}")
+    cutoff = _train_cutoff(data, df, train_rows[1])
+    return save_model(model, metrics, PARAMS, cutoff=cutoff, mode="full", updates_since_full=0, promote=promote)
+
+
+def _update(booster: xgb.Booster, deployed: str, df: pd.DataFrame, promote: bool = True):
+    """
+    Appends UPDATE_TREES trees fitted on the training-split rows dated after
+    the booster's train_cutoff. df is date-sorted and split as in a full
+    retrain, so the holdout (and the metrics compared by the retrain
+    pipeline) match.
+    """
+    cutoff = booster.attr("train_cutoff")
+    updates = int(booster.attr("updates_since_full") or 0) + 1
+    data = QuantizedDataset(df, feature_selection(df), TARGET_COL)
+    train_rows, test_rows = time_split(data, df["date"].to_numpy(), test_size=0.2)
+
+    train_days = df["date"].to_numpy()[slice(*train_rows)]
+    new_rows = np.flatnonzero(train_days > to_day_numbers([cutoff])[0])
+    if len(new_rows) < MIN_UPDATE_ROWS:
+        logger.info(f"Only {len(new_rows)} training rows after {cutoff} — keeping {deployed}.")
+        return None
+
+    logger.info(f"Updating {deployed} ({booster.num_boosted_rounds()} trees): +{UPDATE_TREES} trees "
+                f"on {len(new_rows)} rows after {cutoff} (update {updates}/{FULL_RETRAIN_EVERY})")
+    # Class weight of the whole training split, as a full retrain would use, not of the few new rows
+    params = {**PARAMS, "n_estimators": UPDATE_TREES, "scale_pos_weight": data.scale_pos_weight(*train_rows)}
+    model = fit_booster(params, data.take_dmatrix(new_rows), xgb_model=booster)
+
+    y_test = data.labels(*test_rows).astype(int)
+    preds = (data.predict(model, *test_rows) > 0.5).astype(int)
+    metrics = get_classification_metrics(y_test, preds)
+    print(f"Evaluation Metrics: {metrics}")
+
+    return save_model(model, metrics, params, cutoff=_train_cutoff(data, df, train_rows[1]), mode="update",
+                      updates_since_full=updates, promote=promote)
+
 
-    # Save Metrics
-    metrics_path = os.path.join(ARTIFACTS_DIR, f"metrics_cls_{timestamp}.json")
-    with open(metrics_path, "w") as f:
-        json.dump(metrics, f, indent=2)
+def save_model(model: xgb.Booster, metrics: dict, params: dict, cutoff: str, mode: str, updates_since_full: int,
+               promote: bool = True) -> str:
+    """Registers the booster (model/registry.py) with its metadata; returns the version."""
+    version = registry.register(model, metrics, params, train_cutoff=cutoff, train_mode=mode,
+                                updates_since_full=updates_since_full, activate=promote)
+    print(f"Model registered as version {version}" + (" (current)" if promote else ""))
 
-    save_experiment_log(timestamp, PARAMS, metrics, model_path)
+    save_experiment_log(version, params, metrics, os.path.join(registry.REGISTRY_DIR, version))
+    return version
 
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description="Train the XGBoost classifier.")
+    parser.add_argument("--external-memory", action="store_true",
+                        help="Train out-of-core from Parquet shards (peak RAM bounded by shard size).")
+    parser.add_argument("--update", action="store_true",
+                        help="Append trees to the deployed model using rows after its train_cutoff.")
+    args = parser.parse_args()
+    train(external_memory=args.external_memory, mode="update" if args.update else "full")
+    registry.gc()
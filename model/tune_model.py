@@ -1,12 +1,23 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import argparse
+import tempfile
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import optuna
 import xgboost as xgb
 import pandas as pd
 import yaml
-import os
-import joblib
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, precision_score, log_loss
+from optuna.storages import RDBStorage
+from optuna.study import MaxTrialsCallback
+from optuna.trial import TrialState
+from sklearn.metrics import accuracy_score
 from model.prepare_dataset import build_dataset
+from model.dmatrix_cache import QuantizedDataset, fit_booster
 
 # Load Base Config
 with open("config/config.yaml", "r") as f:
@@ -14,14 +25,29 @@ with open("config/config.yaml", "r") as f:
 
 MODEL_CONFIG = config.get("model", {})
 TARGET_COL = MODEL_CONFIG.get("target", "target_class")
+TUNING_CONFIG = MODEL_CONFIG.get("tuning", {})
+STORAGE_URL = TUNING_CONFIG.get("storage", "sqlite:///model/experiments/optuna.db")
+STUDY_NAME = TUNING_CONFIG.get("study_name", "xgb_classifier")
+N_TRIALS = TUNING_CONFIG.get("n_trials", 50)
+CV_FOLDS = TUNING_CONFIG.get("cv_folds", 4)
+BUDGET_MINUTES = TUNING_CONFIG.get("budget_minutes", 10)
+PRUNE_EVERY = TUNING_CONFIG.get("prune_every", 25)
+MF_CONFIG = TUNING_CONFIG.get("multi_fidelity", {})
+MF_RUNGS = MF_CONFIG.get("rungs", 3)
+MF_ETA = MF_CONFIG.get("reduction_factor", 3)
+
+# Trial heartbeats (failing trials of crashed workers) are flagged experimental by Optuna
+warnings.filterwarnings("ignore", category=optuna.exceptions.ExperimentalWarning)
+
+MAX_ESTIMATORS = 500  # upper bound of the n_estimators search range (also the per-fold step offset)
 
-def objective(trial):
-    # 2. Suggest Hyperparameters
-    params = {
+
+def suggest_params(trial, n_jobs: int = -1) -> dict:
+    return {
         "objective": "binary:logistic",
         "eval_metric": "logloss",
         "booster": "gbtree",
-        "n_estimators": trial.suggest_int("n_estimators", 100, 500),
+        "n_estimators": trial.suggest_int("n_estimators", 100, MAX_ESTIMATORS),
         "max_depth": trial.suggest_int("max_depth", 3, 10),
         "learning_rate": trial.suggest_float("learning_rate", 0.01, 0.3, log=True),
         "subsample": trial.suggest_float("subsample", 0.5, 1.0),
@@ -30,58 +56,217 @@ def objective(trial):
         "reg_lambda": trial.suggest_float("reg_lambda", 1e-8, 10.0, log=True),
         "min_child_weight": trial.suggest_int("min_child_weight", 1, 10),
         "random_state": 42,
-        "n_jobs": -1
+        "n_jobs": n_jobs
     }
 
-    # 3. Train (with class imbalance correction)
-    neg_count = (y_train == 0).sum()
-    pos_count = (y_train == 1).sum()
-    scale_pos_weight = neg_count / pos_count if pos_count > 0 else 1.0
 
-    model = xgb.XGBClassifier(**params, scale_pos_weight=scale_pos_weight)
-    
-    model.fit(
-        X_train, y_train,
-        eval_set=[(X_test, y_test)],
-        verbose=False
-    )
+def time_series_folds(days: np.ndarray, n_splits: int = CV_FOLDS) -> list:
+    """
+    Expanding-window CV over date-sorted rows (as TimeSeriesSplit): fold k
+    trains on the first k+1 blocks and validates on block k+2. Boundaries are
+    snapped to date changes so one day never sits on both sides.
+    Returns [(train_rows, valid_rows)] as (start, stop) ranges.
+    """
+    n = len(days)
+    edges = [int(np.searchsorted(days, days[min(n - 1, n * k // (n_splits + 1))])) for k in range(1, n_splits + 1)]
+    edges.append(n)
+    return [((0, a), (a, b)) for a, b in zip(edges, edges[1:]) if a > 0 and b > a]
 
 
-    # 4. Evaluate
-    preds = model.predict(X_test)
-    accuracy = accuracy_score(y_test, preds)
-    
-    return accuracy
+class PruningCallback(xgb.callback.TrainingCallback):
+    """
+    Reports validation accuracy (1 - error) to the Optuna trial every
+    PRUNE_EVERY rounds and stops the trial if the pruner says so. Steps are
+    offset by fold (fold * MAX_ESTIMATORS + round) so every trial reports
+    comparable steps across its CV folds.
+    """
 
-if __name__ == "__main__":
+    def __init__(self, trial, fold: int, every: int = PRUNE_EVERY):
+        self.trial, self.offset, self.every = trial, fold * MAX_ESTIMATORS, every
+
+    def after_iteration(self, model, epoch, evals_log) -> bool:
+        if (epoch + 1) % self.every == 0:
+            self.trial.report(1.0 - evals_log["valid"]["error"][-1], self.offset + epoch)
+            if self.trial.should_prune():
+                raise optuna.TrialPruned()
+        return False
+
+
+def make_objective(data: QuantizedDataset, folds: list, n_jobs: int = -1):
+    """Mean validation accuracy over the CV folds; every trial reuses the folds' binned matrices."""
+
+    def objective(trial):
+        params = suggest_params(trial, n_jobs)
+        scores = []
+        for k, (train_rows, valid_rows) in enumerate(folds):
+            # Train (with class imbalance correction) on the fold's cached QuantileDMatrix
+            dvalid = data.eval_dmatrix(*valid_rows)
+            booster = fit_booster(
+                {**params, "scale_pos_weight": data.scale_pos_weight(*train_rows), "eval_metric": ["logloss", "error"]},
+                data.dmatrix(*train_rows), evals=[(dvalid, "valid")], verbose_eval=False,
+                callbacks=[PruningCallback(trial, k)])
+
+            preds = (booster.predict(dvalid) > 0.5).astype(int)
+            scores.append(accuracy_score(data.labels(*valid_rows).astype(int), preds))
+        return float(np.mean(scores))
+
+    return objective
+
+
+# ----------------------------------------------------------
+# Multi-fidelity (--multi-fidelity): Hyperband over data slice x tree count
+# ----------------------------------------------------------
+def fidelity_schedule(rungs: int = MF_RUNGS, eta: int = MF_ETA) -> list:
+    """Rung budgets as fractions of full fidelity: [eta^-(rungs-1), ..., 1/eta, 1]."""
+    return [float(eta) ** (k - rungs + 1) for k in range(rungs)]
+
+
+def make_multi_fidelity_objective(data: QuantizedDataset, folds: list, n_jobs: int = -1,
+                                  rungs: int = MF_RUNGS, eta: int = MF_ETA):
+    """
+    Mean CV accuracy at increasing fidelity. At rung budget b each fold trains
+    on the most recent b share of its train window with b x n_estimators trees
+    (validation blocks are unchanged). The rung score is reported at step
+    b * eta^(rungs-1) (1, eta, eta^2, ...) for the HyperbandPruner; only
+    trials it promotes reach the top rung, which equals the full objective.
+    """
+    schedule = fidelity_schedule(rungs, eta)
+
+    def objective(trial):
+        params = suggest_params(trial, n_jobs)
+        for k, budget in enumerate(schedule):
+            scores = []
+            for train_rows, valid_rows in folds:
+                a, b = train_rows
+                start = b - max(1, int(round((b - a) * budget)))
+                booster = fit_booster(
+                    {**params, "scale_pos_weight": data.scale_pos_weight(start, b),
+                     "n_estimators": max(1, int(round(params["n_estimators"] * budget)))},
+                    data.dmatrix(start, b))
+                preds = (data.predict(booster, *valid_rows, ref=(start, b)) > 0.5).astype(int)
+                scores.append(accuracy_score(data.labels(*valid_rows).astype(int), preds))
+            value = float(np.mean(scores))
+            trial.report(value, int(round(budget * eta ** (rungs - 1))))
+            if k < rungs - 1 and trial.should_prune():
+                raise optuna.TrialPruned()
+        return value
+
+    return objective
+
+
+def open_study(storage_url: str = STORAGE_URL, study_name: str = STUDY_NAME,
+               multi_fidelity: bool = False) -> optuna.Study:
+    """
+    Creates or resumes the study. Stale RUNNING trials of a crashed worker are
+    failed by heartbeat. Multi-fidelity trials report per rung, not per
+    round, so they live in their own study (<study_name>_hyperband).
+    """
+    if storage_url.startswith("sqlite:///"):
+        os.makedirs(os.path.dirname(os.path.abspath(storage_url[len("sqlite:///"):])), exist_ok=True)
+    storage = RDBStorage(storage_url, heartbeat_interval=60, grace_period=120,
+                         engine_kwargs={"connect_args": {"timeout": 30}})
+    if multi_fidelity:
+        study_name = f"{study_name}_hyperband"
+    return optuna.create_study(study_name=study_name, storage=storage, direction="maximize",
+                               load_if_exists=True, pruner=make_pruner(multi_fidelity))
+
+
+def make_pruner(multi_fidelity: bool = False) -> optuna.pruners.BasePruner:
+    """Median pruning of boosting rounds, or Hyperband over the multi-fidelity rungs."""
+    if multi_fidelity:
+        return optuna.pruners.HyperbandPruner(
+            min_resource=1, max_resource=MF_ETA ** (MF_RUNGS - 1), reduction_factor=MF_ETA)
+    return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=PRUNE_EVERY * 4)
+
+
+def optimize(data: QuantizedDataset, folds: list, n_trials: int, timeout: float, n_jobs: int = -1,
+             multi_fidelity: bool = False):
+    """Runs trials until the study holds n_trials finished (complete or pruned) trials or timeout."""
+    study = open_study(multi_fidelity=multi_fidelity)
+    make = make_multi_fidelity_objective if multi_fidelity else make_objective
+    study.optimize(make(data, folds, n_jobs), timeout=timeout,
+                   callbacks=[MaxTrialsCallback(n_trials, states=(TrialState.COMPLETE, TrialState.PRUNED))])
+
+
+def _optimize_in_worker(dataset_dir: str, folds: list, n_trials: int, timeout: float, n_jobs: int,
+                        multi_fidelity: bool):
+    optimize(QuantizedDataset.load(dataset_dir, mmap=True), folds, n_trials, timeout, n_jobs, multi_fidelity)
+
+
+def trial_seconds(study: optuna.Study) -> dict:
+    """
+    Total trial-seconds of finished trials, and those spent until the best
+    trial completed (None while no trial has completed).
+    """
+    trials = [t for t in study.get_trials(deepcopy=False, states=(TrialState.COMPLETE, TrialState.PRUNED))]
+    trials.sort(key=lambda t: t.datetime_complete)
+    seconds = np.cumsum([t.duration.total_seconds() for t in trials])
+    if not any(t.state == TrialState.COMPLETE for t in trials):
+        return {"total": float(seconds[-1]) if len(seconds) else 0.0, "to_best": None}
+    best = next(k for k, t in enumerate(trials) if t.number == study.best_trial.number)
+    return {"total": float(seconds[-1]), "to_best": float(seconds[best])}
+
+
+def tune(budget_minutes: float = BUDGET_MINUTES, workers: int = 1, n_trials: int = N_TRIALS,
+         multi_fidelity: bool = False):
     print("Loading dataset...")
     df = build_dataset()
-    
+
     if df.empty:
         print("Dataset empty.")
-        exit()
+        return
 
     # Feature Selection
     exclude = ['stock_id', 'date', 'target_return', 'target_class', 'excess_return']
     feature_cols = [c for c in df.columns if c not in exclude]
-    
-    X = df[feature_cols]
-    y = df[TARGET_COL]
-
-    # Split
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, shuffle=False
-    )
-    
-    print(f"Starting optimization with {len(X)} rows...")
-    
-    study = optuna.create_study(direction="maximize")
-    study.optimize(objective, n_trials=50, timeout=600) # 50 trials or 10 mins
+
+    # Laid out once; CV folds are row ranges of the date-sorted rows, binned once for every trial
+    df = df.sort_values("date", kind="stable").reset_index(drop=True)
+    folds = time_series_folds(df["date"].to_numpy())
+    data = QuantizedDataset(df, feature_cols, TARGET_COL)
+    del df
+
+    study = open_study(multi_fidelity=multi_fidelity)
+    done = len(study.get_trials(deepcopy=False, states=(TrialState.COMPLETE, TrialState.PRUNED)))
+    print(f"Study '{study.study_name}' at {STORAGE_URL}: {done}/{n_trials} trials done")
+    if multi_fidelity:
+        print(f"Multi-fidelity: rung budgets {fidelity_schedule()} of data slice and trees")
+    print(f"Starting optimization with {len(data)} rows, {len(folds)} CV folds, "
+          f"{workers} worker(s), {budget_minutes} min budget...")
+
+    timeout = budget_minutes * 60
+    if done >= n_trials:
+        print("Study already complete; raise --trials to continue it.")
+    elif workers <= 1:
+        optimize(data, folds, n_trials, timeout, multi_fidelity=multi_fidelity)
+    else:
+        # Each worker memory-maps the same saved matrix and gets a share of the cores
+        n_jobs = max(1, (os.cpu_count() or 1) // workers)
+        with tempfile.TemporaryDirectory() as dataset_dir:
+            data.save(dataset_dir)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_optimize_in_worker, dataset_dir, folds, n_trials, timeout, n_jobs,
+                                       multi_fidelity)
+                           for _ in range(workers)]
+                for future in futures:
+                    future.result()
+
+    study = open_study(multi_fidelity=multi_fidelity)
+    states = pd.Series([t.state.name for t in study.get_trials(deepcopy=False)]).value_counts()
+    print(f"\nTrials: {states.to_dict()}")
+    spent = trial_seconds(study)
+    if spent["to_best"] is None:
+        # Every trial was pruned, failed or cut off by the budget: there is no best trial
+        print(f"Trial-seconds: {spent['total']:.1f} total")
+        print("\nNo completed trial — config/best_params.yaml left unchanged. "
+              "Raise --budget or --trials and rerun to resume the study.")
+        return study
+    print(f"Trial-seconds: {spent['total']:.1f} total, {spent['to_best']:.1f} to reach the best trial")
 
     print("\nBest trial:")
     trial = study.best_trial
 
-    print(f"  Value (Accuracy): {trial.value}")
+    print(f"  Value (CV Accuracy): {trial.value}")
     print("  Params: ")
     for key, value in trial.params.items():
         print(f"    {key}: {value}")
@@ -96,8 +281,21 @@ if __name__ == "__main__":
     best_params["model"]["params"]["objective"] = "binary:logistic"
     best_params["model"]["params"]["eval_metric"] = "logloss"
     best_params["model"]["params"]["random_state"] = 42
-    
+
     with open("config/best_params.yaml", "w") as f:
         yaml.dump(best_params, f)
-        
+
     print("\nSaved best params to config/best_params.yaml")
+    return study
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optuna search for the XGBoost classifier (resumable).")
+    parser.add_argument("--budget", type=float, default=BUDGET_MINUTES, help="Wall-time budget in minutes.")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes sharing the study.")
+    parser.add_argument("--trials", type=int, default=N_TRIALS,
+                        help="Finished trials the study should reach (resumed runs top up to this).")
+    parser.add_argument("--multi-fidelity", action="store_true",
+                        help="Hyperband: score candidates on recent data slices with few trees, promote survivors.")
+    args = parser.parse_args()
+    tune(budget_minutes=args.budget, workers=args.workers, n_trials=args.trials, multi_fidelity=args.multi_fidelity)
@@ -2,21 +2,35 @@ import sys
 import os
 sys.path.append(os.getcwd())
 
+import argparse
+import math
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import numpy as np
 import pandas as pd
 import xgboost as xgb
 import yaml
 from sklearn.metrics import accuracy_score, f1_score
 from model.prepare_dataset import build_dataset
+from model.dtype_policy import from_day_numbers, to_day_numbers
+from model.dmatrix_cache import QuantizedDataset, fit_booster
 
 # Load best params
 with open("config/best_params.yaml", "r") as f:
     best_config = yaml.safe_load(f)
 PARAMS = best_config.get("model", {}).get("params", {})
 
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+MAX_TREES = config.get("model", {}).get("incremental", {}).get("max_trees", 1000)
+
 TRAIN_YEARS = 3
 TEST_MONTHS = 6
 TARGET_COL = "target_class"
+RESULTS_PATH = "model/experiments/walk_forward_results.csv"
+INCREMENTAL_PATH = "model/experiments/walk_forward_incremental.csv"
 
 
 def feature_selection(df):
@@ -24,27 +38,17 @@ def feature_selection(df):
     return [c for c in df.columns if c not in exclude]
 
 
-def walk_forward_backtest():
-    print("Loading dataset for walk-forward validation...")
-    df = build_dataset()
-
-    if df.empty:
-        print("Dataset is empty.")
-        return
-
-    df["date"] = pd.to_datetime(df["date"])
-    df = df.sort_values("date").reset_index(drop=True)
-
-    feature_cols = feature_selection(df)
-    print(f"Using {len(feature_cols)} features: {feature_cols}")
-
-    start_date = df["date"].min()
-    end_date = df["date"].max()
+def plan_folds(days: np.ndarray) -> list:
+    """
+    Walk-forward windows over date-sorted int32 day numbers: a TRAIN_YEARS
+    train window followed by TEST_MONTHS of test, sliding by 6 months.
+    Each fold carries its dates and its contiguous row ranges (lo, mid, hi).
+    """
+    start_date = from_day_numbers([days.min()])[0]
+    end_date = from_day_numbers([days.max()])[0]
 
-    results = []
+    folds = []
     train_start = start_date
-
-    fold = 0
     while True:
         train_end = train_start + pd.DateOffset(years=TRAIN_YEARS)
         test_end = train_end + pd.DateOffset(months=TEST_MONTHS)
@@ -52,43 +56,194 @@ def walk_forward_backtest():
         if test_end > end_date:
             break
 
-        train_df = df[(df["date"] >= train_start) & (df["date"] < train_end)]
-        test_df  = df[(df["date"] >= train_end) & (df["date"] < test_end)]
+        # Rows are date-sorted, so each window is a contiguous row range
+        lo, mid, hi = np.searchsorted(days, to_day_numbers([train_start, train_end, test_end]))
 
-        if len(train_df) < 500 or len(test_df) < 100:
-            train_start += pd.DateOffset(months=6)
-            continue
+        if mid - lo >= 500 and hi - mid >= 100:
+            folds.append({
+                "fold": len(folds) + 1,
+                "train_start": train_start.date(), "train_end": train_end.date(), "test_end": test_end.date(),
+                "lo": int(lo), "mid": int(mid), "hi": int(hi),
+            })
 
-        fold += 1
-        print(f"\nFold {fold}: Train [{train_start.date()} → {train_end.date()}] | Test [{train_end.date()} → {test_end.date()}]")
-        print(f"  Train rows: {len(train_df)} | Test rows: {len(test_df)}")
+        train_start += pd.DateOffset(months=6)
+    return folds
 
-        # Train classifier with tuned params
-        model = xgb.XGBClassifier(**PARAMS)
-        model.fit(train_df[feature_cols], train_df[TARGET_COL])
 
-        # Evaluate
-        preds = model.predict(test_df[feature_cols])
-        acc = accuracy_score(test_df[TARGET_COL], preds)
-        f1  = f1_score(test_df[TARGET_COL], preds, zero_division=0)
+def run_fold(data: QuantizedDataset, fold: dict, params: dict) -> dict:
+    """Trains one fold's classifier and scores it; returns its results row."""
+    lo, mid, hi = fold["lo"], fold["mid"], fold["hi"]
+    start = time.perf_counter()
 
-        print(f"  Accuracy: {acc:.4f} | F1: {f1:.4f}")
+    # Train classifier with tuned params; the test rows are binned with the train window's cut points
+    model = fit_booster(params, data.dmatrix(lo, mid))
+    acc, f1 = _score(data, model, mid, hi, ref=(lo, mid))
 
-        results.append({
-            "fold": fold,
-            "train_start": train_start.date(),
-            "train_end": train_end.date(),
-            "test_start": train_end.date(),
-            "test_end": test_end.date(),
-            "train_rows": len(train_df),
-            "test_rows": len(test_df),
-            "accuracy": round(acc, 4),
-            "f1_score": round(f1, 4),
-        })
+    return {
+        "fold": fold["fold"],
+        "train_start": fold["train_start"],
+        "train_end": fold["train_end"],
+        "test_start": fold["train_end"],
+        "test_end": fold["test_end"],
+        "train_rows": mid - lo,
+        "test_rows": hi - mid,
+        "accuracy": round(acc, 4),
+        "f1_score": round(f1, 4),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def _score(data: QuantizedDataset, model: xgb.Booster, start: int, stop: int, ref: tuple = None) -> tuple:
+    """(accuracy, f1) of a booster on rows [start, stop), binned with training range ref's cut points."""
+    y_test = data.rows(start, stop)[1].astype(int)
+    preds = (data.predict(model, start, stop, ref=ref) > 0.5).astype(int)
+    return accuracy_score(y_test, preds), f1_score(y_test, preds, zero_division=0)
+
+
+def _report(result: dict):
+    print(f"\nFold {result['fold']}: Train [{result['train_start']} → {result['train_end']}] | "
+          f"Test [{result['test_start']} → {result['test_end']}]")
+    print(f"  Train rows: {result['train_rows']} | Test rows: {result['test_rows']}")
+    print(f"  Accuracy: {result['accuracy']:.4f} | F1: {result['f1_score']:.4f} ({result['seconds']:.1f}s)")
+
+
+def _save_results(results: list) -> pd.DataFrame:
+    """Writes the summary CSV (fold order, same columns) — rewritten as folds finish."""
+    results_df = pd.DataFrame(sorted(results, key=lambda r: r["fold"])).drop(columns="seconds")
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    results_df.to_csv(RESULTS_PATH, index=False)
+    return results_df
+
+
+# ----------------------------------------------------------
+# Incremental (--incremental): warm-start each fold from the previous booster
+# ----------------------------------------------------------
+def update_rounds(params: dict, fold: dict, prev: dict) -> int:
+    """Trees added by a warm start: n_estimators scaled by the share of the window that is new."""
+    new_rows = fold["mid"] - prev["mid"]
+    return max(1, math.ceil(int(params.get("n_estimators", 100)) * new_rows / (fold["mid"] - fold["lo"])))
+
+
+def run_incremental(data: QuantizedDataset, folds: list, params: dict, max_trees: int = MAX_TREES):
+    """
+    Yields (full, incremental) result rows per fold. The full row is run_fold();
+    the incremental booster continues from the previous fold's incremental
+    booster (xgb_model=) on the rows added since that fold's train window.
+    The first fold, and any warm start that would push the booster past
+    max_trees, trains from scratch instead. Both paths are timed on prebuilt
+    matrices so the comparison is boosting + scoring only. A warm-started
+    booster mixes trees fitted on different matrices' cut points, so it is
+    scored on the raw test rows (plain DMatrix).
+    """
+    booster, prev = None, None
+    for fold in folds:
+        lo, mid, hi = fold["lo"], fold["mid"], fold["hi"]
+        data.dmatrix(lo, mid), data.dmatrix(mid, hi, ref=(lo, mid)), data.eval_dmatrix(mid, hi)
+        if prev is not None:
+            data.dmatrix(prev["mid"], mid)
+
+        full = run_fold(data, fold, params)
+
+        start = time.perf_counter()
+        rounds = update_rounds(params, fold, prev) if prev is not None else 0
+        if booster is None or booster.num_boosted_rounds() + rounds > max_trees:
+            booster, mode, ref = fit_booster(params, data.dmatrix(lo, mid)), "full", (lo, mid)
+        else:
+            booster = fit_booster({**params, "n_estimators": rounds}, data.dmatrix(prev["mid"], mid),
+                                  xgb_model=booster)
+            mode, ref = "warm", None
+        acc, f1 = _score(data, booster, mid, hi, ref=ref)
+        seconds = time.perf_counter() - start
+
+        yield full, {
+            "fold": fold["fold"],
+            "mode": mode,
+            "trees": booster.num_boosted_rounds(),
+            "full_accuracy": full["accuracy"],
+            "incremental_accuracy": round(acc, 4),
+            "accuracy_diff": round(acc - full["accuracy"], 4),
+            "full_f1": full["f1_score"],
+            "incremental_f1": round(f1, 4),
+            "full_s": round(full["seconds"], 2),
+            "incremental_s": round(seconds, 2),
+            "time_saving_pct": round(100 * (1 - seconds / full["seconds"]), 1),
+        }
+        prev = fold
 
-        train_start += pd.DateOffset(months=6)
 
-    results_df = pd.DataFrame(results)
+# ----------------------------------------------------------
+# Process pool (--parallel): one memory-mapped dataset per worker
+# ----------------------------------------------------------
+_worker = {}
+
+
+def _init_worker(dataset_dir: str, params: dict):
+    _worker["data"] = QuantizedDataset.load(dataset_dir, mmap=True)
+    _worker["params"] = params
+
+
+def _run_fold_in_worker(fold: dict) -> dict:
+    return run_fold(_worker["data"], fold, _worker["params"])
+
+
+def run_folds_parallel(data: QuantizedDataset, folds: list, workers: int):
+    """
+    Yields fold results as they finish. The dataset is saved once as .npy
+    files that every worker memory-maps (no pickled DataFrame), and each
+    worker's XGBoost gets cpu_count // workers threads.
+    """
+    n_jobs = max(1, (os.cpu_count() or 1) // workers)
+    params = {**PARAMS, "n_jobs": n_jobs}
+    print(f"Running {len(folds)} folds on {workers} workers x {n_jobs} threads")
+    with tempfile.TemporaryDirectory() as dataset_dir:
+        data.save(dataset_dir)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(dataset_dir, params)) as pool:
+            futures = [pool.submit(_run_fold_in_worker, fold) for fold in folds]
+            for future in as_completed(futures):
+                yield future.result()
+
+
+def walk_forward_backtest(parallel: bool = False, workers: int = None, incremental: bool = False):
+    print("Loading dataset for walk-forward validation...")
+    df = build_dataset()
+
+    if df.empty:
+        print("Dataset is empty.")
+        return
+
+    # Stable sort: row order within a date (and so the fitted trees) does not depend on dtypes
+    df = df.sort_values("date", kind="stable").reset_index(drop=True)
+    # Dates are int32 day numbers (model/dtype_policy.py); fold bounds are compared as such
+    days = df["date"].to_numpy()
+
+    feature_cols = feature_selection(df)
+    print(f"Using {len(feature_cols)} features: {feature_cols}")
+    # Laid out once; each fold sketches its train window and bins its test rows with those cut points
+    data = QuantizedDataset(df, feature_cols, TARGET_COL)
+    del df
+
+    folds = plan_folds(days)
+    if not folds:
+        print("Not enough history for a single fold.")
+        return
+
+    if incremental:
+        return incremental_backtest(data, folds)
+
+    start = time.perf_counter()
+    if parallel:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(folds)))
+        fold_results = run_folds_parallel(data, folds, workers)
+    else:
+        fold_results = (run_fold(data, fold, PARAMS) for fold in folds)
+
+    # Results stream in as folds finish (completion order when parallel)
+    results = []
+    for result in fold_results:
+        _report(result)
+        results.append(result)
+        results_df = _save_results(results)
 
     print("\n" + "="*60)
     print("WALK-FORWARD VALIDATION SUMMARY")
@@ -98,14 +253,49 @@ def walk_forward_backtest():
     print(f"Average F1 Score: {results_df['f1_score'].mean():.4f}")
     print(f"Min Accuracy:     {results_df['accuracy'].min():.4f}")
     print(f"Max Accuracy:     {results_df['accuracy'].max():.4f}")
+    print(f"Wall time:        {time.perf_counter() - start:.1f}s")
 
-    # Save results
-    os.makedirs("model/experiments", exist_ok=True)
-    results_df.to_csv("model/experiments/walk_forward_results.csv", index=False)
-    print("\nResults saved to model/experiments/walk_forward_results.csv")
+    print(f"\nResults saved to {RESULTS_PATH}")
 
     return results_df
 
 
+def incremental_backtest(data: QuantizedDataset, folds: list):
+    """Full vs warm-started retraining per fold; writes both CSVs."""
+    print(f"Incremental mode: warm starts capped at {MAX_TREES} trees")
+    results, comparison = [], []
+    for full, inc in run_incremental(data, folds, PARAMS):
+        _report(full)
+        print(f"  Incremental ({inc['mode']}, {inc['trees']} trees): Accuracy {inc['incremental_accuracy']:.4f} "
+              f"({inc['accuracy_diff']:+.4f}) in {inc['incremental_s']:.1f}s "
+              f"vs {inc['full_s']:.1f}s ({inc['time_saving_pct']:.0f}% saved)")
+        results.append(full)
+        comparison.append(inc)
+
+    _save_results(results)
+    comparison_df = pd.DataFrame(comparison)
+    comparison_df.to_csv(INCREMENTAL_PATH, index=False)
+
+    print("\n" + "="*60)
+    print("INCREMENTAL vs FULL RETRAINING")
+    print("="*60)
+    print(comparison_df.to_string(index=False))
+    warm = comparison_df[comparison_df["mode"] == "warm"]
+    if not warm.empty:
+        print(f"\nWarm-started folds: {len(warm)} | mean accuracy diff {warm['accuracy_diff'].mean():+.4f} | "
+              f"time {warm['incremental_s'].sum():.1f}s vs {warm['full_s'].sum():.1f}s full")
+    print(f"\nResults saved to {RESULTS_PATH} and {INCREMENTAL_PATH}")
+    return comparison_df
+
+
 if __name__ == "__main__":
-    walk_forward_backtest()
+    parser = argparse.ArgumentParser(description="Walk-forward validation of the XGBoost classifier.")
+    parser.add_argument("--parallel", action="store_true", help="Run folds in a process pool.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Pool size for --parallel (default: CPU count, at most one per fold).")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Also warm-start each fold from the previous booster and compare with full retraining.")
+    args = parser.parse_args()
+    if args.incremental and args.parallel:
+        parser.error("--incremental chains folds and cannot run with --parallel")
+    walk_forward_backtest(parallel=args.parallel, workers=args.workers, incremental=args.incremental)
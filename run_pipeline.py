@@ -44,7 +44,10 @@ def main():
     # 4. Model Training (Train → Artifact)
     run_script("model/train_model.py")
 
-    # 5. Backtesting (Verification)
+    # 5. Daily Signals (new model x latest features → daily_signals)
+    run_script("model/daily_signals.py")
+
+    # 6. Backtesting (Verification)
     run_script("model/backtest.py")
 
     print("\n🎉 PIPELINE COMPLETED SUCCESSFULLY!")
@@ -38,6 +38,18 @@ class TestHealthEndpoint:
         assert "model_loaded" in body
         assert isinstance(body["model_loaded"], bool)
 
+    def test_health_reports_feature_cache(self):
+        from api.main import app
+        client = TestClient(app)
+        cache = client.get("/health").json()["feature_cache"]
+        assert {"hit_ratio", "staleness_s", "rows", "feature_store_version"} <= set(cache)
+
+    def test_health_reports_prediction_log_queue(self):
+        from api.main import app
+        client = TestClient(app)
+        logs = client.get("/health").json()["prediction_logs"]
+        assert {"queue_depth", "queue_size", "dropped", "last_flush_ms", "flush_p99_ms"} <= set(logs)
+
 
 # -------------------------------------------------------------------
 # /predict Endpoint Tests
@@ -65,6 +77,151 @@ class TestPredictEndpoint:
             "Empty body should use default symbol, not cause a 422 validation error"
 
 
+    def test_predict_served_from_feature_cache(self):
+        """A cached symbol is scored without reading feature_store."""
+        from api import main as api_module
+        import numpy as np
+        from datetime import date
+        fake = MagicMock()
+        fake.get_booster.return_value.feature_names = ["rsi_14"]
+        fake.predict_proba.return_value = np.array([[0.3, 0.7]])
+        cache = MagicMock()
+        cache.get.return_value = {"features": np.array([[55.0]], dtype=np.float32), "stock_id": 7,
+                                  "date": date(2024, 9, 30), "rsi": 55.0, "sentiment": 0.1,
+                                  "probability": None, "prediction": None}
+        original = api_module.model, api_module.feature_cache
+        try:
+            api_module.model, api_module.feature_cache = fake, cache
+            client = TestClient(api_module.app)
+            with patch("api.main.engine") as mock_engine, patch("api.main.pd.read_sql") as mock_sql, \
+                    patch("api.main.log_writer") as writer:
+                response = client.post("/predict", json={"symbol": "TCS.NS"})
+            assert response.status_code == 200
+            assert response.json()["prediction"] == "Buy"
+            cache.get.assert_called_once_with("TCS")
+            mock_sql.assert_not_called()
+            # Log row queued for the background writer, no database write on the request path
+            mock_engine.begin.assert_not_called()
+            logged = writer.submit.call_args.args[0]
+            assert (logged["stock_id"], logged["predicted_class"]) == (7, "Buy")
+            assert response.json()["source"] == "live"
+        finally:
+            api_module.model, api_module.feature_cache = original
+
+    def test_predict_returns_precomputed_daily_signal(self):
+        """A daily signal for the cached date and model is returned without scoring."""
+        from api import main as api_module
+        import numpy as np
+        from datetime import date
+        fake = MagicMock()
+        fake.get_booster.return_value.feature_names = ["rsi_14"]
+        cache = MagicMock()
+        cache.get.return_value = {"features": np.array([[55.0]], dtype=np.float32), "stock_id": 7,
+                                  "date": date(2024, 9, 30), "rsi": 55.0, "sentiment": 0.1,
+                                  "probability": 0.62, "prediction": "Buy"}
+        original = api_module.model, api_module.feature_cache
+        try:
+            api_module.model, api_module.feature_cache = fake, cache
+            client = TestClient(api_module.app)
+            with patch("api.main.engine"), patch("api.main.pd.read_sql") as mock_sql, \
+                    patch("api.main.log_writer"):
+                response = client.post("/predict", json={"symbol": "TCS.NS"})
+            body = response.json()
+            assert response.status_code == 200
+            assert (body["prediction"], body["probability"], body["source"]) == ("Buy", 0.62, "daily_signals")
+            fake.predict_proba.assert_not_called()
+            mock_sql.assert_not_called()
+        finally:
+            api_module.model, api_module.feature_cache = original
+
+
+# -------------------------------------------------------------------
+# /predict/batch Endpoint Tests
+# -------------------------------------------------------------------
+class TestPredictBatchEndpoint:
+    @pytest.fixture
+    def fake_model(self):
+        """Model whose Buy probability is the rsi_14 feature / 100."""
+        from api import main as api_module
+        import numpy as np
+        fake = MagicMock()
+        fake.get_booster.return_value.feature_names = ["rsi_14", "^NSEI_ret"]
+        fake.predict_proba.side_effect = lambda X: np.column_stack([1 - X["rsi_14"] / 100, X["rsi_14"] / 100])
+        original_model = api_module.model
+        api_module.model = fake
+        yield fake
+        api_module.model = original_model
+
+    def latest_rows(self):
+        import pandas as pd
+        from datetime import date
+        return pd.DataFrame({
+            "symbol": ["TCS", "INFY"],
+            "stock_id": [1, 2],
+            "date": [date(2024, 9, 30), date(2024, 9, 30)],
+            "rsi_14": [30.0, 70.0],
+            "macro_nifty_50_ret": [0.01, -0.01],
+            "sentiment_score": [0.2, None],
+        })
+
+    def test_batch_with_no_model_returns_503(self):
+        from api import main as api_module
+        original_model = api_module.model
+        try:
+            api_module.model = None
+            client = TestClient(api_module.app)
+            response = client.post("/predict/batch", json={"symbols": ["TCS.NS"]})
+            assert response.status_code == 503
+        finally:
+            api_module.model = original_model
+
+    def test_batch_scores_once_and_logs_in_one_statement(self, fake_model):
+        from api.main import app
+        client = TestClient(app)
+        with patch("api.main.engine") as mock_engine, patch("api.main.pd.read_sql") as mock_sql:
+            mock_sql.return_value = self.latest_rows()
+            log_conn = mock_engine.begin.return_value.__enter__.return_value
+            response = client.post("/predict/batch", json={"symbols": ["TCS.NS", "INFY.NS", "WIPRO.NS"]})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert mock_sql.call_count == 1
+        assert mock_sql.call_args.kwargs["params"] == {"symbols": ["TCS", "INFY", "WIPRO"]}
+        assert fake_model.predict_proba.call_count == 1
+        assert body["count"] == 2
+        assert body["missing"] == ["WIPRO.NS"]
+        # Highest Buy probability first; symbols echoed as sent
+        assert [p["symbol"] for p in body["predictions"]] == ["INFY.NS", "TCS.NS"]
+        assert [p["prediction"] for p in body["predictions"]] == ["Buy", "Sell"]
+        assert body["predictions"][0]["sentiment"] == 0.0
+
+        assert log_conn.execute.call_count == 1
+        logged = log_conn.execute.call_args.args[1]
+        assert logged["stock_ids"] == [1, 2]
+        assert logged["classes"] == ["Sell", "Buy"]
+
+    def test_batch_defaults_to_all_active_stocks(self, fake_model):
+        from api.main import app
+        client = TestClient(app)
+        with patch("api.main.engine"), patch("api.main.pd.read_sql") as mock_sql:
+            mock_sql.return_value = self.latest_rows()
+            response = client.post("/predict/batch", json={})
+
+        assert response.status_code == 200
+        assert "is_active" in str(mock_sql.call_args.args[0])
+        assert response.json()["missing"] == []
+        assert {p["symbol"] for p in response.json()["predictions"]} == {"TCS", "INFY"}
+
+    def test_batch_with_empty_list_skips_database(self, fake_model):
+        from api.main import app
+        client = TestClient(app)
+        with patch("api.main.pd.read_sql") as mock_sql:
+            response = client.post("/predict/batch", json={"symbols": []})
+        assert response.status_code == 200
+        assert response.json()["count"] == 0
+        mock_sql.assert_not_called()
+
+
 # -------------------------------------------------------------------
 # /evaluate_positions Endpoint Tests
 # -------------------------------------------------------------------
@@ -88,3 +245,78 @@ class TestEvaluatePositionsEndpoint:
                 body = response.json()
                 assert "sell_signals" in body
                 assert body["sell_signals"] == []
+
+
+# -------------------------------------------------------------------
+# Async pool path (api/async_db.py)
+# -------------------------------------------------------------------
+class TestAsyncDatabasePath:
+    @pytest.fixture
+    def async_db(self):
+        """Ready pool whose hot queries are AsyncMocks; the sync engine must not be touched."""
+        from unittest.mock import AsyncMock
+        from api import main as api_module
+        db = MagicMock(ready=True)
+        db.stock_id = AsyncMock(return_value=7)
+        db.latest_features = AsyncMock(return_value={
+            "stock_id": 7, "date": "2024-09-30", "rsi_14": 80.0, "sentiment_score": None,
+            "macro_nifty_50_ret": 0.01})
+        db.latest_price = AsyncMock(return_value=None)
+        db.open_positions = AsyncMock(return_value=[])
+        original = api_module.async_db, api_module.feature_cache
+        api_module.async_db, api_module.feature_cache = db, None
+        with patch("api.main.engine") as mock_engine, patch("api.main.pd.read_sql") as mock_sql:
+            yield db
+            mock_engine.connect.assert_not_called()
+            mock_sql.assert_not_called()
+        api_module.async_db, api_module.feature_cache = original
+
+    def test_predict_reads_latest_row_from_pool(self, async_db):
+        from api import main as api_module
+        import numpy as np
+        fake = MagicMock()
+        fake.get_booster.return_value.feature_names = ["rsi_14", "^NSEI_ret"]
+        fake.predict_proba.return_value = np.array([[0.2, 0.8]])
+        original_model = api_module.model
+        try:
+            api_module.model = fake
+            with patch("api.main.log_writer") as writer:
+                writer.policy = "drop"
+                response = TestClient(api_module.app).post("/predict", json={"symbol": "TCS.NS"})
+            body = response.json()
+            assert response.status_code == 200
+            assert (body["prediction"], body["source"], body["sentiment"]) == ("Buy", "live", 0.0)
+            async_db.stock_id.assert_awaited_once_with("TCS")
+            async_db.latest_features.assert_awaited_once_with(7)
+            # Record -> float32 vector in model order, macro column renamed
+            X = fake.predict_proba.call_args.args[0]
+            np.testing.assert_allclose(X, [[80.0, 0.01]], rtol=1e-6)
+            assert writer.submit.call_args.args[0]["stock_id"] == 7
+        finally:
+            api_module.model = original_model
+
+    def test_predict_unknown_symbol_returns_404(self, async_db):
+        from api import main as api_module
+        async_db.stock_id.return_value = None
+        original_model = api_module.model
+        try:
+            api_module.model = MagicMock()
+            response = TestClient(api_module.app).post("/predict", json={"symbol": "NOPE"})
+            assert response.status_code == 404
+            async_db.latest_features.assert_not_awaited()
+        finally:
+            api_module.model = original_model
+
+    def test_evaluate_positions_uses_latest_prices(self, async_db):
+        from api.main import app
+        async_db.open_positions.return_value = [
+            {"id": 1, "stock_id": 1, "symbol": "TCS", "buy_price": 100.0},
+            {"id": 2, "stock_id": 2, "symbol": "INFY", "buy_price": 100.0},
+            {"id": 3, "stock_id": 3, "symbol": "WIPRO", "buy_price": 100.0},
+        ]
+        async_db.latest_price.side_effect = lambda stock_id: {1: 120.0, 2: 90.0, 3: None}[stock_id]
+        body = TestClient(app).post("/evaluate_positions").json()
+        assert body["message"] == "Evaluated 3 open positions."
+        # TCS +20% >= take profit, INFY -10% <= stop loss, WIPRO has no price
+        assert [s["symbol"] for s in body["sell_signals"]] == ["TCS", "INFY"]
+        assert async_db.latest_price.await_count == 3
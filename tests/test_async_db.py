@@ -0,0 +1,68 @@
+"""
+tests/test_async_db.py
+Unit tests for the API's asyncpg pool wrapper (api/async_db.py) and the
+Record -> model vector conversion it relies on, with a mocked pool.
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+
+from api.async_db import AsyncDatabase, HOT_QUERIES
+from feature_engineering.feature_store import model_vector
+
+
+def connected(pool=None):
+    db = AsyncDatabase(dsn="postgresql://test")
+    db.pool = pool or MagicMock()
+    db.pool.is_closing.return_value = False
+    return db
+
+
+# -------------------------------------------------------------------
+# Hot queries
+# -------------------------------------------------------------------
+class TestQueries:
+    def test_symbol_lookup_is_memoized(self):
+        db = connected()
+        db.pool.fetchval = AsyncMock(return_value=7)
+        assert asyncio.run(db.stock_id("TCS")) == 7
+        assert asyncio.run(db.stock_id("TCS")) == 7
+        assert db.pool.fetchval.await_count == 1
+
+    def test_unknown_symbol_is_not_memoized(self):
+        db = connected()
+        db.pool.fetchval = AsyncMock(side_effect=[None, 9])
+        assert asyncio.run(db.stock_id("NEWCO")) is None
+        # Listed later: found on the next lookup
+        assert asyncio.run(db.stock_id("NEWCO")) == 9
+
+    def test_new_connections_prepare_every_hot_query(self):
+        conn = MagicMock()
+        conn.fetchrow = AsyncMock(return_value=None)
+        asyncio.run(AsyncDatabase._prepare(conn))
+        assert [c.args[0] for c in conn.fetchrow.await_args_list] == HOT_QUERIES
+
+    def test_stats(self):
+        assert AsyncDatabase().stats() == {"ready": False}
+        db = connected()
+        db.pool.get_size.return_value, db.pool.get_idle_size.return_value = 8, 5
+        db.pool.get_max_size.return_value = 8
+        stats = db.stats()
+        assert (stats["pool_size"], stats["pool_in_use"], stats["pool_max_size"]) == (8, 3, 8)
+
+
+# -------------------------------------------------------------------
+# Record -> model input
+# -------------------------------------------------------------------
+class TestModelVector:
+    def test_model_order_renames_nulls_and_missing(self):
+        row = {"rsi_14": 55.0, "macro_nifty_50_ret": 0.01, "sentiment_score": None}
+        X = model_vector(row, ["^NSEI_ret", "sentiment_score", "rsi_14", "obv"])
+        assert X.dtype == np.float32 and X.shape == (1, 4)
+        np.testing.assert_allclose(X[0, [0, 2, 3]], [0.01, 55.0, 0.0], rtol=1e-6)
+        assert np.isnan(X[0, 1])
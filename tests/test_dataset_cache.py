@@ -0,0 +1,94 @@
+"""
+tests/test_dataset_cache.py
+Tests for the build_dataset() cache: keys, Parquet round trip and eviction.
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import time
+import pandas as pd
+import numpy as np
+from model import dataset_cache
+
+
+def _fingerprint(**overrides):
+    fp = {"features_daily": [1000, "2024-09-30"], "prices": [1200, "2024-09-30"],
+          "index_prices": [300, "2024-09-30"], "news": [50, "2024-09-26"], "features_oid": 42}
+    fp.update(overrides)
+    return fp
+
+
+class TestDatasetKey:
+    def test_key_is_stable_and_tracks_sources(self):
+        assert dataset_cache.dataset_key(_fingerprint()) == dataset_cache.dataset_key(_fingerprint())
+        assert dataset_cache.dataset_key(_fingerprint()) != dataset_cache.dataset_key(
+            _fingerprint(prices=[1201, "2024-10-01"]))
+        assert dataset_cache.dataset_key(_fingerprint()) != dataset_cache.dataset_key(
+            _fingerprint(features_oid=43))
+
+
+class TestCacheStore:
+    def _use_tmp_dir(self, tmp_path, monkeypatch, key="k1"):
+        monkeypatch.setattr(dataset_cache, "CACHE_DIR", str(tmp_path))
+        monkeypatch.setattr(dataset_cache, "CACHE_ENABLED", True)
+        monkeypatch.setattr(dataset_cache, "source_fingerprint", lambda conn: {"key": key})
+
+    def test_second_call_is_served_from_parquet(self, tmp_path, monkeypatch):
+        self._use_tmp_dir(tmp_path, monkeypatch)
+        calls = []
+        df = pd.DataFrame({"stock_id": [1, 2], "date": pd.to_datetime(["2024-01-01", "2024-01-02"]),
+                           "rsi_14": [55.5, np.nan], "target_class": [1, 0]})
+
+        def build():
+            calls.append(1)
+            return df
+
+        first = dataset_cache.get_or_build(build)
+        second = dataset_cache.get_or_build(build)
+        pd.testing.assert_frame_equal(second, first)
+        assert len(calls) == 1
+
+        dataset_cache.get_or_build(build, refresh=True)
+        assert len(calls) == 2
+
+        dataset_cache.invalidate()
+        assert dataset_cache.cached_files() == []
+
+    def test_evicts_least_recently_used(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(dataset_cache, "CACHE_DIR", str(tmp_path))
+        paths = []
+        for i, name in enumerate(["old", "mid", "new"]):
+            path = tmp_path / f"dataset_{name}.parquet"
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (time.time() + i, time.time() + i))
+            paths.append(str(path))
+
+        dataset_cache.evict(max_bytes=250)
+        assert dataset_cache.cached_files() == [paths[2], paths[1]]
+
+
+class TestSourceFingerprint:
+    def test_in_place_update_changes_key(self):
+        """A score filled in place (same count, same max date) must miss the cache."""
+        import pytest
+        from sqlalchemy.exc import OperationalError
+        from config.database import engine
+        try:
+            conn = engine.connect()
+        except OperationalError:
+            pytest.skip("no PostgreSQL available")
+        with conn:
+            # Session-local stand-in for news: a temp table shadows the real one
+            conn.exec_driver_sql("CREATE TEMP TABLE news (date DATE, headline TEXT, sentiment_score FLOAT)")
+            conn.exec_driver_sql("INSERT INTO news VALUES ('2024-09-30', 'a', NULL), ('2024-09-30', 'b', NULL)")
+            conn.commit()
+            before = dataset_cache.source_fingerprint(conn)
+            conn.exec_driver_sql("UPDATE news SET sentiment_score = 0.4 WHERE headline = 'a'")
+            conn.commit()
+            after = dataset_cache.source_fingerprint(conn)
+            conn.exec_driver_sql("DROP TABLE news")
+            conn.commit()
+
+        assert before["news"][:2] == after["news"][:2]  # count and max date unchanged
+        assert dataset_cache.dataset_key(before) != dataset_cache.dataset_key(after)
@@ -0,0 +1,129 @@
+"""
+tests/test_dmatrix_cache.py
+Tests for the quantize-once dataset layer: views, split, caching and params.
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import pandas as pd
+import numpy as np
+from sklearn.model_selection import train_test_split
+from model.dmatrix_cache import QuantizedDataset, ShardedDataset, booster_params, fit_booster
+from model.prepare_dataset import write_shards
+
+
+def _dataset(n=403):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(n, 4)), columns=["f0", "f1", "f2", "f3"])
+    df["target_class"] = (df["f0"] + rng.normal(0, 0.5, n) > 0).astype(np.int8)
+    return df
+
+
+class TestQuantizedDataset:
+    def test_rows_are_views_not_copies(self):
+        data = QuantizedDataset(_dataset(), ["f0", "f1", "f2", "f3"])
+        X, y = data.rows(10, 50)
+        assert np.shares_memory(X, data.X) and np.shares_memory(y, data.y)
+        assert X.dtype == np.float32 and X.shape == (40, 4)
+
+    def test_split_matches_unshuffled_train_test_split(self):
+        df = _dataset()
+        data = QuantizedDataset(df, ["f0", "f1", "f2", "f3"])
+        (a, b), (c, d) = data.split(test_size=0.2)
+        X_train, X_test = train_test_split(df, test_size=0.2, shuffle=False)
+        assert (b - a, d - c) == (len(X_train), len(X_test))
+
+    def test_range_matrices_are_built_once(self):
+        data = QuantizedDataset(_dataset(), ["f0", "f1", "f2", "f3"])
+        assert data.dmatrix(0, 300) is data.dmatrix(0, 300)
+        assert data.dmatrix(0, 300).num_row() == 300
+        assert data.dmatrix(0, 300).feature_names == ["f0", "f1", "f2", "f3"]
+
+    def test_booster_learns_and_keeps_feature_names(self):
+        data = QuantizedDataset(_dataset(), ["f0", "f1", "f2", "f3"])
+        booster = fit_booster({"objective": "binary:logistic", "n_estimators": 20, "max_depth": 2,
+                               "random_state": 0, "n_jobs": -1}, data.dmatrix(0, 300))
+        preds = booster.predict(data.dmatrix(300, len(data), ref=(0, 300))) > 0.5
+        assert (preds == data.y[300:]).mean() > 0.7
+        assert booster.feature_names == ["f0", "f1", "f2", "f3"]
+
+    def test_training_cut_points_ignore_later_rows(self):
+        df = _dataset()
+        shifted = df.copy()
+        shifted.loc[300:, ["f0", "f1", "f2", "f3"]] += 100.0
+        a = QuantizedDataset(df, ["f0", "f1", "f2", "f3"]).dmatrix(0, 300).get_quantile_cut()
+        b = QuantizedDataset(shifted, ["f0", "f1", "f2", "f3"]).dmatrix(0, 300).get_quantile_cut()
+        for x, y in zip(a, b):
+            np.testing.assert_array_equal(x, y)
+
+    def test_test_rows_are_binned_with_the_training_cut_points(self):
+        data = QuantizedDataset(_dataset(), ["f0", "f1", "f2", "f3"])
+        dtest = data.dmatrix(300, len(data), ref=(0, 300))
+        assert dtest is data.dmatrix(300, len(data), ref=(0, 300))
+        assert data.dmatrix(0, 300, ref=(0, 300)) is data.dmatrix(0, 300)
+        booster = fit_booster({"objective": "binary:logistic", "n_estimators": 20, "max_depth": 2,
+                               "random_state": 0}, data.dmatrix(0, 300))
+        # Same scores as the raw (unbinned) rows
+        np.testing.assert_allclose(data.predict(booster, 300, len(data), ref=(0, 300)),
+                                   data.predict(booster, 300, len(data)), rtol=1e-6)
+
+    def test_save_and_memory_mapped_load_round_trip(self, tmp_path):
+        data = QuantizedDataset(_dataset(), ["f0", "f1", "f2", "f3"])
+        data.save(str(tmp_path))
+        loaded = QuantizedDataset.load(str(tmp_path), mmap=True)
+        assert isinstance(loaded.X, np.memmap) and not loaded.X.flags.writeable
+        np.testing.assert_array_equal(loaded.X, data.X)
+        np.testing.assert_array_equal(loaded.y, data.y)
+        assert loaded.feature_cols == data.feature_cols
+        params = {"objective": "binary:logistic", "n_estimators": 10, "random_state": 0}
+        a = fit_booster(params, data.dmatrix(0, 300)).predict(data.dmatrix(300, len(data), ref=(0, 300)))
+        b = fit_booster(params, loaded.dmatrix(0, 300)).predict(loaded.dmatrix(300, len(loaded), ref=(0, 300)))
+        np.testing.assert_array_equal(a, b)
+
+    def test_eval_matrix_is_accepted_by_train_evals(self):
+        data = QuantizedDataset(_dataset(), ["f0", "f1", "f2", "f3"])
+        log = {}
+        fit_booster({"objective": "binary:logistic", "n_estimators": 5, "eval_metric": "error"},
+                    data.dmatrix(0, 300), evals=[(data.eval_dmatrix(300, len(data)), "valid")],
+                    evals_result=log, verbose_eval=False)
+        assert data.eval_dmatrix(300, len(data)) is data.eval_dmatrix(300, len(data))
+        assert len(log["valid"]["error"]) == 5
+
+class TestShardedDataset:
+    def _shards(self, tmp_path, df, rows_per_shard=100):
+        chunks = (df.iloc[i:i + rows_per_shard] for i in range(0, len(df), rows_per_shard))
+        shard_dir = str(tmp_path / "shards")
+        manifest = write_shards(chunks, shard_dir)
+        return shard_dir, manifest
+
+    def test_manifest_and_split_match_in_memory(self, tmp_path):
+        df = _dataset()
+        shard_dir, manifest = self._shards(tmp_path, df)
+        assert manifest["rows"] == len(df) and len(manifest["shards"]) == 5
+        sharded = ShardedDataset(shard_dir, ["f0", "f1", "f2", "f3"])
+        in_memory = QuantizedDataset(df, ["f0", "f1", "f2", "f3"])
+        assert sharded.split() == in_memory.split()
+        # A range crossing shard boundaries reads exactly those rows
+        np.testing.assert_array_equal(sharded.labels(150, 330), in_memory.labels(150, 330))
+
+    def test_external_memory_training(self, tmp_path):
+        shard_dir, _ = self._shards(tmp_path, _dataset())
+        data = ShardedDataset(shard_dir, ["f0", "f1", "f2", "f3"])
+        train, test = data.split()
+        booster = fit_booster({"objective": "binary:logistic", "n_estimators": 20, "max_depth": 2},
+                              data.dmatrix(*train))
+        assert data.dmatrix(*train).num_row() == train[1]
+        preds = data.predict(booster, *test) > 0.5
+        assert len(preds) == test[1] - test[0]
+        assert (preds == data.labels(*test)).mean() > 0.7
+        data.close()
+        assert not os.path.exists(data.cache_dir)
+
+
+class TestBoosterParams:
+    def test_sklearn_names_are_translated(self):
+        native, rounds = booster_params({"n_estimators": 300, "random_state": 42, "n_jobs": -1,
+                                         "max_depth": 4, "max_bin": None})
+        assert rounds == 300
+        assert native == {"seed": 42, "max_depth": 4}
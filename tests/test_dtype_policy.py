@@ -0,0 +1,50 @@
+"""
+tests/test_dtype_policy.py
+Tests for the compact training-panel dtypes: casts, day numbers and idempotence.
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import pandas as pd
+import numpy as np
+from model.dtype_policy import apply_dtype_policy, from_day_numbers, to_day_numbers
+
+
+def _dataset(n=50):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "stock_id": np.repeat([1, 2], n // 2),
+        "date": np.tile(pd.bdate_range("2024-01-01", periods=n // 2), 2),
+        "rsi_14": rng.uniform(0, 100, n),
+        "^NSEI_ret": rng.normal(0, 0.01, n),
+        "target_class": rng.integers(0, 2, n),
+    })
+
+
+class TestDtypePolicy:
+    def test_schema_dtypes_and_smaller_frame(self):
+        df = _dataset()
+        compact = apply_dtype_policy(df)
+        assert compact["stock_id"].dtype == np.int16
+        assert compact["date"].dtype == np.int32
+        assert compact["target_class"].dtype == np.int8
+        assert compact["rsi_14"].dtype == np.float32
+        assert compact.memory_usage(deep=True).sum() < df.memory_usage(deep=True).sum() / 1.8
+        np.testing.assert_array_equal(compact["rsi_14"], df["rsi_14"].astype(np.float32))
+
+    def test_day_numbers_round_trip(self):
+        dates = pd.to_datetime(["1999-12-31", "2024-02-29", "2031-06-01"])
+        days = to_day_numbers(dates)
+        assert days.dtype == np.int32
+        assert (from_day_numbers(days) == dates).all()
+
+    def test_policy_is_idempotent(self):
+        once = apply_dtype_policy(_dataset())
+        twice = apply_dtype_policy(once)
+        pd.testing.assert_frame_equal(once, twice)
+
+    def test_wide_stock_ids_fall_back_to_int32(self):
+        df = _dataset()
+        df.loc[0, "stock_id"] = 40_000
+        assert apply_dtype_policy(df)["stock_id"].dtype == np.int32
@@ -0,0 +1,180 @@
+"""
+tests/test_feature_cache.py
+Unit tests for the API's in-process latest-feature cache and its daily
+signal snapshot (api/feature_cache.py), with a mocked database.
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from api.feature_cache import LatestFeatureCache
+
+FEATURES = ["rsi_14", "^NSEI_ret", "obv"]
+
+
+def latest_rows(rsi=(30.0, 70.0)):
+    return pd.DataFrame({
+        "symbol": ["TCS", "INFY"],
+        "stock_id": [1, 2],
+        "date": [date(2024, 9, 30), date(2024, 9, 30)],
+        "rsi_14": list(rsi),
+        "macro_nifty_50_ret": [0.01, -0.02],
+        "sentiment_score": [0.2, None],
+    })
+
+
+def daily_signals(day=date(2024, 9, 30)):
+    return pd.DataFrame({"stock_id": [1], "date": [day], "predicted_class": ["Sell"], "probability": [0.25]})
+
+
+@pytest.fixture
+def db():
+    """
+    Mocked engine: db.watermark is what the (feature_store, daily_signals)
+    max(created_at) poll returns; db.latest / db.signals are the frames the
+    latest-features and daily_signals queries return; db.signals_table is
+    whether daily_signals exists. db.queries records the executed SQL.
+    """
+    engine = MagicMock()
+    conn = engine.connect.return_value.__enter__.return_value
+    engine.queries = []
+
+    def execute(query):
+        engine.queries.append(str(query))
+        if "to_regclass" in str(query):
+            return MagicMock(scalar=lambda: engine.signals_table)
+        return MagicMock(one=lambda: engine.watermark)
+    conn.execute.side_effect = execute
+    engine.watermark = (datetime(2024, 9, 30, 20, 0), None)
+    engine.signals_table = True
+    engine.latest, engine.signals = latest_rows(), daily_signals().iloc[:0]
+    with patch("api.feature_cache.pd.read_sql") as read_sql:
+        read_sql.side_effect = lambda query, conn, params=None: (
+            engine.signals if "daily_signals" in str(query) else engine.latest)
+        engine.read_sql = read_sql
+        yield engine
+
+
+# -------------------------------------------------------------------
+# Matrix + index
+# -------------------------------------------------------------------
+class TestLookup:
+    def test_rows_are_float32_in_model_feature_order(self, db):
+        cache = LatestFeatureCache(db)
+        cache.refresh(FEATURES)
+        entry = cache.get("INFY")
+        assert entry["features"].dtype == np.float32
+        assert entry["features"].shape == (1, 3)
+        # macro_* renamed to the model name; missing model features filled with 0
+        np.testing.assert_allclose(entry["features"][0], [70.0, -0.02, 0.0], rtol=1e-6)
+        assert entry["stock_id"] == 2
+        assert entry["rsi"] == 70.0
+        assert entry["sentiment"] == 0.0
+
+    def test_hit_ratio_counts_lookups(self, db):
+        cache = LatestFeatureCache(db)
+        cache.refresh(FEATURES)
+        cache.get("TCS"), cache.get("TCS"), cache.get("WIPRO")
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["rows"]) == (2, 1, 2)
+        assert stats["hit_ratio"] == pytest.approx(2 / 3, abs=1e-4)
+        assert stats["staleness_s"] is not None
+
+    def test_empty_cache_misses(self, db):
+        cache = LatestFeatureCache(db)
+        assert cache.get("TCS") is None
+        assert cache.stats()["rows"] == 0
+
+
+# -------------------------------------------------------------------
+# Version-based invalidation
+# -------------------------------------------------------------------
+class TestRefresh:
+    def test_no_poll_within_refresh_interval(self, db):
+        cache = LatestFeatureCache(db, refresh_seconds=60)
+        assert cache.refresh(FEATURES)
+        db.watermark = (datetime(2024, 10, 1, 20, 0), None)
+        assert not cache.refresh(FEATURES)
+        assert db.connect.call_count == 1
+
+    def test_reloads_only_when_watermark_moves(self, db):
+        cache = LatestFeatureCache(db, refresh_seconds=0)
+        cache.refresh(FEATURES)
+        assert not cache.refresh(FEATURES)
+        assert db.read_sql.call_count == 1
+
+        db.watermark = (datetime(2024, 10, 1, 20, 0), None)
+        db.latest = latest_rows(rsi=(45.0, 55.0))
+        assert cache.refresh(FEATURES)
+        assert cache.get("TCS")["rsi"] == 45.0
+        assert cache.stats()["refreshes"] == 2
+
+    def test_model_feature_change_rebuilds_matrix(self, db):
+        cache = LatestFeatureCache(db, refresh_seconds=60)
+        cache.refresh(FEATURES)
+        assert cache.refresh(["^NSEI_ret", "rsi_14"])
+        np.testing.assert_allclose(cache.get("TCS")["features"][0], [0.01, 30.0], rtol=1e-6)
+
+
+# -------------------------------------------------------------------
+# Daily signal snapshot
+# -------------------------------------------------------------------
+class TestDailySignals:
+    def test_signal_served_for_same_date_and_model(self, db):
+        db.signals = daily_signals()
+        cache = LatestFeatureCache(db)
+        cache.refresh(FEATURES, "v1")
+        assert cache.get("TCS")["probability"] == 0.25
+        assert cache.get("TCS")["prediction"] == "Sell"
+        # No signal for INFY: scored live from the cached features
+        assert cache.get("INFY")["probability"] is None
+        stats = cache.stats()
+        assert stats["signal_rows"] == 1
+        assert stats["signal_hit_ratio"] == pytest.approx(2 / 3, abs=1e-4)
+
+    def test_signal_for_older_date_is_ignored(self, db):
+        db.signals = daily_signals(day=date(2024, 9, 27))
+        cache = LatestFeatureCache(db)
+        cache.refresh(FEATURES, "v1")
+        assert cache.get("TCS")["probability"] is None
+
+    def test_new_signals_or_model_trigger_reload(self, db):
+        cache = LatestFeatureCache(db, refresh_seconds=0)
+        cache.refresh(FEATURES, "v1")
+        assert cache.get("TCS")["probability"] is None
+
+        # Scoring stage ran: daily_signals watermark moves
+        db.signals = daily_signals()
+        db.watermark = (db.watermark[0], datetime(2024, 9, 30, 20, 5))
+        assert cache.refresh(FEATURES, "v1")
+        assert cache.get("TCS")["probability"] == 0.25
+
+        # New model deployed: reload even though no watermark moved
+        assert cache.refresh(FEATURES, "v2")
+        queries = [c.kwargs.get("params") for c in db.read_sql.call_args_list if c.kwargs.get("params")]
+        assert queries[-1]["version"] == "v2"
+
+    def test_missing_signals_table_scores_live_until_created(self, db):
+        db.signals_table = False
+        db.signals = daily_signals()
+        cache = LatestFeatureCache(db, refresh_seconds=0)
+        assert cache.refresh(FEATURES, "v1")
+        assert cache.get("TCS")["probability"] is None
+        assert not any("daily_signals" in q and "to_regclass" not in q for q in db.queries)
+        assert not any("daily_signals" in str(c.args[0]) for c in db.read_sql.call_args_list)
+
+        # Created by the scoring stage: picked up on the next poll, then no longer checked
+        db.signals_table = True
+        db.watermark = (db.watermark[0], datetime(2024, 9, 30, 21, 0))
+        assert cache.refresh(FEATURES, "v1")
+        assert cache.get("TCS")["probability"] == 0.25
+        checks = sum("to_regclass" in q for q in db.queries)
+        cache.refresh(FEATURES, "v1")
+        assert sum("to_regclass" in q for q in db.queries) == checks
@@ -101,3 +101,147 @@ class TestCalculateTechnicals:
         df = _make_price_df().sample(frac=1, random_state=99)  # shuffle
         result = calculate_technicals(df)
         assert result["date"].is_monotonic_increasing, "Output should be sorted by date"
+
+
+# -------------------------------------------------------------------
+# Panel Engine Tests
+# -------------------------------------------------------------------
+def _make_panel_df():
+    """Three stocks of different lengths, shuffled, with a gap and a flat day."""
+    frames = []
+    for stock_id, n in [(3, 120), (1, 80), (7, 30)]:
+        df = _make_price_df(n)
+        df["stock_id"] = stock_id
+        frames.append(df)
+    panel = pd.concat(frames, ignore_index=True)
+    panel.loc[panel.index[10], "close"] = np.nan
+    panel.loc[panel.index[21], "close"] = panel["close"].iloc[20]
+    return panel.sample(frac=1, random_state=7)
+
+
+class TestPanelEngine:
+    def test_matches_per_stock_calculate_technicals(self):
+        from feature_engineering.panel import calculate_technicals_panel
+        df = _make_panel_df()
+        expected = pd.concat(
+            [calculate_technicals(g) for _, g in df.groupby("stock_id")]
+        ).reset_index(drop=True)
+        result = calculate_technicals_panel(df)
+
+        assert list(result.columns) == list(expected.columns)
+        assert (result["date"].values == expected["date"].values).all()
+        numeric = [c for c in expected.columns if c != "date"]
+        np.testing.assert_allclose(
+            result[numeric].to_numpy(float), expected[numeric].to_numpy(float),
+            rtol=1e-9, atol=1e-12, equal_nan=True,
+        )
+
+    def test_windows_do_not_cross_stock_boundaries(self):
+        from feature_engineering.panel import calculate_technicals_panel
+        result = calculate_technicals_panel(_make_panel_df())
+        first_rows = result.groupby("stock_id").head(1)
+        assert first_rows["return_1d"].isna().all()
+        assert (first_rows["obv"] == 0).all()
+        assert result.groupby("stock_id").head(19)["sma_20"].isna().all()
+
+    def test_workers_match_single_process_exactly(self):
+        from feature_engineering.panel import calculate_technicals_panel
+        df = _make_panel_df()
+        timings = []
+        single = calculate_technicals_panel(df)
+        sharded = calculate_technicals_panel(df, workers=2, timings=timings)
+
+        pd.testing.assert_frame_equal(sharded, single, check_exact=True)
+        assert [t["shard"] for t in timings] == [0, 1]
+        assert sum(t["rows"] for t in timings) == len(df)
+
+    def test_small_inputs_stay_in_process(self, monkeypatch):
+        from feature_engineering import build_features
+        monkeypatch.setattr(build_features, "MIN_ROWS_PER_WORKER", 100)
+        df = _make_panel_df()
+        used = []
+        monkeypatch.setattr(build_features, "calculate_technicals_panel",
+                            lambda df, obv_initial=None, workers=1, timings=None: used.append(workers) or df)
+        build_features.compute_panel(df, workers=8)
+        build_features.compute_panel(df.iloc[:150], workers=8)
+        # One shard per MIN_ROWS_PER_WORKER rows, capped by workers
+        assert used == [min(8, len(df) // 100), 1]
+
+
+# -------------------------------------------------------------------
+# Streaming build: stock-aligned chunking
+# -------------------------------------------------------------------
+class TestStockAlignedChunks:
+    def test_chunks_hold_complete_stocks_in_order(self):
+        from feature_engineering.build_features import stock_aligned_chunks
+        df = _make_panel_df().sort_values(["stock_id", "date"]).reset_index(drop=True)
+        raw = [df.iloc[i:i + 70] for i in range(0, len(df), 70)]
+        chunks = list(stock_aligned_chunks(raw))
+
+        pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), df)
+        seen = [set(c["stock_id"]) for c in chunks]
+        for a, b in zip(seen, seen[1:]):
+            assert not a & b
+
+
+# -------------------------------------------------------------------
+# Macro Feature Tests
+# -------------------------------------------------------------------
+class TestMacroFeatures:
+    def _pivot(self):
+        dates = pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-05"])
+        return pd.DataFrame({
+            "^NSEI": [100.0, 101.0, 99.0, 99.99],
+            "CL=F": [70.0, np.nan, 77.0, 70.0],
+        }, index=pd.Index(dates, name="date"))
+
+    def test_returns_and_benchmark_close(self):
+        from feature_engineering.macro import macro_returns
+        macro = macro_returns(self._pivot())
+        assert list(macro.columns) == ["date", "^NSEI_ret", "CL=F_ret", "index_close_today"]
+        np.testing.assert_allclose(macro["^NSEI_ret"].iloc[1:], [0.01, 99 / 101 - 1, 0.01])
+        assert (macro["index_close_today"] == self._pivot()["^NSEI"].to_numpy()).all()
+
+    def test_as_of_matches_merge_then_ffill(self):
+        from feature_engineering.macro import macro_returns, macro_as_of
+        macro = macro_returns(self._pivot())
+        dates = pd.to_datetime(["2024-01-04", "2024-01-02", "2024-01-05"])
+        result = macro_as_of(macro, dates)
+
+        # build_dataset: merge on date over the sorted date range, then ffill
+        expected = pd.merge(pd.DataFrame({"date": pd.date_range("2024-01-01", "2024-01-05")}),
+                            macro, on="date", how="left").ffill().set_index("date").loc[dates]
+        assert (result["date"].to_numpy() == dates.to_numpy()).all()
+        np.testing.assert_array_equal(result["CL=F_ret"].to_numpy(), expected["CL=F_ret"].to_numpy())
+        np.testing.assert_array_equal(result["^NSEI_ret"].to_numpy(), expected["^NSEI_ret"].to_numpy())
+
+
+# -------------------------------------------------------------------
+# As-of Join Tests
+# -------------------------------------------------------------------
+class TestAsOfJoin:
+    def test_sentiment_carries_forward_within_max_age(self):
+        from feature_engineering.asof import sentiment_as_of
+        sent = pd.DataFrame({"date": pd.to_datetime(["2024-01-06", "2024-01-10"]),
+                             "daily_sentiment": [0.5, -0.2]})
+        dates = pd.to_datetime(["2024-01-05", "2024-01-08", "2024-01-10", "2024-01-16"])
+        result = sentiment_as_of(sent, dates, max_age_days=3)
+        # nothing yet | Saturday news on Monday | same day | older than 3 days
+        assert result["daily_sentiment"].tolist() == [0.0, 0.5, -0.2, 0.0]
+
+    def test_align_does_not_fill_across_stocks(self):
+        from feature_engineering.asof import align_to_calendar
+        df = pd.DataFrame({
+            "stock_id": [1, 2, 1, 2],
+            "date": pd.to_datetime(["2024-01-02", "2024-01-02", "2024-01-03", "2024-01-03"]),
+            "rsi_14": [55.0, np.nan, 60.0, np.nan],
+        })
+        macro = pd.DataFrame({"date": pd.to_datetime(["2024-01-01", "2024-01-03"]),
+                              "^NSEI_ret": [0.01, np.nan], "index_close_today": [100.0, 101.0]})
+        sent = pd.DataFrame({"date": pd.to_datetime([]), "daily_sentiment": []})
+        out = align_to_calendar(df, macro, sent)
+
+        assert out["rsi_14"].isna().tolist() == [False, True, False, True]
+        assert out["^NSEI_ret"].tolist() == [0.01] * 4
+        assert out["index_close_today"].tolist() == [100.0, 100.0, 101.0, 101.0]
+        assert (out["daily_sentiment"] == 0).all()
@@ -0,0 +1,84 @@
+"""
+tests/test_indicator_state.py
+Tests for the persisted indicator state: seeded from a batch build and then
+advanced bar by bar, it must emit exactly the batch features.
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import json
+import numpy as np
+import pandas as pd
+from feature_engineering.build_features import calculate_technicals
+from feature_engineering.panel import calculate_technicals_panel
+from feature_engineering.indicator_state import seed_states, features_frame, _emas_json
+
+
+# -------------------------------------------------------------------
+# Helpers
+# -------------------------------------------------------------------
+def _make_prices(stock_id, n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    close[120] = close[119]  # flat day
+    close[150] = np.nan      # missing print, forward filled
+    return pd.DataFrame({
+        "stock_id": stock_id,
+        "date": pd.date_range("2022-01-03", periods=n, freq="B"),
+        "close": close,
+        "open": close - 0.5,
+        "volume": rng.integers(100000, 500000, n).astype(float),
+    })
+
+
+FEATURE_COLS = [
+    "return_1d", "return_5d", "return_20d", "sma_20", "sma_50", "ema_20", "rsi_14",
+    "volatility_20d", "macd", "macd_signal", "macd_hist", "volume_ratio", "obv",
+    "obv_ma", "price_to_sma20",
+]
+
+
+# -------------------------------------------------------------------
+# State updates vs batch computation
+# -------------------------------------------------------------------
+class TestIndicatorState:
+    def test_bar_by_bar_updates_match_batch(self):
+        prices = pd.concat([_make_prices(1, seed=1), _make_prices(2, 180, seed=2)], ignore_index=True)
+        seed_cut = prices["date"] < pd.Timestamp("2022-05-02")
+        states = seed_states(calculate_technicals_panel(prices[seed_cut]))
+
+        for sid, group in prices[~seed_cut].groupby("stock_id"):
+            expected = calculate_technicals(prices[prices["stock_id"] == sid])
+            for _, bar in group.iterrows():
+                states[sid].update(bar["date"], bar["close"], bar["volume"])
+                row = expected[expected["date"] == bar["date"]].iloc[0]
+                feats = states[sid].features()
+                for col in FEATURE_COLS:
+                    assert feats[col] == row[col], (sid, bar["date"], col)
+
+    def test_state_keeps_fixed_size_buffers(self):
+        states = seed_states(calculate_technicals_panel(_make_prices(1)))
+        state = states[1]
+        for i in range(100):
+            state.update(state.date + pd.Timedelta(days=1), 100.0 + i, 1000.0)
+        assert len(state.volumes) == len(state.obvs) == 20
+        assert len(state.closes) <= 60
+
+    def test_emas_json_round_trips_exactly(self):
+        emas = {"ema_12": 1 / 3, "ema_26": 123.456789012345678, "macd_signal": float("nan")}
+        loaded = json.loads(_emas_json(emas))
+        assert loaded["ema_12"] == emas["ema_12"]
+        assert loaded["ema_26"] == emas["ema_26"]
+        assert loaded["macd_signal"] is None
+
+    def test_batch_frame_matches_per_state_features(self):
+        prices = pd.concat([_make_prices(1, seed=1), _make_prices(2, seed=2).head(40)], ignore_index=True)
+        states = seed_states(calculate_technicals_panel(prices))
+        frame = features_frame(states.values()).set_index("stock_id")
+
+        for sid, state in states.items():
+            feats = state.features()
+            assert frame.loc[sid, "date"] == state.date
+            for col in FEATURE_COLS:
+                np.testing.assert_equal(frame.loc[sid, col], feats[col])
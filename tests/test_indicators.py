@@ -0,0 +1,127 @@
+"""
+tests/test_indicators.py
+Parity tests: indicator kernels (both backends) vs the original pandas formulas.
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+import pandas as pd
+import numpy as np
+from feature_engineering import indicators as ind
+from feature_engineering.build_features import calculate_technicals
+
+
+# -------------------------------------------------------------------
+# Helpers
+# -------------------------------------------------------------------
+def _make_close_volume(n=150, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    close[30] = close[29]  # flat day (OBV unchanged)
+    volume = rng.integers(100000, 500000, n).astype(float)
+    return pd.Series(close), pd.Series(volume)
+
+
+def _pandas_obv(close, volume):
+    """The row-by-row loop calculate_technicals used before the kernel."""
+    obv = [0]
+    for i in range(1, len(close)):
+        if close.iloc[i] > close.iloc[i - 1]:
+            obv.append(obv[-1] + volume.iloc[i])
+        elif close.iloc[i] < close.iloc[i - 1]:
+            obv.append(obv[-1] - volume.iloc[i])
+        else:
+            obv.append(obv[-1])
+    return pd.Series(obv, dtype=float)
+
+
+def _pandas_rsi(close, window):
+    delta = close.diff()
+    avg_gain = delta.clip(lower=0).rolling(window).mean()
+    avg_loss = (-delta.clip(upper=0)).rolling(window).mean()
+    return 100 - (100 / (1 + avg_gain / avg_loss))
+
+
+def _assert_close(actual, expected):
+    np.testing.assert_allclose(actual, np.asarray(expected, dtype=float),
+                               rtol=1e-10, atol=1e-12, equal_nan=True)
+
+
+BACKENDS = ["numpy"] + (["numba"] if ind.numba is not None else [])
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    """Runs a test once per available kernel backend."""
+    for name in ["rolling_mean", "rolling_std", "ema", "obv"]:
+        monkeypatch.setattr(ind, f"_{name}_impl", getattr(ind, f"_{name}_{request.param}"))
+    return request.param
+
+
+# -------------------------------------------------------------------
+# Kernel vs pandas
+# -------------------------------------------------------------------
+class TestKernelParity:
+    def test_obv_matches_loop(self, backend):
+        close, volume = _make_close_volume()
+        np.testing.assert_array_equal(ind.obv(close, volume), _pandas_obv(close, volume))
+
+    def test_ema_matches_ewm(self, backend):
+        close, _ = _make_close_volume()
+        for span in [9, 12, 20, 26]:
+            _assert_close(ind.ema(close, span), close.ewm(span=span, adjust=False).mean())
+
+    def test_rolling_mean_and_std(self, backend):
+        close, _ = _make_close_volume()
+        returns = close.pct_change()
+        _assert_close(ind.rolling_mean(close, 20), close.rolling(20).mean())
+        _assert_close(ind.rolling_std(returns, 20), returns.rolling(20).std())
+
+    def test_rsi_matches_rolling_formula(self, backend):
+        close, _ = _make_close_volume()
+        _assert_close(ind.rsi(close, 14), _pandas_rsi(close, 14))
+
+    def test_macd_matches_ewm(self, backend):
+        close, _ = _make_close_volume()
+        line = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+        signal = line.ewm(span=9, adjust=False).mean()
+        macd, macd_signal, macd_hist = ind.macd(close)
+        _assert_close(macd, line)
+        _assert_close(macd_signal, signal)
+        _assert_close(macd_hist, line - signal)
+
+    def test_segments_restart_every_kernel(self, backend):
+        a, va = _make_close_volume(60, seed=1)
+        b, vb = _make_close_volume(40, seed=2)
+        close = pd.concat([a, b], ignore_index=True)
+        volume = pd.concat([va, vb], ignore_index=True)
+        starts = np.array([0, 60])
+        _assert_close(ind.ema(close, 20, starts)[60:], b.ewm(span=20, adjust=False).mean())
+        _assert_close(ind.rolling_mean(close, 20, starts)[60:], b.rolling(20).mean())
+        np.testing.assert_array_equal(ind.obv(close, volume, starts)[60:], _pandas_obv(b, vb))
+
+    def test_obv_resumes_from_initial(self, backend):
+        close, volume = _make_close_volume()
+        full = ind.obv(close, volume)
+        resumed = ind.obv(close[100:], volume[100:], initial=[full[100]])
+        np.testing.assert_array_equal(resumed, full[100:])
+
+
+class TestCalculateTechnicalsParity:
+    def test_matches_original_pandas_recipe(self):
+        close, volume = _make_close_volume()
+        df = pd.DataFrame({
+            "date": pd.date_range("2022-01-01", periods=len(close), freq="B"),
+            "close": close, "open": close - 0.5, "volume": volume,
+        })
+        result = calculate_technicals(df)
+
+        _assert_close(result["return_5d"], close.pct_change(5))
+        _assert_close(result["sma_50"], close.rolling(50).mean())
+        _assert_close(result["ema_20"], close.ewm(span=20, adjust=False).mean())
+        _assert_close(result["rsi_14"], _pandas_rsi(close, 14))
+        _assert_close(result["volatility_20d"], close.pct_change().rolling(20).std())
+        _assert_close(result["volume_ratio"], volume / volume.rolling(20).mean())
+        _assert_close(result["obv_ma"], _pandas_obv(close, volume).rolling(20).mean())
@@ -0,0 +1,132 @@
+"""
+tests/test_log_writer.py
+Unit tests for the API's background prediction_logs writer
+(api/log_writer.py), with a mocked database.
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import threading
+import time
+from datetime import date
+from unittest.mock import MagicMock
+
+import pytest
+
+from api.log_writer import PredictionLogWriter
+
+
+def row(stock_id=1):
+    return {"stock_id": stock_id, "prediction_date": date(2024, 9, 30), "predicted_class": "Buy",
+            "probability": 0.7, "model_version": "v1"}
+
+
+@pytest.fixture
+def db():
+    """Mocked engine recording the stock_ids of every INSERT; db.fail makes writes raise."""
+    engine = MagicMock()
+    engine.batches, engine.fail = [], 0
+    conn = engine.begin.return_value.__enter__.return_value
+
+    def execute(query, params):
+        if engine.fail:
+            engine.fail -= 1
+            raise RuntimeError("database unavailable")
+        engine.batches.append(params["stock_ids"])
+    conn.execute.side_effect = execute
+    return engine
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+# -------------------------------------------------------------------
+# Batching
+# -------------------------------------------------------------------
+class TestFlush:
+    def test_flushes_when_batch_is_full(self, db):
+        writer = PredictionLogWriter(db, batch_size=3, flush_interval_ms=10_000)
+        for i in range(3):
+            writer.submit(row(i))
+        writer.start()
+        wait_for(lambda: writer.stats()["written"] == 3)
+        assert db.batches == [[0, 1, 2]]
+        writer.close()
+
+    def test_flushes_partial_batch_after_interval(self, db):
+        writer = PredictionLogWriter(db, batch_size=100, flush_interval_ms=20)
+        writer.start()
+        writer.submit(row(1)), writer.submit(row(2))
+        wait_for(lambda: writer.stats()["written"] == 2)
+        assert db.batches == [[1, 2]]
+        stats = writer.stats()
+        assert (stats["batches"], stats["queue_depth"]) == (1, 0)
+        assert stats["last_flush_ms"] is not None
+        writer.close()
+
+    def test_close_flushes_queued_rows(self, db):
+        writer = PredictionLogWriter(db, batch_size=2, flush_interval_ms=10_000)
+        writer.start()
+        for i in range(5):
+            writer.submit(row(i))
+        writer.close(timeout=5)
+        assert sorted(s for batch in db.batches for s in batch) == [0, 1, 2, 3, 4]
+        assert not writer.submit(row(9))  # closed: no longer accepting rows
+        assert writer.stats()["running"] is False
+
+
+# -------------------------------------------------------------------
+# Full queue / slow database
+# -------------------------------------------------------------------
+class TestBackpressure:
+    def test_drop_policy_discards_when_full(self, db):
+        writer = PredictionLogWriter(db, queue_size=2, policy="drop")
+        assert writer.submit(row(1)) and writer.submit(row(2))
+        assert not writer.submit(row(3))
+        stats = writer.stats()
+        assert (stats["queue_depth"], stats["submitted"], stats["dropped"]) == (2, 2, 1)
+
+    def test_block_policy_waits_for_space(self, db):
+        writer = PredictionLogWriter(db, queue_size=1, policy="block", block_timeout_ms=2000)
+        writer.submit(row(1))
+        # Space frees up while the request is blocked: the row is accepted
+        threading.Timer(0.05, writer._queue.get_nowait).start()
+        assert writer.submit(row(2))
+        assert writer.stats()["dropped"] == 0
+
+    def test_block_policy_drops_after_timeout(self, db):
+        writer = PredictionLogWriter(db, queue_size=1, policy="block", block_timeout_ms=20)
+        writer.submit(row(1))
+        start = time.monotonic()
+        assert not writer.submit(row(2))
+        assert time.monotonic() - start >= 0.02
+        assert writer.stats()["dropped"] == 1
+
+    def test_unknown_policy_rejected(self, db):
+        with pytest.raises(ValueError):
+            PredictionLogWriter(db, policy="ignore")
+
+    def test_failed_flush_is_retried(self, db):
+        db.fail = 1
+        writer = PredictionLogWriter(db, flush_interval_ms=10)
+        writer.start()
+        writer.submit(row(1))
+        wait_for(lambda: writer.stats()["written"] == 1)
+        assert db.batches == [[1]]
+        assert writer.stats()["failed_flushes"] == 1
+        writer.close()
+
+    def test_unwritable_rows_dropped_at_shutdown_deadline(self, db):
+        db.fail = 10**6
+        writer = PredictionLogWriter(db, flush_interval_ms=10)
+        writer.start()
+        writer.submit(row(1))
+        wait_for(lambda: writer.stats()["failed_flushes"] >= 1)
+        writer.close(timeout=0.2)
+        stats = writer.stats()
+        assert (stats["written"], stats["dropped"], stats["running"]) == (0, 1, False)
@@ -0,0 +1,100 @@
+"""
+tests/test_registry.py
+Tests for the model registry: manifest, current pointer, checksum, retention and legacy import.
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+import xgboost as xgb
+from model import registry
+
+
+def _booster(n_estimators=5, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(200, 3)).astype(np.float32)
+    y = (X[:, 0] > 0).astype(int)
+    dtrain = xgb.DMatrix(X, y, feature_names=["f0", "f1", "f2"])
+    return xgb.train({"objective": "binary:logistic", "seed": seed}, dtrain, n_estimators), X
+
+
+def _register(tmp_path, minutes=0, **kw):
+    booster, _ = _booster()
+    return registry.register(booster, {"accuracy": 0.6}, {"max_depth": 6}, train_cutoff="2024-09-23",
+                             registry_dir=str(tmp_path), created_at=datetime(2026, 1, 1) + timedelta(minutes=minutes),
+                             **kw)
+
+
+# ----------------------------------------------------------
+# Register / promote / load
+# ----------------------------------------------------------
+class TestRegistry:
+    def test_manifest_records_metadata_and_checksum(self, tmp_path):
+        version = _register(tmp_path)
+        manifest = registry.load_manifest(registry_dir=str(tmp_path))
+        assert manifest["version"] == version == registry.current_version(str(tmp_path))
+        assert manifest["features"] == ["f0", "f1", "f2"]
+        assert manifest["train_cutoff"] == "2024-09-23" and manifest["n_trees"] == 5
+        assert manifest["metrics"] == {"accuracy": 0.6}
+        assert manifest["artifact"].endswith(".ubj") and len(manifest["sha256"]) == 64
+
+    def test_ubj_classifier_predicts_like_the_booster(self, tmp_path):
+        booster, X = _booster()
+        version = registry.register(booster, {}, {}, registry_dir=str(tmp_path))
+        model = registry.load_classifier(version, registry_dir=str(tmp_path))
+        np.testing.assert_array_equal(model.predict_proba(X)[:, 1],
+                                      booster.predict(xgb.DMatrix(X, feature_names=["f0", "f1", "f2"])))
+
+    def test_register_without_activate_keeps_current(self, tmp_path):
+        first = _register(tmp_path)
+        second = _register(tmp_path, minutes=1, activate=False)
+        assert registry.current_version(str(tmp_path)) == first
+        registry.promote(second, str(tmp_path))
+        assert registry.current_version(str(tmp_path)) == second
+        assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp") or f.startswith(".staging_")]
+
+    def test_promote_unknown_version_raises(self, tmp_path):
+        _register(tmp_path)
+        with pytest.raises(ValueError):
+            registry.promote("19990101_000000_000000", str(tmp_path))
+
+    def test_checksum_mismatch_is_refused(self, tmp_path):
+        version = _register(tmp_path)
+        with open(os.path.join(tmp_path, version, "model.ubj"), "ab") as f:
+            f.write(b"\0")
+        with pytest.raises(ValueError, match="Checksum"):
+            registry.load_booster(registry_dir=str(tmp_path))
+
+    def test_empty_registry_raises_file_not_found(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            registry.load_classifier(registry_dir=str(tmp_path / "registry"))
+
+
+# ----------------------------------------------------------
+# Retention and legacy import
+# ----------------------------------------------------------
+class TestRetention:
+    def test_gc_keeps_current_and_newest(self, tmp_path):
+        versions = [_register(tmp_path, minutes=k, activate=False) for k in range(6)]
+        registry.promote(versions[1], str(tmp_path))
+        removed = registry.gc(keep=2, registry_dir=str(tmp_path))
+        assert removed == [versions[0], versions[2], versions[3]]
+        assert registry.list_versions(str(tmp_path)) == [versions[1], versions[4], versions[5]]
+
+    def test_legacy_artifacts_are_imported_newest_current(self, tmp_path):
+        artifacts = tmp_path / "artifacts"
+        artifacts.mkdir()
+        for k, stamp in enumerate(["20260101_000000", "20260102_000000"]):
+            booster, _ = _booster(n_estimators=3 + k)
+            booster.save_model(str(artifacts / f"model_cls_{stamp}.json"))
+            (artifacts / f"metrics_cls_{stamp}.json").write_text(json.dumps({"accuracy": 0.5 + k / 10}))
+        registry_dir = str(tmp_path / "registry")
+        registry.import_legacy(registry_dir, str(artifacts))
+        manifest = registry.load_manifest(registry_dir=registry_dir)
+        assert len(registry.list_versions(registry_dir)) == 2
+        assert manifest["n_trees"] == 4 and manifest["metrics"] == {"accuracy": 0.6}
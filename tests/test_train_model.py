@@ -0,0 +1,131 @@
+"""
+tests/test_train_model.py
+Tests for incremental ("update") retraining: cutoff metadata, appended trees and forced full retrains.
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+import pandas as pd
+import pytest
+import model.train_model as tm
+from automation.retrain_pipeline import should_deploy
+from model import registry
+
+
+def _dataset(n_days=120, n_stocks=10, seed=0):
+    """(stock_id, date)-ordered panel like build_dataset()."""
+    rng = np.random.default_rng(seed)
+    n = n_days * n_stocks
+    df = pd.DataFrame({
+        "stock_id": np.repeat(np.arange(1, n_stocks + 1), n_days).astype(np.int16),
+        "date": np.tile(np.arange(19000, 19000 + n_days), n_stocks).astype(np.int32),
+    })
+    for k in range(3):
+        df[f"f{k}"] = rng.normal(size=n).astype(np.float32)
+    df["target_class"] = (df["f0"] + rng.normal(0, 0.5, n) > 0).astype(np.int8)
+    return df
+
+
+@pytest.fixture
+def artifacts(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "REGISTRY_DIR", str(tmp_path / "registry"))
+    monkeypatch.setattr(tm, "HISTORY_PATH", str(tmp_path / "history.csv"))
+    monkeypatch.setattr(tm, "PARAMS", {"objective": "binary:logistic", "n_estimators": 20,
+                                       "max_depth": 3, "random_state": 42})
+    monkeypatch.setattr(tm, "UPDATE_TREES", 5)
+    monkeypatch.setattr(tm, "MIN_UPDATE_ROWS", 10)
+    return tmp_path
+
+
+def _train(monkeypatch, df, mode):
+    """Trains, and returns the registered (current) booster, or None if nothing was trained."""
+    monkeypatch.setattr(tm, "build_dataset", lambda: df)
+    version = tm.train(mode=mode)
+    return registry.load_booster(version) if version else None
+
+
+# ----------------------------------------------------------
+# Update mode
+# ----------------------------------------------------------
+class TestUpdate:
+    def test_update_without_deployed_model_trains_full(self, artifacts, monkeypatch):
+        model = _train(monkeypatch, _dataset(), "update")
+        attrs = model.attributes()
+        assert model.num_boosted_rounds() == 20
+        assert attrs["train_mode"] == "full" and attrs["updates_since_full"] == "0"
+        assert attrs["train_cutoff"] == "2022-04-13"  # last training date: the latest 24 of 120 days are held out
+
+    def test_update_appends_trees_on_rows_after_cutoff(self, artifacts, monkeypatch):
+        df = _dataset()
+        _train(monkeypatch, df[df["date"] < 19100].reset_index(drop=True), "full")
+        model = _train(monkeypatch, df, "update")
+        attrs = model.attributes()
+        assert model.num_boosted_rounds() == 25
+        assert attrs["train_mode"] == "update" and attrs["updates_since_full"] == "1"
+        assert attrs["train_cutoff"] == "2022-04-13"
+        assert _train(monkeypatch, df, "update") is None  # nothing new since the cutoff
+
+    def test_cadence_forces_full_retrain(self, artifacts, monkeypatch):
+        monkeypatch.setattr(tm, "FULL_RETRAIN_EVERY", 1)
+        df = _dataset()
+        _train(monkeypatch, df[df["date"] < 19080].reset_index(drop=True), "full")
+        assert _train(monkeypatch, df[df["date"] < 19100].reset_index(drop=True), "update").num_boosted_rounds() == 25
+        model = _train(monkeypatch, df, "update")
+        assert model.num_boosted_rounds() == 20 and model.attr("train_mode") == "full"
+
+    def test_forced_full_retrain_is_deployed_within_tolerance(self, artifacts, monkeypatch):
+        # The pipeline registers candidates without promoting them
+        monkeypatch.setattr(tm, "FULL_RETRAIN_EVERY", 1)
+        df = _dataset(n_days=140)
+        _train(monkeypatch, df[df["date"] < 19080].reset_index(drop=True), "full")
+        _train(monkeypatch, df[df["date"] < 19100].reset_index(drop=True), "update")
+        monkeypatch.setattr(tm, "build_dataset", lambda: df[df["date"] < 19120].reset_index(drop=True))
+        forced = tm.train(mode="update", promote=False)
+        manifest = registry.load_manifest(forced)
+        assert manifest["train_mode"] == "full"
+
+        # Slightly worse than the deployed model: a requested full retrain is kept
+        # out, a forced one still replaces it (the deployed model can't be updated again)
+        new_acc = manifest["metrics"]["accuracy"]
+        assert should_deploy("full", new_acc + 0.01, manifest, tolerance=0.02) == (False, "no improvement")
+        assert should_deploy("update", new_acc + 0.01, manifest, tolerance=0.02)[0]
+        # ...but not below the floor
+        assert not should_deploy("update", new_acc + 0.03, manifest, tolerance=0.02)[0]
+        registry.promote(forced)
+
+        # So the next run is an update again, not another forced full retrain
+        model = _train(monkeypatch, df, "update")
+        assert model.attr("train_mode") == "update" and model.num_boosted_rounds() == 25
+
+    def test_update_weights_classes_by_training_split(self, artifacts, monkeypatch):
+        df = _dataset()
+        _train(monkeypatch, df[df["date"] < 19100].reset_index(drop=True), "full")
+        # New training rows (after the cutoff, day 19079) are almost all class 1;
+        # the weight must still reflect the whole split
+        late = df["date"] >= 19080
+        df.loc[late, "target_class"] = (df.loc[late, "f0"] > -2).astype(np.int8)
+        monkeypatch.setattr(tm, "build_dataset", lambda: df)
+        version = tm.train(mode="update")
+        y_train = df.loc[df["date"] < 19096, "target_class"].to_numpy()  # training split: first 96 of 120 days
+        expected = (y_train == 0).sum() / (y_train == 1).sum()
+        assert registry.load_manifest(version)["params"]["scale_pos_weight"] == pytest.approx(expected)
+
+    def test_holdout_is_the_latest_dates(self, artifacts, monkeypatch):
+        df = _dataset(n_days=103)
+        data = tm.QuantizedDataset(df, ["f0", "f1", "f2"])
+        days = df.sort_values("date", kind="stable")["date"].to_numpy()
+        (_, stop), (start, end) = tm.time_split(data, days)
+        assert stop == start and end == len(df)
+        # 20% of 1030 rows would cut day 19082; the boundary moves to its first row
+        assert days[stop - 1] < days[stop] == 19082
+        assert _train(monkeypatch, df, "full").attr("train_cutoff") == "2022-03-30"  # day 19081
+
+    def test_full_retrain_reasons(self, artifacts, monkeypatch):
+        model = _train(monkeypatch, _dataset(), "full")
+        assert tm.full_retrain_reason(None, ["f0", "f1", "f2"]) == "no deployed model"
+        assert tm.full_retrain_reason(model, ["f0", "f1", "f2"]) == ""
+        assert tm.full_retrain_reason(model, ["f0", "f1"]) == "feature set changed"
+        monkeypatch.setattr(tm, "MAX_TREES", 22)
+        assert "tree cap" in tm.full_retrain_reason(model, ["f0", "f1", "f2"])
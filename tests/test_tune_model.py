@@ -0,0 +1,124 @@
+"""
+tests/test_tune_model.py
+Tests for the tuner's time-series CV folds and XGBoost pruning callback.
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+import optuna
+import pandas as pd
+import pytest
+from model.dmatrix_cache import QuantizedDataset, fit_booster
+from model.tune_model import (time_series_folds, PruningCallback, make_objective, make_multi_fidelity_objective,
+                              fidelity_schedule, MAX_ESTIMATORS, PRUNE_EVERY)
+
+
+def _dataset(n_days=200, per_day=5):
+    rng = np.random.default_rng(0)
+    n = n_days * per_day
+    df = pd.DataFrame(rng.normal(size=(n, 3)), columns=["f0", "f1", "f2"])
+    df["date"] = np.repeat(np.arange(18000, 18000 + n_days, dtype=np.int32), per_day)
+    df["target_class"] = (df["f0"] + rng.normal(0, 0.5, n) > 0).astype(np.int8)
+    return df
+
+
+# ----------------------------------------------------------
+# Time-series CV folds
+# ----------------------------------------------------------
+class TestTimeSeriesFolds:
+    def test_expanding_windows_validate_the_next_block(self):
+        days = _dataset()["date"].to_numpy()
+        folds = time_series_folds(days, n_splits=4)
+        assert len(folds) == 4
+        for (train, valid), (next_train, _) in zip(folds, folds[1:]):
+            assert train[0] == 0 and train[1] == valid[0]
+            assert next_train[1] == valid[1]
+        assert folds[-1][1][1] == len(days)
+
+    def test_boundaries_do_not_split_a_day(self):
+        days = np.repeat(np.arange(10, dtype=np.int32), 7)
+        for (_, a), (_, b) in time_series_folds(days, n_splits=3):
+            assert days[a - 1] < days[a]
+
+
+# ----------------------------------------------------------
+# Pruning
+# ----------------------------------------------------------
+class TestPruning:
+    def test_callback_reports_fold_offset_steps(self):
+        data = QuantizedDataset(_dataset(), ["f0", "f1", "f2"])
+        study = optuna.create_study(direction="maximize", pruner=optuna.pruners.NopPruner())
+        trial = study.ask()
+        fit_booster({"objective": "binary:logistic", "n_estimators": 10, "eval_metric": "error"},
+                    data.dmatrix(0, 800), evals=[(data.eval_dmatrix(800, 1000), "valid")],
+                    verbose_eval=False, callbacks=[PruningCallback(trial, fold=1, every=5)])
+        steps = study.trials[0].intermediate_values
+        assert sorted(steps) == [MAX_ESTIMATORS + 4, MAX_ESTIMATORS + 9]
+        assert all(0.5 < v <= 1.0 for v in steps.values())
+
+    def test_pruned_trial_stops_training(self):
+        df = _dataset()
+        data = QuantizedDataset(df, ["f0", "f1", "f2"])
+        folds = time_series_folds(df["date"].to_numpy(), n_splits=2)
+
+        class AlwaysPrune(optuna.pruners.BasePruner):
+            def prune(self, study, trial):
+                return True
+
+        study = optuna.create_study(direction="maximize", pruner=AlwaysPrune())
+        trial = study.ask()
+        with pytest.raises(optuna.TrialPruned):
+            make_objective(data, folds, n_jobs=1)(trial)
+        assert list(study.trials[0].intermediate_values) == [PRUNE_EVERY - 1]  # stopped at the first check
+
+
+# ----------------------------------------------------------
+# Multi-fidelity (Hyperband rungs)
+# ----------------------------------------------------------
+class TestMultiFidelity:
+    def test_schedule_ends_at_full_fidelity(self):
+        assert fidelity_schedule(rungs=3, eta=3) == [1 / 9, 1 / 3, 1.0]
+
+    def test_top_rung_equals_full_objective(self):
+        df = _dataset()
+        data = QuantizedDataset(df, ["f0", "f1", "f2"])
+        folds = time_series_folds(df["date"].to_numpy(), n_splits=2)
+        params = {"n_estimators": 18, "max_depth": 3, "learning_rate": 0.1, "subsample": 1.0,
+                  "colsample_bytree": 1.0, "reg_alpha": 1e-8, "reg_lambda": 1.0, "min_child_weight": 1}
+        study = optuna.create_study(direction="maximize", pruner=optuna.pruners.NopPruner())
+        study.enqueue_trial(params)
+        study.enqueue_trial(params)
+        study.optimize(make_multi_fidelity_objective(data, folds, n_jobs=1, rungs=3, eta=3), n_trials=1)
+        study.optimize(make_objective(data, folds, n_jobs=1), n_trials=1)
+        multi, full = study.trials
+        assert sorted(multi.intermediate_values) == [1, 3, 9]
+        assert multi.value == full.value
+
+
+# ----------------------------------------------------------
+# Results
+# ----------------------------------------------------------
+class TestNoCompletedTrial:
+    def _pruned_study(self):
+        study = optuna.create_study(direction="maximize")
+        study.tell(study.ask(), state=optuna.trial.TrialState.PRUNED)
+        return study
+
+    def test_trial_seconds_without_completed_trial(self):
+        from model.tune_model import trial_seconds
+        assert trial_seconds(self._pruned_study())["to_best"] is None
+        assert trial_seconds(optuna.create_study(direction="maximize")) == {"total": 0.0, "to_best": None}
+
+    def test_best_params_left_unchanged(self, monkeypatch, capsys):
+        import model.tune_model as tm
+        study = self._pruned_study()
+        monkeypatch.setattr(tm, "build_dataset", _dataset)
+        monkeypatch.setattr(tm, "open_study", lambda multi_fidelity=False: study)
+        with open("config/best_params.yaml") as f:
+            before = f.read()
+        assert tm.tune(n_trials=1) is study  # already "complete": no new trials run
+        with open("config/best_params.yaml") as f:
+            assert f.read() == before
+        assert "No completed trial" in capsys.readouterr().out
@@ -0,0 +1,95 @@
+"""
+tests/test_walk_forward.py
+Tests for walk-forward fold planning and the per-fold runner.
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+import pandas as pd
+from model.dmatrix_cache import QuantizedDataset
+from model.dtype_policy import to_day_numbers
+from model.walk_forward import plan_folds, run_fold, run_incremental, update_rounds, _init_worker, _run_fold_in_worker
+
+RESULT_COLUMNS = ["fold", "train_start", "train_end", "test_start", "test_end",
+                  "train_rows", "test_rows", "accuracy", "f1_score"]
+
+
+def _days(years=5, per_day=2):
+    dates = pd.bdate_range("2019-01-01", periods=252 * years)
+    return np.repeat(to_day_numbers(dates), per_day)
+
+
+# ----------------------------------------------------------
+# Fold planning
+# ----------------------------------------------------------
+class TestPlanFolds:
+    def test_windows_slide_by_six_months(self):
+        folds = plan_folds(_days())
+        assert [f["fold"] for f in folds] == list(range(1, len(folds) + 1))
+        assert len(folds) == 3  # 1260 business days end in Oct 2023
+        starts = [pd.Timestamp(f["train_start"]) for f in folds]
+        assert all(b == a + pd.DateOffset(months=6) for a, b in zip(starts, starts[1:]))
+
+    def test_row_ranges_cover_their_dates(self):
+        days = _days()
+        for f in plan_folds(days):
+            lo, mid, hi = f["lo"], f["mid"], f["hi"]
+            assert lo < mid < hi
+            assert days[mid - 1] < to_day_numbers([f["train_end"]])[0] <= days[mid]
+            assert days[hi - 1] < to_day_numbers([f["test_end"]])[0]
+
+    def test_short_history_has_no_folds(self):
+        assert plan_folds(_days(years=2)) == []
+
+
+# ----------------------------------------------------------
+# Fold runner (sequential and worker paths)
+# ----------------------------------------------------------
+class TestRunFold:
+    def _data(self, days):
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame(rng.normal(size=(len(days), 3)), columns=["f0", "f1", "f2"])
+        df["target_class"] = (df["f0"] + rng.normal(0, 0.5, len(days)) > 0).astype(np.int8)
+        return QuantizedDataset(df, ["f0", "f1", "f2"])
+
+    def test_result_row_has_summary_columns(self):
+        days = _days()
+        fold = plan_folds(days)[0]
+        result = run_fold(self._data(days), fold, {"objective": "binary:logistic", "n_estimators": 5})
+        assert list(result)[:-1] == RESULT_COLUMNS
+        assert result["train_rows"] == fold["mid"] - fold["lo"]
+        assert result["accuracy"] > 0.7
+
+    def test_worker_on_memory_mapped_dataset_matches_in_process(self, tmp_path):
+        days = _days()
+        data, fold = self._data(days), plan_folds(days)[1]
+        params = {"objective": "binary:logistic", "n_estimators": 5, "random_state": 0, "n_jobs": 1}
+        data.save(str(tmp_path))
+        _init_worker(str(tmp_path), params)
+        in_worker = _run_fold_in_worker(fold)
+        in_process = run_fold(data, fold, params)
+        assert {k: v for k, v in in_worker.items() if k != "seconds"} == \
+               {k: v for k, v in in_process.items() if k != "seconds"}
+
+
+# ----------------------------------------------------------
+# Incremental (warm-started) folds
+# ----------------------------------------------------------
+class TestIncremental:
+    PARAMS = {"objective": "binary:logistic", "n_estimators": 12, "random_state": 0}
+
+    def test_update_rounds_scale_with_new_rows(self):
+        prev, fold = {"mid": 600}, {"lo": 0, "mid": 1200}
+        assert update_rounds(self.PARAMS, fold, prev) == 6
+
+    def test_warm_starts_add_trees_then_cap_forces_full_retrain(self):
+        days = _days()
+        folds = plan_folds(days)
+        data = TestRunFold()._data(days)
+        rows = [inc for _, inc in run_incremental(data, folds, self.PARAMS, max_trees=16)]
+        assert [r["mode"] for r in rows] == ["full", "warm", "full"]
+        assert rows[1]["trees"] == 12 + update_rounds(self.PARAMS, folds[1], folds[0])
+        assert rows[2]["trees"] == 12
+        assert rows[0]["accuracy_diff"] == 0